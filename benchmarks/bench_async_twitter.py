@@ -0,0 +1,60 @@
+"""
+Отзывчивость цикла событий во время публикаций в Twitter (AsyncTwitterAPI).
+
+Вызов tweepy имитируется блокирующей паузой. Одновременно публикуется несколько постов,
+а задача в цикле событий каждые 5 мс отмечает, насколько она опоздала (так же опаздывала
+бы обработка обновлений Telegram). Сравниваются вызов синхронного TwitterAPI прямо из
+обработчика и вызов через AsyncTwitterAPI.
+
+Запуск: python benchmarks/bench_async_twitter.py [публикаций] [длительность вызова, с]
+"""
+import sys
+import time
+import asyncio
+
+from common import LoopLag, percentile, print_table
+from social_api import AsyncTwitterAPI
+
+class SlowTwitter:
+    """Заменитель TwitterAPI: публикация блокирует поток, как запрос tweepy."""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+    
+    def post_text(self, text: str):
+        time.sleep(self.latency)
+        return {"success": True, "post_id": text, "post_url": ""}
+
+async def run(mode: str, posts: int, latency: float):
+    twitter = SlowTwitter(latency)
+    async_twitter = AsyncTwitterAPI(twitter, max_workers=4, timeout=60)
+    
+    async def publish(index: int):
+        if mode == "blocking":
+            return twitter.post_text(str(index))
+        return await async_twitter.post_text(str(index))
+    
+    # Цикл событий каждые 5 мс должен успевать обработать обновление Telegram
+    async with LoopLag() as lag:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(publish(i) for i in range(posts)))
+        elapsed = time.perf_counter() - start
+    async_twitter.close()
+    assert all(result["success"] for result in results)
+    return elapsed, lag.max_ms, percentile(lag.lags, 0.99) * 1000, len(lag.lags)
+
+def main():
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    rows = []
+    for mode in ("blocking", "executor"):
+        elapsed, max_lag, p99, ticks = asyncio.run(run(mode, posts, latency))
+        rows.append((mode, f"{elapsed:.2f}", f"{max_lag:.1f}", f"{p99:.1f}", ticks))
+    print_table(
+        f"{posts} публикаций по {latency} с, пул из 4 потоков",
+        ("режим", "всего, с", "макс. задержка цикла, мс", "p99 задержки, мс", "пробуждений цикла"),
+        rows
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Массовый импорт /import: разбор файла и вставка запланированных постов.
+
+Генерируется файл с заданным числом записей в каждом формате (CSV, JSON, JSON Lines),
+замеряются время и пик памяти parse_import_file, затем время вставки всех строк
+одной транзакцией (DatabaseManager.add_scheduled_posts) против вставки по одной
+через add_scheduled_post, как при ручном планировании.
+
+Запуск: python benchmarks/bench_bulk_import.py [записей]
+"""
+import os
+import csv
+import sys
+import json
+import time
+import datetime
+import tempfile
+import tracemalloc
+
+from common import print_table
+from bulk_import import parse_import_file
+from db_manager import DatabaseManager
+
+PLATFORMS = ["twitter", "instagram"]
+
+def make_records(count: int):
+    start = datetime.datetime.now() + datetime.timedelta(days=1)
+    for i in range(count):
+        yield {
+            "platform": "twitter",
+            "text": f"Запланированная публикация номер {i} из массового импорта",
+            "scheduled_time": (start + datetime.timedelta(minutes=i)).strftime("%d.%m.%Y %H:%M")
+        }
+
+def write_file(path: str, fmt: str, count: int) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=["platform", "text", "scheduled_time"])
+            writer.writeheader()
+            writer.writerows(make_records(count))
+        elif fmt == "json":
+            json.dump(list(make_records(count)), f, ensure_ascii=False, indent=1)
+        else:
+            for record in make_records(count):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    workdir = tempfile.mkdtemp()
+    
+    parse_rows = []
+    report = None
+    for fmt in ("csv", "json", "jsonl"):
+        path = os.path.join(workdir, f"import.{fmt}")
+        write_file(path, fmt, count)
+        tracemalloc.start()
+        start = time.perf_counter()
+        report = parse_import_file(path, fmt, PLATFORMS)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert len(report.rows) == count and not report.errors, report.errors[:3]
+        # Повторный разбор без tracemalloc: трассировка замедляет выделения памяти
+        start = time.perf_counter()
+        parse_import_file(path, fmt, PLATFORMS)
+        parse_rows.append((
+            fmt, f"{os.path.getsize(path) / 1024:.0f}", f"{time.perf_counter() - start:.3f}",
+            f"{elapsed:.3f}", f"{peak / 1024 / 1024:.1f}"
+        ))
+    print_table(
+        f"Разбор файла из {count} записей",
+        ("формат", "размер, КБ", "время, с", "время с tracemalloc, с", "пик памяти, МБ"),
+        parse_rows
+    )
+    
+    insert_rows = []
+    for name in ("одна транзакция", "по одной записи"):
+        db_manager = DatabaseManager(os.path.join(workdir, f"{len(insert_rows)}.db"),
+                                     media_root=os.path.join(workdir, "media"))
+        start = time.perf_counter()
+        if name == "одна транзакция":
+            added = db_manager.add_scheduled_posts(1, report.rows)
+        else:
+            added = [db_manager.add_scheduled_post(1, *row) for row in report.rows]
+        elapsed = time.perf_counter() - start
+        db_manager.close()
+        assert len(added) == count
+        insert_rows.append((name, f"{elapsed:.3f}", f"{elapsed / count * 1e6:.0f}"))
+    print_table(
+        f"Вставка {count} запланированных постов",
+        ("способ", "время, с", "мкс на пост"),
+        insert_rows
+    )
+
+if __name__ == "__main__":
+    main()
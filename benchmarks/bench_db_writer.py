@@ -0,0 +1,85 @@
+"""
+Запись через единственный поток с групповой фиксацией (DatabaseWriter) против
+отдельной транзакции на каждую вставку из каждого потока.
+
+Несколько потоков одновременно добавляют посты. В первом случае вызывается
+DatabaseManager.add_post (операция уходит в поток записи), во втором каждый поток
+выполняет ту же операцию _add_post на своем соединении в собственной транзакции
+BEGIN IMMEDIATE, как было до потока записи, и конкурирует за блокировку SQLite.
+
+Запуск: python benchmarks/bench_db_writer.py [вставок на поток]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from common import print_table
+import db_writer
+from db_manager import DatabaseManager
+
+def batch_stats():
+    """Сумма и количество наблюдений гистограммы db_write_batch_size."""
+    values = {}
+    for line in db_writer.DB_WRITE_BATCH_SIZE.collect():
+        name, _, value = line.rpartition(" ")
+        values[name] = float(value)
+    return values.get("db_write_batch_size_sum", 0.0), values.get("db_write_batch_size_count", 0.0)
+
+def run_threads(threads: int, func) -> float:
+    barrier = threading.Barrier(threads + 1)
+    
+    def worker(index: int):
+        barrier.wait()
+        func(index)
+    
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - start
+
+def main():
+    inserts = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    workdir = tempfile.mkdtemp()
+    
+    rows = []
+    for threads in (1, 8, 32):
+        for mode in ("поток записи", "транзакция на вставку"):
+            db_manager = DatabaseManager(os.path.join(workdir, f"{threads}-{len(rows)}.db"),
+                                         media_root=os.path.join(workdir, "media"))
+            
+            def through_writer(index: int):
+                for i in range(inserts):
+                    assert db_manager.add_post(index, "twitter", f"post {i}", None, str(i), "published") > 0
+            
+            def own_transaction(index: int):
+                conn = db_manager._get_connection()
+                for i in range(inserts):
+                    conn.execute("BEGIN IMMEDIATE")
+                    db_manager._add_post(conn, index, "twitter", f"post {i}", None, str(i), "published")
+                    conn.commit()
+            
+            before = batch_stats()
+            elapsed = run_threads(threads, through_writer if mode == "поток записи" else own_transaction)
+            after = batch_stats()
+            batch_sum, batch_count = after[0] - before[0], after[1] - before[1]
+            db_manager.close()
+            rows.append((
+                threads, mode, threads * inserts, f"{elapsed:.3f}",
+                f"{elapsed / (threads * inserts) * 1e6:.0f}",
+                f"{batch_sum / batch_count:.1f}" if batch_count else "1"
+            ))
+    
+    print_table(
+        f"Одновременные add_post по {inserts} на поток",
+        ("потоков", "способ", "вставок", "время, с", "мкс на вставку", "операций на фиксацию"),
+        rows
+    )
+
+if __name__ == "__main__":
+    main()
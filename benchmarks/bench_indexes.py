@@ -0,0 +1,106 @@
+"""
+Запросы /history, /scheduled и загрузки очереди планировщика на большой базе с индексами и без них.
+
+База создается через DatabaseManager (все миграции), заполняется постами и
+запланированными постами, после чего каждый запрос выполняется с индексами, затем
+индексы удаляются и замер повторяется. Для каждого запроса выводится план
+EXPLAIN QUERY PLAN.
+
+Запуск: python benchmarks/bench_indexes.py [постов] [запланированных постов]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+
+from common import print_table
+from db_manager import DatabaseManager
+from timeutils import now_ms
+
+USERS = 10000
+# Индексы миграции 2 и частичный индекс активных постов, который позже заменил
+# idx_scheduled_posts_time для загрузки очереди планировщика
+INDEXES = ("idx_posts_user_created", "idx_scheduled_posts_user_time", "idx_scheduled_posts_time",
+           "idx_scheduled_posts_active")
+REPEATS = 20
+
+def fill(db_path: str, posts: int, scheduled: int) -> None:
+    random.seed(1)
+    now = now_ms()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO posts (user_id, platform, text, social_post_id, status, created_at) "
+        "VALUES (?, 'twitter', ?, ?, 'published', ?)",
+        ((random.randrange(USERS), f"post {i}", str(i), now - random.randrange(365 * 86400000))
+         for i in range(posts))
+    )
+    conn.executemany(
+        "INSERT INTO scheduled_posts (user_id, platform, text, scheduled_time, status) "
+        "VALUES (?, 'twitter', ?, ?, ?)",
+        # За год накопилась история опубликованных постов, на неделю вперед посты ждут публикации
+        ((random.randrange(USERS), f"scheduled {i}", time_, "pending" if time_ > now else "published")
+         for i, time_ in ((i, now + random.randrange(-365 * 24, 7 * 24) * 3600000) for i in range(scheduled)))
+    )
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+def plan(db_path: str, sql: str, params) -> str:
+    conn = sqlite3.connect(db_path)
+    try:
+        return "; ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+    finally:
+        conn.close()
+
+def measure_ms(func) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        func()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+def main():
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    scheduled = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "bench.db")
+    DatabaseManager(db_path, media_root=os.path.join(workdir, "media")).close()
+    
+    start = time.perf_counter()
+    fill(db_path, posts, scheduled)
+    print(f"База: {posts} постов, {scheduled} запланированных, заполнение {time.perf_counter() - start:.1f} с")
+    
+    user = 42
+    queries = [
+        ("/history (страница 10)", lambda db: db.get_user_posts_page(user, 10),
+         "SELECT id, platform, text, media_path, social_post_id, status, created_at FROM posts "
+         "WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT 10", (user,)),
+        ("/scheduled", lambda db: db.get_scheduled_posts(user),
+         "SELECT id, platform, text, media_path, media_type, scheduled_time FROM scheduled_posts "
+         "WHERE user_id = ? AND scheduled_time > ? "
+         "AND status IN ('pending', 'claimed') ORDER BY scheduled_time ASC", (user, now_ms())),
+        ("очередь планировщика", lambda db: db.get_scheduled_post_times(0),
+         "SELECT id, COALESCE(next_attempt_at, scheduled_time) FROM scheduled_posts "
+         "WHERE id > ? AND status IN ('pending', 'claimed') ORDER BY id", (0,)),
+    ]
+    
+    rows = []
+    plans = []
+    for with_indexes in (True, False):
+        if not with_indexes:
+            conn = sqlite3.connect(db_path)
+            for index in INDEXES:
+                conn.execute(f"DROP INDEX {index}")
+            conn.close()
+        db_manager = DatabaseManager(db_path, media_root=os.path.join(workdir, "media"))
+        for name, query, sql, params in queries:
+            rows.append((name, "есть" if with_indexes else "нет", f"{measure_ms(lambda: query(db_manager)):.3f}"))
+            plans.append((name, "есть" if with_indexes else "нет", plan(db_path, sql, params)))
+        db_manager.close()
+    
+    print_table("Время запроса", ("запрос", "индексы", "мс"), rows)
+    print_table("Планы запросов", ("запрос", "индексы", "EXPLAIN QUERY PLAN"), plans)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Оптимизация фотографий перед сохранением (MediaOptimizer).
+
+Генерируются два типичных изображения: снимок камеры 4032x3024 в JPEG q95 с
+поворотом EXIF и снимок экрана 5120x2880 в PNG. Для каждого замеряются размер до и
+после, время обработки в пуле процессов (пул запускается заранее), время повторной
+отправки того же файла (вариант берется из кэша media_variants) и наибольшая
+задержка цикла событий во время обработки.
+
+Запуск: python benchmarks/bench_media_optimizer.py
+"""
+import os
+import time
+import random
+import asyncio
+import tempfile
+
+from PIL import Image, ImageDraw
+
+from common import LoopLag, print_table
+from db_manager import DatabaseManager
+from media_optimizer import MediaOptimizer
+
+def make_photo() -> Image.Image:
+    # Шум сжимается плохо, как мелкие детали настоящего снимка
+    return Image.effect_noise((4032, 3024), 40).convert("RGB")
+
+def make_screenshot() -> Image.Image:
+    random.seed(1)
+    image = Image.new("RGB", (5120, 2880), (245, 245, 245))
+    draw = ImageDraw.Draw(image)
+    for _ in range(3000):
+        x, y = random.randrange(5000), random.randrange(2860)
+        draw.rectangle(
+            [x, y, x + random.randrange(10, 120), y + random.randrange(5, 20)],
+            fill=tuple(random.randrange(256) for _ in range(3))
+        )
+    for y in range(0, 2880, 3):
+        draw.line([(0, y), (5120, y)], fill=(y % 256, (y * 3) % 256, 200))
+    return image
+
+def save(image: Image.Image, path: str, **params) -> int:
+    image.save(path, **params)
+    return os.path.getsize(path)
+
+async def run(db_manager: DatabaseManager):
+    optimizer = MediaOptimizer(db_manager)
+    store = db_manager.media_store
+    
+    # Запуск пула spawn занимает время один раз за жизнь процесса бота
+    start = time.perf_counter()
+    save(Image.new("RGB", (64, 64)), store.temp_path("warmup.jpg"))
+    await optimizer.store(store.temp_path("warmup.jpg"), "photo")
+    warmup = time.perf_counter() - start
+    
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Поворот на 90 градусов
+    exif[0x010F] = "Camera"
+    images = [
+        ("фото 4032x3024 JPEG q95, EXIF", make_photo(), "photo.jpg", {"exif": exif.tobytes(), "quality": 95}),
+        ("снимок экрана 5120x2880 PNG", make_screenshot(), "screenshot.png", {}),
+    ]
+    
+    rows = []
+    for name, image, file_name, params in images:
+        before = save(image, store.temp_path(file_name), **params)
+        async with LoopLag() as lag:
+            start = time.perf_counter()
+            stored = await optimizer.store(store.temp_path(file_name), "photo", f"bench-{file_name}")
+            elapsed = time.perf_counter() - start
+        
+        # Тот же файл, присланный повторно
+        save(image, store.temp_path("again-" + file_name), **params)
+        start = time.perf_counter()
+        again = await optimizer.store(store.temp_path("again-" + file_name), "photo")
+        cached = time.perf_counter() - start
+        assert again == stored
+        
+        with Image.open(stored) as result:
+            rows.append((
+                name, f"{before / 1024 / 1024:.2f}", f"{os.path.getsize(stored) / 1024 / 1024:.2f}",
+                f"{result.format} {result.size[0]}x{result.size[1]}", "да" if "exif" in result.info else "нет",
+                f"{elapsed:.2f}", f"{cached * 1000:.1f}", f"{lag.max_ms:.1f}"
+            ))
+    optimizer.close()
+    return warmup, rows
+
+def main():
+    workdir = tempfile.mkdtemp()
+    db_manager = DatabaseManager(os.path.join(workdir, "bench.db"), media_root=os.path.join(workdir, "media"))
+    warmup, rows = asyncio.run(run(db_manager))
+    db_manager.close()
+    print_table(
+        f"Оптимизация в пуле процессов (запуск пула {warmup:.2f} с)",
+        ("изображение", "до, МБ", "после, МБ", "результат", "EXIF", "время, с", "повторно, мс",
+         "макс. задержка цикла, мс"),
+        rows
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Немедленная публикация видео: потоковая передача из Telegram в загрузку по частям
+против сохранения файла на диск и последующей загрузки.
+
+Локальный HTTP-сервер отдает файл с ограниченной скоростью (как сервер файлов Telegram),
+а APPEND поддельного клиента Twitter занимает время пропорционально размеру части.
+Прежний путь скачивает файл целиком на диск и затем загружает его
+(AsyncTwitterAPI.post_with_media); потоковый путь отправляет части, пока файл еще
+скачивается (iter_telegram_file + AsyncTwitterAPI.post_with_media_stream).
+
+Запуск: python benchmarks/bench_media_stream.py [размер, МБ] [скачивание, МБ/с] [загрузка, МБ/с]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import httpx
+
+from common import print_table
+from media_stream import iter_telegram_file
+from media_upload import ChunkedUploader
+from social_api import AsyncTwitterAPI, TwitterAPI
+
+MB = 1024 * 1024
+BLOCK = 256 * 1024
+
+def serve_file(payload: bytes, rate: float) -> ThreadingHTTPServer:
+    """HTTP-сервер, отдающий payload со скоростью rate байт в секунду."""
+    
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+        
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            start = time.perf_counter()
+            for offset in range(0, len(payload), BLOCK):
+                self.wfile.write(payload[offset:offset + BLOCK])
+                # Выравниваем скорость по общему времени, а не по каждому блоку
+                delay = start + (offset + BLOCK) / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+    
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+class FakeMediaAPI:
+    """Команды загрузки tweepy.API: APPEND занимает время по скорости канала."""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.received = 0
+        self._lock = threading.Lock()
+    
+    def chunked_upload_init(self, total_bytes, mime_type, media_category=None):
+        return SimpleNamespace(media_id=1)
+    
+    def chunked_upload_append(self, media_id, data, segment_index):
+        time.sleep(len(data) / self.rate)
+        with self._lock:
+            self.received += len(data)
+    
+    def chunked_upload_finalize(self, media_id):
+        return SimpleNamespace(expires_after_secs=86400, processing_info=None)
+
+class FakeClient:
+    def create_tweet(self, text, media_ids=None):
+        return SimpleNamespace(data={"id": 1})
+
+def make_twitter(upload_rate: float):
+    twitter = TwitterAPI("key", "secret", "token", "token-secret")
+    twitter.api = FakeMediaAPI(upload_rate)
+    twitter.client = FakeClient()
+    # Лимит запросов media/upload растягивает отправку частей и скрывает разницу путей
+    twitter.rate_limiters = {}
+    twitter.uploader = ChunkedUploader(twitter.api, twitter._call)
+    return twitter
+
+async def spill(url: str, size: int, upload_rate: float, workdir: str):
+    """Прежний путь: файл скачивается на диск, затем загружается по частям."""
+    twitter = make_twitter(upload_rate)
+    async_twitter = AsyncTwitterAPI(twitter)
+    path = os.path.join(workdir, "video.mp4")
+    async with httpx.AsyncClient() as client:
+        async with client.stream("GET", url) as response:
+            with open(path, "wb") as f:
+                async for block in response.aiter_bytes(BLOCK):
+                    f.write(block)
+    result = await async_twitter.post_with_media("text", path, "video")
+    written = os.path.getsize(path)
+    os.remove(path)
+    async_twitter.close()
+    assert result["success"] and twitter.api.received == size, result
+    return written
+
+async def stream(url: str, size: int, upload_rate: float, workdir: str):
+    """Потоковый путь: части отправляются, пока файл скачивается."""
+    twitter = make_twitter(upload_rate)
+    async_twitter = AsyncTwitterAPI(twitter)
+    file = SimpleNamespace(file_path=url)
+    result = await async_twitter.post_with_media_stream("text", iter_telegram_file(file), size, "video/mp4", "video")
+    async_twitter.close()
+    assert result["success"] and twitter.api.received == size, result
+    return 0
+
+def main():
+    size = int(float(sys.argv[1]) * MB) if len(sys.argv) > 1 else 64 * MB
+    download_rate = float(sys.argv[2]) * MB if len(sys.argv) > 2 else 40 * MB
+    upload_rate = float(sys.argv[3]) * MB if len(sys.argv) > 3 else 20 * MB
+    payload = os.urandom(size)
+    server = serve_file(payload, download_rate)
+    url = f"http://127.0.0.1:{server.server_address[1]}/file.mp4"
+    workdir = tempfile.mkdtemp()
+    
+    rows = []
+    for name, path in (("на диск, затем загрузка", spill), ("потоком", stream)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        written = asyncio.run(path(url, size, upload_rate, workdir))
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        rows.append((name, f"{elapsed:.2f}", f"{peak / MB:.1f}", f"{written / MB:.0f}"))
+    server.shutdown()
+    
+    print_table(
+        f"Видео {size / MB:.0f} МБ, скачивание {download_rate / MB:.0f} МБ/с, "
+        f"загрузка {upload_rate / MB:.0f} МБ/с на поток ({ChunkedUploader(None, None).max_parallel} потока)",
+        ("путь", "время, с", "пик памяти Python, МБ", "записано на диск, МБ"),
+        rows
+    )
+
+if __name__ == "__main__":
+    main()
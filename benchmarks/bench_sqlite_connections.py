@@ -0,0 +1,111 @@
+"""
+Постоянное соединение SQLite на поток против нового соединения на каждый вызов.
+
+Чтения сравниваются на одной базе: DatabaseManager (постоянное настроенное соединение)
+и тот же запрос через sqlite3.connect/close на каждый вызов, как было раньше. Для записи
+сравниваются одиночные INSERT с фиксацией: новое соединение в режиме журнала DELETE
+с synchronous=FULL (настройки SQLite по умолчанию) и постоянное соединение с WAL и
+synchronous=NORMAL.
+
+Запуск: python benchmarks/bench_sqlite_connections.py [вызовов]
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+from common import print_table
+from db_manager import DatabaseManager
+
+USERS = 100
+POSTS_PER_USER = 100
+
+def per_call_us(func, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls * 1e6
+
+def fill(db_path: str) -> None:
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO posts (user_id, platform, text, social_post_id, status) VALUES (?, 'twitter', ?, ?, 'published')",
+        ((user, f"post {i}", str(i)) for i in range(POSTS_PER_USER) for user in range(USERS))
+    )
+    conn.commit()
+    conn.close()
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "bench.db")
+    db_manager = DatabaseManager(db_path, media_root=os.path.join(workdir, "media"))
+    fill(db_path)
+    post_id = db_manager.add_scheduled_post(1, "twitter", "text", None, None, 0)
+    
+    def page_per_call(i):
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute(
+                "SELECT id, platform, text, media_path, social_post_id, status, created_at FROM posts "
+                "WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT 10",
+                (i % USERS,)
+            ).fetchall()
+        finally:
+            conn.close()
+    
+    def state_per_call(i):
+        conn = sqlite3.connect(db_path)
+        try:
+            conn.execute("SELECT status, lease_expires_at FROM scheduled_posts WHERE id = ?", (post_id,)).fetchone()
+        finally:
+            conn.close()
+    
+    rows = [
+        ("страница /history", "новое соединение", f"{per_call_us(page_per_call, calls):.1f}"),
+        ("страница /history", "постоянное",
+         f"{per_call_us(lambda i: db_manager.get_user_posts_page(i % USERS, 10), calls):.1f}"),
+        ("состояние поста", "новое соединение", f"{per_call_us(state_per_call, calls):.1f}"),
+        ("состояние поста", "постоянное",
+         f"{per_call_us(lambda i: db_manager.get_scheduled_post_state(post_id), calls):.1f}"),
+    ]
+    db_manager.close()
+    
+    # Записи: отдельные файлы, потому что режим журнала хранится в самом файле
+    insert = "INSERT INTO log (value) VALUES (?)"
+    old_path = os.path.join(workdir, "old.db")
+    conn = sqlite3.connect(old_path)
+    conn.execute("CREATE TABLE log (id INTEGER PRIMARY KEY, value TEXT)")
+    conn.close()
+    
+    def write_per_call(i):
+        conn = sqlite3.connect(old_path)
+        try:
+            conn.execute(insert, (str(i),))
+            conn.commit()
+        finally:
+            conn.close()
+    
+    new_conn = sqlite3.connect(os.path.join(workdir, "new.db"))
+    new_conn.execute("PRAGMA journal_mode=WAL")
+    new_conn.execute("PRAGMA synchronous=NORMAL")
+    new_conn.execute("CREATE TABLE log (id INTEGER PRIMARY KEY, value TEXT)")
+    
+    def write_persistent(i):
+        new_conn.execute(insert, (str(i),))
+        new_conn.commit()
+    
+    write_calls = max(1, calls // 4)
+    rows.append(("INSERT + commit", "новое соединение, DELETE/FULL", f"{per_call_us(write_per_call, write_calls):.1f}"))
+    rows.append(("INSERT + commit", "постоянное, WAL/NORMAL", f"{per_call_us(write_persistent, write_calls):.1f}"))
+    new_conn.close()
+    
+    print_table(
+        f"{USERS * POSTS_PER_USER} постов, {calls} чтений и {write_calls} записей",
+        ("операция", "соединение", "мкс на вызов"),
+        rows
+    )
+
+if __name__ == "__main__":
+    main()
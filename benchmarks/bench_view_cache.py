@@ -0,0 +1,131 @@
+"""
+Кэш отображений /history и /scheduled (ViewCache) против запроса к SQLite и форматирования.
+
+Используются методы отображения SocialMediaBot на базе с постами нескольких
+пользователей. Замеряются попадание в кэш, промах (запрос, форматирование и
+сохранение в кэш) и построение без кэша, а затем смешанная нагрузка: просмотры
+страниц вперемешку с публикациями, которые сбрасывают кэш пользователя.
+
+Запуск: python benchmarks/bench_view_cache.py [вызовов]
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+
+from common import print_table
+from db_manager import DatabaseManager
+from main import SocialMediaBot
+from timeutils import now_ms
+
+USERS = 1000
+POSTS_PER_USER = 50
+SCHEDULED_PER_USER = 10
+
+def fill(db_path: str) -> None:
+    now = now_ms()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO posts (user_id, platform, text, social_post_id, status, created_at) "
+        "VALUES (?, 'twitter', ?, ?, 'published', ?)",
+        ((user, f"Опубликованный пост {i} пользователя {user} с текстом длиннее пятидесяти символов",
+          str(user * POSTS_PER_USER + i), now - i * 3600000)
+         for user in range(USERS) for i in range(POSTS_PER_USER))
+    )
+    conn.executemany(
+        "INSERT INTO scheduled_posts (user_id, platform, text, scheduled_time, status) "
+        "VALUES (?, 'twitter', ?, ?, 'pending')",
+        ((user, f"Запланированный пост {i}", now + (i + 1) * 3600000)
+         for user in range(USERS) for i in range(SCHEDULED_PER_USER))
+    )
+    conn.commit()
+    conn.close()
+
+def per_call_us(func, calls: int, repeats: int = 5) -> float:
+    # Лучший из нескольких замеров, как в timeit: меньше влияние других процессов
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(calls):
+            func(i)
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e6
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "bench.db")
+    DatabaseManager(db_path, media_root=os.path.join(workdir, "media")).close()
+    fill(db_path)
+    
+    # Методы отображения берутся у бота как есть; API социальных сетей им не нужны
+    bot = SocialMediaBot.__new__(SocialMediaBot)
+    bot.db_manager = DatabaseManager(db_path, media_root=os.path.join(workdir, "media"))
+    view_cache = bot.db_manager.view_cache
+    user = 42
+    
+    def history_miss(i):
+        view_cache.invalidate(user, "history")
+        bot._render_history_page(user)
+    
+    def scheduled_cached(i):
+        cached = view_cache.get(user, "scheduled")
+        if cached is None:
+            version = view_cache.version()
+            text, expires_at = bot._render_scheduled(user)
+            view_cache.put(user, "scheduled", (), (text,), version, expires_at)
+    
+    def scheduled_miss(i):
+        view_cache.invalidate(user, "scheduled")
+        scheduled_cached(i)
+    
+    bot._render_history_page(user)
+    scheduled_cached(0)
+    rows = [
+        ("/history", "попадание в кэш", f"{per_call_us(lambda i: bot._render_history_page(user), calls):.1f}"),
+        ("/history", "промах", f"{per_call_us(history_miss, calls):.1f}"),
+        ("/history", "без кэша", f"{per_call_us(lambda i: bot._build_history_page(user, None, True), calls):.1f}"),
+        ("/scheduled", "попадание в кэш", f"{per_call_us(scheduled_cached, calls):.1f}"),
+        ("/scheduled", "промах", f"{per_call_us(scheduled_miss, calls):.1f}"),
+        ("/scheduled", "без кэша", f"{per_call_us(lambda i: bot._render_scheduled(user), calls):.1f}"),
+    ]
+    print_table(
+        f"{USERS} пользователей по {POSTS_PER_USER} постов и {SCHEDULED_PER_USER} запланированных",
+        ("отображение", "путь", "мкс на вызов"),
+        rows
+    )
+    
+    # Смешанная нагрузка: активные пользователи чаще смотрят историю, доля write_share
+    # обращений - публикации, которые сбрасывают историю пользователя
+    random.seed(1)
+    active = [random.randrange(USERS) for _ in range(50)]
+    mix_rows = []
+    for write_share in (0.0, 0.05, 0.2):
+        # Каждый замер начинается с пустого кэша
+        for viewer in range(USERS):
+            view_cache.invalidate(viewer)
+        hits_before, misses_before = view_cache._hits, view_cache._misses
+        views = 0
+        start = time.perf_counter()
+        for _ in range(calls):
+            viewer = random.choice(active) if random.random() < 0.8 else random.randrange(USERS)
+            if random.random() < write_share:
+                bot.db_manager.add_post(viewer, "twitter", "Новый пост", None, str(random.random()), "published")
+            else:
+                bot._render_history_page(viewer)
+                views += 1
+        elapsed = time.perf_counter() - start
+        hits = view_cache._hits - hits_before
+        misses = view_cache._misses - misses_before
+        mix_rows.append((f"{write_share:.0%}", views, f"{hits / (hits + misses):.0%}", f"{elapsed / calls * 1e6:.1f}"))
+    bot.db_manager.close()
+    print_table(
+        f"Смешанная нагрузка: {calls} обращений, 80% от 50 активных пользователей",
+        ("доля публикаций", "просмотров", "попаданий", "мкс на обращение"),
+        mix_rows
+    )
+
+if __name__ == "__main__":
+    main()
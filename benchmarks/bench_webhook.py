@@ -0,0 +1,282 @@
+"""
+Прием обновлений: long polling (Updater из python-telegram-bot) против WebhookServer.
+
+Локальный генератор создает обновления с заданной частотой. В режиме polling они
+копятся в поддельном Bot API, который отвечает на getUpdates пачками до 100 штук;
+в режиме webhook генератор, как Telegram, отправляет их POST-запросами через
+несколько постоянных соединений. Сетевая задержка до Telegram имитируется паузой
+в половину RTT в каждую сторону. Сторона Telegram работает в отдельном процессе.
+Задержка обновления - время от его создания до извлечения из update_queue
+приложения; процессорное время считается только для процесса бота (на машине
+с одним ядром генератор отнимает процессор у бота, и потолок приема ниже).
+
+Отдельно проверяется обратное давление: обработчик медленнее генератора, и
+WebhookServer должен держать очередь в пределах max_pending_updates, отвечая 503.
+
+Запуск: python benchmarks/bench_webhook.py [RTT, мс] [длительность, с]
+"""
+import sys
+import json
+import time
+import logging
+import queue
+import asyncio
+import threading
+import http.client
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from telegram.ext import ApplicationBuilder
+
+from common import percentile, print_table
+import webhook_server
+from webhook_server import WebhookServer
+
+TOKEN = "123456:bench"
+SECRET = "bench-secret"
+WEBHOOK_CONNECTIONS = 40  # max_connections Telegram по умолчанию
+BATCH_LIMIT = 100  # Наибольшая пачка getUpdates
+
+def make_update(update_id: int, created: float) -> dict:
+    # Время создания передается в тексте: часы time.monotonic общие для процессов одной машины
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+            "text": repr(created)
+        }
+    }
+
+def generate(rate: float, count: int, deliver) -> None:
+    """Открытый генератор: обновления появляются по расписанию независимо от приема."""
+    start = time.monotonic()
+    for update_id in range(1, count + 1):
+        delay = start + update_id / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        deliver(update_id)
+
+class FakeBotAPI:
+    """Bot API с getMe, deleteWebhook и долгим опросом getUpdates."""
+    
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.pending: List[Tuple[int, float]] = []
+        self.condition = threading.Condition()
+        api = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Заголовки и тело уходят отдельными записями; без этого ответ ждет отложенного ACK
+            disable_nagle_algorithm = True
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                method = self.path.rsplit("/", 1)[-1]
+                if method == "getUpdates":
+                    params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+                    result = api.get_updates(int(params.get("offset", 0)), float(params.get("timeout", 0)))
+                elif method == "getMe":
+                    result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+                else:
+                    result = True
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+        
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+    
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/bot"
+    
+    def add(self, update_id: int) -> None:
+        with self.condition:
+            self.pending.append((update_id, time.monotonic()))
+            self.condition.notify_all()
+    
+    def get_updates(self, offset: int, timeout: float) -> list:
+        # Запрос идет до Telegram половину RTT, ответ возвращается еще половину
+        time.sleep(self.rtt / 2)
+        with self.condition:
+            self.pending = [update for update in self.pending if update[0] >= offset]
+            if not self.pending:
+                self.condition.wait(timeout)
+            batch = self.pending[:BATCH_LIMIT]
+        time.sleep(self.rtt / 2)
+        return [make_update(update_id, created) for update_id, created in batch]
+    
+    def close(self) -> None:
+        self.server.shutdown()
+
+class WebhookSender:
+    """Доставка обновлений как у Telegram: по одному запросу на соединение за раз."""
+    
+    def __init__(self, port: int, rtt: float, connections: int = WEBHOOK_CONNECTIONS):
+        self.port = port
+        self.rtt = rtt
+        self.queue: "queue.Queue[Optional[Tuple[int, float]]]" = queue.Queue()
+        self.statuses: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(connections)]
+        for thread in self.threads:
+            thread.start()
+    
+    def add(self, update_id: int) -> None:
+        self.queue.put((update_id, time.monotonic()))
+    
+    def close(self) -> None:
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+    
+    def _run(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        headers = {"Content-Type": "application/json", "X-Telegram-Bot-Api-Secret-Token": SECRET}
+        while True:
+            update = self.queue.get()
+            if update is None:
+                conn.close()
+                return
+            time.sleep(self.rtt / 2)
+            conn.request("POST", "/", json.dumps(make_update(*update)), headers)
+            response = conn.getresponse()
+            response.read()
+            time.sleep(self.rtt / 2)
+            with self._lock:
+                self.statuses[response.status] = self.statuses.get(response.status, 0) + 1
+            if response.status == 503:
+                # Telegram повторит доставку после Retry-After
+                retry_after = float(response.getheader("Retry-After", "1"))
+                threading.Timer(retry_after, self.queue.put, (update,)).start()
+
+def telegram_side(mode: str, rate: float, count: int, rtt: float, port: int, pipe) -> None:
+    """
+    Сторона Telegram в отдельном процессе, чтобы генератор и отправка не делили
+    GIL с ботом: поддельный Bot API для polling или отправитель webhook.
+    """
+    logging.disable(logging.WARNING)
+    if mode == "polling":
+        api = FakeBotAPI(rtt)
+        pipe.send(api.url)
+        deliver = api.add
+    else:
+        sender = WebhookSender(port, rtt)
+        pipe.send(None)
+        deliver = sender.add
+    pipe.recv()
+    generate(rate, count, deliver)
+    pipe.recv()
+    if mode == "polling":
+        api.close()
+        pipe.send({})
+    else:
+        sender.close()
+        pipe.send(sender.statuses)
+
+async def consume(application, count: int, handler_delay: float, max_queue: list):
+    """Извлечение обновлений из update_queue; возвращает задержки обновлений."""
+    latencies = []
+    for _ in range(count):
+        update = await application.update_queue.get()
+        max_queue[0] = max(max_queue[0], application.update_queue.qsize() + 1)
+        latencies.append(time.monotonic() - float(update.message.text))
+        if handler_delay:
+            await asyncio.sleep(handler_delay)
+    return latencies
+
+async def run(mode: str, rate: float, duration: float, rtt: float, handler_rate: float = 0,
+              max_pending: int = webhook_server.MAX_PENDING_UPDATES):
+    """
+    Один замер приема обновлений.
+    
+    Returns:
+        Задержки обновлений, принято в секунду, процессорное время бота на обновление,
+        ответы webhook по кодам и наибольшая очередь
+    """
+    count = int(rate * duration)
+    pipe, child_pipe = multiprocessing.Pipe()
+    server = None
+    if mode == "polling":
+        process = multiprocessing.Process(target=telegram_side, args=(mode, rate, count, rtt, 0, child_pipe))
+        process.start()
+        application = ApplicationBuilder().token(TOKEN).base_url(pipe.recv()).build()
+        await application.initialize()
+        await application.updater.start_polling(poll_interval=0, timeout=1)
+    else:
+        application = ApplicationBuilder().token(TOKEN).build()
+        server = WebhookServer(application, SECRET, listen="127.0.0.1", port=0, max_pending_updates=max_pending)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        process = multiprocessing.Process(target=telegram_side, args=(mode, rate, count, rtt, port, child_pipe))
+        process.start()
+        # Отправитель в дочернем процессе подключается к серверу, пока цикл событий ждет
+        await asyncio.get_running_loop().run_in_executor(None, pipe.recv)
+    
+    max_queue = [0]
+    start = time.monotonic()
+    cpu_start = time.process_time()
+    pipe.send("start")
+    latencies = await consume(application, count, 1 / handler_rate if handler_rate else 0, max_queue)
+    throughput = count / (time.monotonic() - start)
+    cpu_per_update = (time.process_time() - cpu_start) / count
+    
+    if server is None:
+        await application.updater.stop()
+        await application.shutdown()
+    pipe.send("stop")
+    statuses = await asyncio.get_running_loop().run_in_executor(None, pipe.recv)
+    process.join()
+    if server is not None:
+        await server.stop()
+    return latencies, throughput, cpu_per_update, statuses, max_queue[0]
+
+def main():
+    rtt = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    
+    rows = []
+    for rate in (100, 1000, 5000):
+        for mode in ("polling", "webhook"):
+            latencies, throughput, cpu, _, _ = asyncio.run(run(mode, rate, duration, rtt))
+            rows.append((
+                rate, mode, f"{throughput:.0f}", f"{cpu * 1e6:.0f}",
+                f"{percentile(latencies, 0.5) * 1000:.1f}",
+                f"{percentile(latencies, 0.99) * 1000:.1f}"
+            ))
+    print_table(
+        f"RTT до Telegram {rtt * 1000:.0f} мс, {duration:.0f} с на замер, "
+        f"webhook через {WEBHOOK_CONNECTIONS} соединений",
+        ("обновлений/с", "режим", "принято/с", "CPU бота, мкс/обновление", "p50, мс", "p99, мс"),
+        rows
+    )
+    
+    # Обработчик в десять раз медленнее генератора; короткое ожидание места, чтобы замер был быстрым
+    webhook_server.BACKPRESSURE_TIMEOUT = 0.5
+    # Каждый ответ 503 сопровождается предупреждением в журнале
+    logging.disable(logging.WARNING)
+    max_pending = 200
+    latencies, _, _, statuses, max_queue = asyncio.run(run("webhook", 1000, 1.0, 0, 100, max_pending))
+    print_table(
+        f"Обратное давление: 1000 обновлений за 1 с, обработчик 100/с, max_pending_updates={max_pending}, "
+        f"ожидание места {webhook_server.BACKPRESSURE_TIMEOUT} с",
+        ("ответов 200", "ответов 503", "наибольшая очередь", "обработано", "p99, мс"),
+        [(statuses.get(200, 0), statuses.get(503, 0), max_queue, len(latencies),
+          f"{percentile(latencies, 0.99) * 1000:.0f}")]
+    )
+
+if __name__ == "__main__":
+    main()
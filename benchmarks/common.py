@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+from typing import List, Optional, Sequence
+
+# Модули бота лежат в корне репозитория
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Информационные сообщения модулей бота не нужны в выводе замеров
+logging.disable(logging.INFO)
+
+class LoopLag:
+    """
+    Замер отзывчивости цикла событий: задача просыпается каждые interval секунд
+    и записывает, насколько позже срока это произошло.
+    """
+    
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval (float): Период пробуждения в секундах
+        """
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+    
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(time.perf_counter() - start - self.interval)
+    
+    async def __aenter__(self) -> "LoopLag":
+        self._task = asyncio.ensure_future(self._run())
+        await asyncio.sleep(0)
+        return self
+    
+    async def __aexit__(self, *exc) -> None:
+        # Последнее пробуждение после долгой блокировки тоже должно попасть в замер
+        await asyncio.sleep(self.interval * 2)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+    
+    @property
+    def max_ms(self) -> float:
+        """Наибольшая задержка в миллисекундах."""
+        return max(self.lags, default=0.0) * 1000
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Перцентиль по отсортированной выборке (fraction от 0 до 1)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def print_table(title: str, header: Sequence[str], rows: Sequence[Sequence]) -> None:
+    """Вывод результатов замера таблицей."""
+    cells = [[str(cell) for cell in row] for row in [header, *rows]]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(header))]
+    print(f"\n{title}")
+    for index, row in enumerate(cells):
+        print("  " + "  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+        if index == 0:
+            print("  " + "  ".join("-" * width for width in widths))
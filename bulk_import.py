@@ -0,0 +1,304 @@
+import io
+import os
+import csv
+import json
+import logging
+import datetime
+from typing import Iterator, List, Optional, Tuple
+from timeutils import now_ms, to_epoch_ms
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Параметры импорта запланированных публикаций
+MAX_IMPORT_ROWS = 50000  # Максимальное число записей в одном файле
+MAX_IMPORT_FILE_SIZE = 20 * 1024 * 1024  # Максимальный размер файла (ограничение Bot API на скачивание)
+READ_BLOCK_SIZE = 64 * 1024  # Размер блока при потоковом чтении массива JSON
+MAX_ERRORS_IN_MESSAGE = 10  # Количество ошибок, показываемых в сообщении (полный отчет - файлом)
+
+# Форматы файлов импорта по расширению и MIME-типу
+FORMATS_BY_EXTENSION = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+}
+FORMATS_BY_MIME_TYPE = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "application/x-ndjson": "jsonl",
+    "application/jsonl": "jsonl",
+}
+
+# Форматы времени публикации (кроме ISO 8601)
+DATETIME_FORMATS = ("%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S")
+
+def detect_format(file_name: Optional[str], mime_type: Optional[str]) -> Optional[str]:
+    """
+    Определение формата файла импорта.
+    
+    Args:
+        file_name (Optional[str]): Имя файла
+        mime_type (Optional[str]): MIME-тип файла
+    
+    Returns:
+        Optional[str]: csv, json, jsonl или None, если формат не поддерживается
+    """
+    if file_name:
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension in FORMATS_BY_EXTENSION:
+            return FORMATS_BY_EXTENSION[extension]
+    return FORMATS_BY_MIME_TYPE.get(mime_type)
+
+def parse_scheduled_time(value: str, tz: Optional[datetime.tzinfo] = None) -> int:
+    """
+    Разбор времени публикации: ДД.ММ.ГГГГ ЧЧ:ММ (как в /new_post) или ISO 8601.
+    Время без часового пояса считается временем пользователя, как и время, введенное вручную.
+    
+    Args:
+        value (str): Время публикации
+        tz (Optional[datetime.tzinfo]): Часовой пояс пользователя (None - пояс сервера)
+    
+    Returns:
+        int: Время публикации в миллисекундах Unix
+    
+    Raises:
+        ValueError: Если время не удалось разобрать
+    """
+    value = value.strip()
+    for fmt in DATETIME_FORMATS:
+        try:
+            return to_epoch_ms(datetime.datetime.strptime(value, fmt), tz)
+        except ValueError:
+            pass
+    
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    return to_epoch_ms(datetime.datetime.fromisoformat(value), tz)
+
+def _iter_csv(f) -> Iterator[Tuple[int, object]]:
+    """Записи CSV с заголовком: (номер строки, словарь полей)."""
+    reader = csv.DictReader(f)
+    for record in reader:
+        yield reader.line_num, record
+
+def _iter_json_lines(f) -> Iterator[Tuple[int, object]]:
+    """Записи JSON Lines: (номер строки, объект). Ошибка в строке не прерывает чтение."""
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"Некорректный JSON: {e}")
+
+def _iter_json_array(f) -> Iterator[Tuple[int, object]]:
+    """
+    Потоковое чтение массива JSON: элементы декодируются по одному, и в памяти
+    держится только необработанный остаток файла.
+    
+    Yields:
+        Tuple[int, object]: Номер элемента массива (с 1) и элемент
+    
+    Raises:
+        ValueError: Если файл не является корректным массивом JSON
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    # Ожидаемый элемент: "[" в начале, значение или "]", значение, "," или "]"
+    state = "start"
+    number = 0
+    
+    while True:
+        # Пропускаем пробелы, при необходимости дочитывая файл
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError("Неожиданный конец массива JSON")
+            block = f.read(READ_BLOCK_SIZE)
+            buffer, pos, eof = block, 0, not block
+            continue
+        
+        char = buffer[pos]
+        if state == "start":
+            if char != "[":
+                raise ValueError("Файл JSON должен содержать массив записей")
+            pos += 1
+            state = "value_or_end"
+        elif state == "separator":
+            if char == ",":
+                pos += 1
+                state = "value"
+            elif char == "]":
+                return
+            else:
+                raise ValueError(f"Ожидалась запятая после записи {number}")
+        elif state == "value_or_end" and char == "]":
+            return
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # Значение на границе блока могло быть прочитано не полностью
+                complete = end < len(buffer) or eof
+            except ValueError:
+                if eof:
+                    raise ValueError(f"Некорректный JSON в записи {number + 1}")
+                complete = False
+            if not complete:
+                block = f.read(READ_BLOCK_SIZE)
+                buffer, pos, eof = buffer[pos:] + block, 0, not block
+                continue
+            number += 1
+            yield number, value
+            pos = end
+            state = "separator"
+
+def iter_records(f, fmt: str) -> Iterator[Tuple[int, object]]:
+    """
+    Потоковое чтение записей файла импорта.
+    
+    Args:
+        f: Текстовый файл
+        fmt (str): Формат файла (csv, json, jsonl)
+    
+    Yields:
+        Tuple[int, object]: Номер строки (для JSON - номер записи) и запись
+            (словарь полей или исключение, если запись не удалось декодировать)
+    """
+    if fmt == "csv":
+        return _iter_csv(f)
+    if fmt == "jsonl":
+        return _iter_json_lines(f)
+    return _iter_json_array(f)
+
+class ImportReport:
+    """Результат разбора файла импорта: корректные публикации и ошибки по записям."""
+    
+    def __init__(self):
+        """Инициализация пустого отчета."""
+        # Строки для DatabaseManager.add_scheduled_posts без ID пользователя:
+        # (платформа, текст, путь к медиафайлу, тип медиафайла, время публикации)
+        self.rows: List[Tuple] = []
+        self.errors: List[Tuple[int, str]] = []
+        self.records = 0
+    
+    def add_error(self, number: int, message: str) -> None:
+        """Добавление ошибки записи с номером number."""
+        self.errors.append((number, message))
+    
+    def error_report(self) -> bytes:
+        """
+        Полный отчет об ошибках в формате CSV.
+        
+        Returns:
+            bytes: Содержимое файла отчета в UTF-8 (с BOM для Excel)
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["line", "error"])
+        writer.writerows(self.errors)
+        return output.getvalue().encode("utf-8-sig")
+
+def validate_record(record: object, platforms: List[str], now: int,
+                    tz: Optional[datetime.tzinfo] = None) -> Tuple[List[Tuple], Optional[str]]:
+    """
+    Проверка одной записи импорта.
+    
+    Поля записи: platform (платформа, несколько через запятую или all - все платформы),
+    text (текст публикации) и scheduled_time (время публикации в будущем).
+    
+    Args:
+        record (object): Запись из файла
+        platforms (List[str]): Зарегистрированные платформы
+        now (int): Текущее время в миллисекундах Unix
+        tz (Optional[datetime.tzinfo]): Часовой пояс пользователя (None - пояс сервера)
+    
+    Returns:
+        Tuple[List[Tuple], Optional[str]]: Строки публикаций (по одной на платформу)
+            и текст ошибки (None, если запись корректна)
+    """
+    if isinstance(record, Exception):
+        return [], str(record)
+    if not isinstance(record, dict):
+        return [], "Запись должна быть объектом с полями platform, text и scheduled_time"
+    
+    text = record.get("text")
+    if not isinstance(text, str) or not text.strip():
+        return [], "Не указан текст публикации (text)"
+    
+    platform_value = record.get("platform") or ""
+    if not isinstance(platform_value, str):
+        return [], "Поле platform должно быть строкой"
+    if platform_value.strip().lower() == "all":
+        chosen = list(platforms)
+    else:
+        chosen = [name.strip().lower() for name in platform_value.split(",") if name.strip()]
+    if not chosen:
+        return [], "Не указана платформа (platform)"
+    unknown = [name for name in chosen if name not in platforms]
+    if unknown:
+        return [], f"Неподдерживаемая платформа: {', '.join(unknown)}"
+    
+    time_value = record.get("scheduled_time")
+    if not isinstance(time_value, str) or not time_value.strip():
+        return [], "Не указано время публикации (scheduled_time)"
+    try:
+        scheduled_time = parse_scheduled_time(time_value, tz)
+    except ValueError:
+        return [], f"Неверный формат времени: {time_value} (ожидается ДД.ММ.ГГГГ ЧЧ:ММ или ISO 8601)"
+    if scheduled_time <= now:
+        return [], f"Время публикации {time_value} уже прошло"
+    
+    # Повторяющиеся платформы в записи публикуются один раз
+    return [(platform, text, None, None, scheduled_time) for platform in dict.fromkeys(chosen)], None
+
+def parse_import_file(path: str, fmt: str, platforms: List[str],
+                      max_rows: int = MAX_IMPORT_ROWS,
+                      tz: Optional[datetime.tzinfo] = None) -> ImportReport:
+    """
+    Потоковый разбор и проверка файла импорта. Выполняется вне цикла событий.
+    
+    Args:
+        path (str): Путь к файлу
+        fmt (str): Формат файла (csv, json, jsonl)
+        platforms (List[str]): Зарегистрированные платформы
+        max_rows (int): Максимальное число записей
+        tz (Optional[datetime.tzinfo]): Часовой пояс пользователя (None - пояс сервера)
+    
+    Returns:
+        ImportReport: Корректные публикации и ошибки по записям
+    """
+    report = ImportReport()
+    now = now_ms()
+    
+    # utf-8-sig: файлы, сохраненные из Excel, начинаются с BOM
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        records = iter_records(f, fmt)
+        number = 0
+        try:
+            for number, record in records:
+                report.records += 1
+                if report.records > max_rows:
+                    report.add_error(number, f"Превышено максимальное число записей ({max_rows}), остаток файла пропущен")
+                    break
+                rows, error = validate_record(record, platforms, now, tz)
+                if error:
+                    report.add_error(number, error)
+                else:
+                    report.rows.extend(rows)
+        except (ValueError, csv.Error) as e:
+            # Синтаксическая ошибка файла: записи до нее уже проверены
+            report.add_error(number, f"Файл не удалось дочитать: {e}")
+    
+    logger.info(
+        f"Разобран файл импорта {path}: записей {report.records}, "
+        f"публикаций {len(report.rows)}, ошибок {len(report.errors)}"
+    )
+    return report
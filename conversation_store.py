@@ -0,0 +1,282 @@
+import time
+import json
+import logging
+import threading
+import collections
+from typing import Dict, List, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Параметры хранилища черновиков
+DRAFT_TTL = 24 * 60 * 60  # Время жизни неактивного черновика в секундах
+MAX_DRAFTS_IN_MEMORY = 10000  # Максимальное число черновиков в памяти
+
+class PostDraft:
+    """Черновик публикации, создаваемый в разговоре /new_post."""
+    
+    __slots__ = (
+        "platforms", "text", "media_path", "media_type",
+        "file_id", "file_unique_id", "mime_type", "updated_at"
+    )
+    
+    # Поля черновика в порядке столбцов таблицы conversation_drafts
+    FIELDS = __slots__[:-1]
+    
+    def __init__(self, platforms: Optional[List[str]] = None, text: Optional[str] = None,
+                 media_path: Optional[str] = None, media_type: Optional[str] = None,
+                 file_id: Optional[str] = None, file_unique_id: Optional[str] = None,
+                 mime_type: Optional[str] = None, updated_at: Optional[float] = None):
+        """
+        Инициализация черновика.
+        
+        Args:
+            platforms (Optional[List[str]]): Платформы публикации (несколько - кросспостинг)
+            text (Optional[str]): Текст публикации
+            media_path (Optional[str]): Путь к медиафайлу на диске
+            media_type (Optional[str]): Тип медиафайла (photo, video)
+            file_id (Optional[str]): ID файла Telegram, который еще не скачан
+            file_unique_id (Optional[str]): Уникальный ID файла Telegram
+            mime_type (Optional[str]): MIME-тип файла Telegram
+            updated_at (Optional[float]): Время последнего изменения в секундах Unix
+        """
+        self.platforms = platforms or []
+        self.text = text
+        self.media_path = media_path
+        self.media_type = media_type
+        # Файл Telegram скачивается только когда понятно, нужен ли он на диске
+        self.file_id = file_id
+        self.file_unique_id = file_unique_id
+        self.mime_type = mime_type
+        self.updated_at = updated_at if updated_at is not None else time.time()
+    
+    def as_row(self) -> Tuple:
+        """Значения полей черновика для записи в базу данных (платформы - через запятую)."""
+        return (",".join(self.platforms),) + tuple(getattr(self, field) for field in self.FIELDS[1:])
+    
+    @classmethod
+    def from_row(cls, row: Tuple) -> "PostDraft":
+        """Черновик из строки таблицы conversation_drafts."""
+        platforms = row[0].split(",") if row[0] else []
+        return cls(platforms, *row[1:])
+
+class ConversationStore:
+    """
+    Хранилище черновиков публикаций с вытеснением по времени жизни и ограничением размера.
+    
+    Черновики хранятся в памяти в порядке последнего обращения (LRU). Неактивные дольше
+    ttl секунд и самые старые при превышении max_entries вытесняются. При включенной
+    персистентности каждое изменение записывается в SQLite, поэтому черновики
+    переживают перезапуск бота, а вытесненные из памяти загружаются по запросу.
+    """
+    
+    def __init__(self, db_manager=None, ttl: float = DRAFT_TTL, max_entries: int = MAX_DRAFTS_IN_MEMORY):
+        """
+        Инициализация хранилища.
+        
+        Args:
+            db_manager: Менеджер базы данных для персистентного режима (None - только память)
+            ttl (float): Время жизни неактивного черновика в секундах
+            max_entries (int): Максимальное число черновиков в памяти
+        """
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._drafts: "collections.OrderedDict[int, PostDraft]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        
+        if self.db_manager:
+            # Удаляем брошенные черновики, накопившиеся до перезапуска
+            self.db_manager.delete_expired_drafts(time.time() - self.ttl)
+    
+    def _evict(self, now: float) -> None:
+        """Вытеснение устаревших и лишних черновиков. Вызывается под self._lock."""
+        while self._drafts:
+            draft = next(iter(self._drafts.values()))
+            if now - draft.updated_at <= self.ttl and len(self._drafts) <= self.max_entries:
+                break
+            self._drafts.popitem(last=False)
+    
+    def create(self, user_id: int) -> PostDraft:
+        """
+        Создание нового черновика пользователя (старый черновик заменяется).
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+        
+        Returns:
+            PostDraft: Пустой черновик
+        """
+        draft = PostDraft()
+        with self._lock:
+            self._drafts[user_id] = draft
+            self._drafts.move_to_end(user_id)
+            self._evict(draft.updated_at)
+        if self.db_manager:
+            self.db_manager.save_draft(user_id, draft.as_row(), draft.updated_at)
+        return draft
+    
+    def get(self, user_id: int) -> Optional[PostDraft]:
+        """
+        Получение черновика пользователя.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+        
+        Returns:
+            Optional[PostDraft]: Черновик или None, если его нет или он устарел
+        """
+        now = time.time()
+        with self._lock:
+            draft = self._drafts.get(user_id)
+            if draft is not None:
+                if now - draft.updated_at > self.ttl:
+                    del self._drafts[user_id]
+                    draft = None
+                else:
+                    self._drafts.move_to_end(user_id)
+        
+        if draft is None and self.db_manager:
+            # Черновик мог быть вытеснен из памяти или создан до перезапуска
+            row = self.db_manager.get_draft(user_id, now - self.ttl)
+            if row is not None:
+                draft = PostDraft.from_row(row)
+                with self._lock:
+                    self._drafts[user_id] = draft
+                    self._evict(now)
+        return draft
+    
+    def save(self, user_id: int, draft: PostDraft) -> None:
+        """
+        Сохранение изменений черновика и продление его времени жизни.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            draft (PostDraft): Измененный черновик
+        """
+        draft.updated_at = time.time()
+        with self._lock:
+            self._drafts[user_id] = draft
+            self._drafts.move_to_end(user_id)
+            self._evict(draft.updated_at)
+        if self.db_manager:
+            self.db_manager.save_draft(user_id, draft.as_row(), draft.updated_at)
+    
+    def delete(self, user_id: int) -> None:
+        """
+        Удаление черновика пользователя.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+        """
+        with self._lock:
+            self._drafts.pop(user_id, None)
+        if self.db_manager:
+            self.db_manager.delete_draft(user_id)
+    
+    async def purge_expired(self) -> int:
+        """
+        Удаление брошенных черновиков из памяти и из базы данных вместе с состояниями
+        разговоров. Без периодического вызова записи в базе данных копились бы до перезапуска.
+        
+        Returns:
+            int: Количество удаленных черновиков (в персистентном режиме - из базы данных)
+        """
+        now = time.time()
+        with self._lock:
+            # Порядок LRU не совпадает с порядком изменения, поэтому проверяются все черновики
+            expired = [user_id for user_id, draft in self._drafts.items() if now - draft.updated_at > self.ttl]
+            for user_id in expired:
+                del self._drafts[user_id]
+        if self.db_manager:
+            return await self.db_manager.delete_expired_drafts_async(now - self.ttl)
+        return len(expired)
+    
+    def __len__(self) -> int:
+        """Количество черновиков в памяти."""
+        with self._lock:
+            return len(self._drafts)
+
+class SQLitePersistence(BasePersistence):
+    """
+    Персистентность python-telegram-bot, сохраняющая только состояния ConversationHandler в SQLite.
+    
+    Данные пользователей, чатов и бота не сохраняются: черновики публикаций
+    хранит ConversationStore.
+    """
+    
+    def __init__(self, db_manager, ttl: float = DRAFT_TTL):
+        """
+        Инициализация персистентности.
+        
+        Args:
+            db_manager: Менеджер базы данных
+            ttl (float): Время, после которого брошенный разговор не восстанавливается
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=False, callback_data=False)
+        )
+        self.db_manager = db_manager
+        self.ttl = ttl
+    
+    async def get_conversations(self, name: str) -> Dict:
+        """Загрузка активных состояний разговора name."""
+        rows = self.db_manager.get_conversation_states(name, time.time() - self.ttl)
+        return {tuple(json.loads(key)): state for key, state in rows}
+    
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        """Сохранение (или удаление при new_state=None) состояния разговора."""
+        encoded_key = json.dumps(list(key))
+        if new_state is None:
+            self.db_manager.delete_conversation_state(name, encoded_key)
+        else:
+            self.db_manager.save_conversation_state(name, encoded_key, new_state, time.time())
+    
+    async def get_user_data(self) -> Dict:
+        return {}
+    
+    async def get_chat_data(self) -> Dict:
+        return {}
+    
+    async def get_bot_data(self) -> Dict:
+        return {}
+    
+    async def get_callback_data(self) -> None:
+        return None
+    
+    async def update_user_data(self, user_id: int, data: Dict) -> None:
+        pass
+    
+    async def update_chat_data(self, chat_id: int, data: Dict) -> None:
+        pass
+    
+    async def update_bot_data(self, data: Dict) -> None:
+        pass
+    
+    async def update_callback_data(self, data) -> None:
+        pass
+    
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+    
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+    
+    async def refresh_user_data(self, user_id: int, user_data: Dict) -> None:
+        pass
+    
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict) -> None:
+        pass
+    
+    async def refresh_bot_data(self, bot_data: Dict) -> None:
+        pass
+    
+    async def flush(self) -> None:
+        # Состояния записываются сразу в update_conversation
+        pass
@@ -1,8 +1,14 @@
 import os
+import asyncio
 import logging
 import sqlite3
-import datetime
-from typing import List, Tuple, Optional, Any
+import threading
+from typing import Any, Callable, List, Tuple, Optional
+from media_store import MediaStore
+from db_writer import DatabaseWriter
+from view_cache import ViewCache, VIEW_CACHE_MAX_BYTES
+from metrics import Histogram, timed_methods
+from timeutils import now_ms
 
 # Настройка логирования
 logging.basicConfig(
@@ -11,66 +17,536 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Параметры соединений с базой данных
+CACHE_SIZE_KB = 8192  # Размер страничного кэша SQLite на соединение (8 МБ)
+MMAP_SIZE = 256 * 1024 * 1024  # Размер отображаемой в память части файла БД (256 МБ)
+STATEMENT_CACHE_SIZE = 128  # Количество подготовленных выражений, кэшируемых соединением
+BUSY_TIMEOUT = 30.0  # Время ожидания блокировки записи в секундах
+
+# Длительность каждого публичного метода DatabaseManager
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Длительность операций с базой данных",
+    ("method",)
+)
+
+# Миграции схемы: (версия, описание, SQL-выражения). Применяются по порядку к базам
+# с PRAGMA user_version меньше версии миграции, в том числе к уже существующим файлам
+MIGRATIONS = [
+    (1, "таблицы posts и scheduled_posts", [
+        '''
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            text TEXT NOT NULL,
+            media_path TEXT,
+            social_post_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS scheduled_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            text TEXT NOT NULL,
+            media_path TEXT,
+            media_type TEXT,
+            scheduled_time TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, "индексы для истории и очереди запланированных постов", [
+        # /history: WHERE user_id = ? ORDER BY created_at DESC без сортировки в памяти
+        '''
+        CREATE INDEX IF NOT EXISTS idx_posts_user_created
+        ON posts (user_id, created_at, id)
+        ''',
+        # /scheduled: WHERE user_id = ? AND scheduled_time > ... ORDER BY scheduled_time
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_posts_user_time
+        ON scheduled_posts (user_id, scheduled_time)
+        ''',
+        # Планировщик: диапазон по scheduled_time; покрывает выборку (id, scheduled_time),
+        # так как id является rowid и хранится в каждой записи индекса
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_posts_time
+        ON scheduled_posts (scheduled_time)
+        ''',
+        "ANALYZE",
+    ]),
+    (3, "контентно-адресуемое хранилище медиафайлов и кэш media_id", [
+        # Файлы хранилища: один файл на уникальное содержимое
+        '''
+        CREATE TABLE IF NOT EXISTS media_files (
+            content_hash TEXT PRIMARY KEY,
+            path TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Соответствие файлов Telegram (file_unique_id) хэшу содержимого
+        '''
+        CREATE TABLE IF NOT EXISTS media_aliases (
+            telegram_file_unique_id TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL
+        )
+        ''',
+        # Загруженные в социальные сети медиафайлы, пока их media_id действителен
+        '''
+        CREATE TABLE IF NOT EXISTS media_upload_cache (
+            content_hash TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            media_id TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (content_hash, platform)
+        )
+        ''',
+        # Подсчет ссылок на медиафайл из posts и scheduled_posts
+        '''
+        CREATE INDEX IF NOT EXISTS idx_posts_media_path
+        ON posts (media_path)
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_posts_media_path
+        ON scheduled_posts (media_path)
+        ''',
+    ]),
+    (4, "черновики публикаций и состояния разговоров", [
+        # Незавершенные черновики /new_post, переживающие перезапуск бота
+        '''
+        CREATE TABLE IF NOT EXISTS conversation_drafts (
+            user_id INTEGER PRIMARY KEY,
+            platform TEXT,
+            text TEXT,
+            media_path TEXT,
+            media_type TEXT,
+            file_id TEXT,
+            file_unique_id TEXT,
+            mime_type TEXT,
+            updated_at REAL NOT NULL
+        )
+        ''',
+        # Очистка брошенных черновиков по времени последнего изменения
+        '''
+        CREATE INDEX IF NOT EXISTS idx_conversation_drafts_updated
+        ON conversation_drafts (updated_at)
+        ''',
+        # Состояния ConversationHandler (ключ - JSON-список из chat_id и user_id)
+        '''
+        CREATE TABLE IF NOT EXISTS conversation_states (
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            state INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (name, key)
+        )
+        ''',
+    ]),
+    (5, "аренды для выбора ведущего процесса", [
+        # Аренда принадлежит процессу owner до expires_at (секунды Unix)
+        '''
+        CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''',
+    ]),
+    (6, "состояния публикации запланированных постов и ключи идемпотентности", [
+        # pending -> claimed -> published / failed. Захват действует до lease_expires_at
+        "ALTER TABLE scheduled_posts ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'",
+        "ALTER TABLE scheduled_posts ADD COLUMN claimed_by TEXT",
+        "ALTER TABLE scheduled_posts ADD COLUMN lease_expires_at REAL",
+        # ID опубликованного поста сохраняется сразу после публикации, до записи в историю
+        "ALTER TABLE scheduled_posts ADD COLUMN social_post_id TEXT",
+        # Повторное завершение той же публикации не создает вторую запись в истории
+        "ALTER TABLE posts ADD COLUMN idempotency_key TEXT",
+        '''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_posts_idempotency_key
+        ON posts (idempotency_key)
+        ''',
+        # Загрузка очереди планировщика без просмотра опубликованных постов
+        '''
+        CREATE INDEX IF NOT EXISTS idx_scheduled_posts_active
+        ON scheduled_posts (id)
+        WHERE status IN ('pending', 'claimed')
+        ''',
+    ]),
+    (7, "повторные попытки публикации и таблица неудавшихся постов", [
+        "ALTER TABLE scheduled_posts ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0",
+        # Время следующей попытки в секундах Unix (NULL - по scheduled_time)
+        "ALTER TABLE scheduled_posts ADD COLUMN next_attempt_at REAL",
+        "ALTER TABLE scheduled_posts ADD COLUMN last_error TEXT",
+        # Посты, от публикации которых планировщик отказался
+        '''
+        CREATE TABLE IF NOT EXISTS dead_letter_posts (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            text TEXT NOT NULL,
+            media_path TEXT,
+            media_type TEXT,
+            scheduled_time TIMESTAMP NOT NULL,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            failed_at REAL NOT NULL
+        )
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_dead_letter_posts_user
+        ON dead_letter_posts (user_id, failed_at)
+        ''',
+    ]),
+    (8, "статистика вовлеченности опубликованных постов", [
+        # Последние значения счетчиков поста и время следующего обновления в секундах Unix
+        # (NULL - пост больше не отслеживается)
+        "ALTER TABLE posts ADD COLUMN likes INTEGER",
+        "ALTER TABLE posts ADD COLUMN retweets INTEGER",
+        "ALTER TABLE posts ADD COLUMN replies INTEGER",
+        "ALTER TABLE posts ADD COLUMN engagement_at REAL",
+        "ALTER TABLE posts ADD COLUMN engagement_due_at REAL",
+        # Посты последнего месяца начинают отслеживаться сразу
+        '''
+        UPDATE posts SET engagement_due_at = 0
+        WHERE status = 'published' AND created_at >= datetime('now', '-30 days')
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_posts_engagement_due
+        ON posts (engagement_due_at)
+        WHERE engagement_due_at IS NOT NULL
+        ''',
+        # Временной ряд замеров: первичный ключ кластеризует замеры поста по времени
+        '''
+        CREATE TABLE IF NOT EXISTS post_engagement (
+            post_id INTEGER NOT NULL,
+            collected_at INTEGER NOT NULL,
+            likes INTEGER NOT NULL,
+            retweets INTEGER NOT NULL,
+            replies INTEGER NOT NULL,
+            PRIMARY KEY (post_id, collected_at)
+        ) WITHOUT ROWID
+        ''',
+        # Прирост вовлеченности по пользователям и дням (номер дня UTC с начала эпохи Unix)
+        '''
+        CREATE TABLE IF NOT EXISTS user_engagement_daily (
+            user_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            likes INTEGER NOT NULL,
+            retweets INTEGER NOT NULL,
+            replies INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (9, "время в миллисекундах Unix и часовые пояса пользователей", [
+        # Время публикации и создания хранится целым числом миллисекунд Unix (UTC):
+        # диапазоны по индексам сравнивают целые числа, а не строки, и не зависят от
+        # часового пояса сервера. SQLite не меняет тип столбца, поэтому таблицы пересоздаются.
+        # Прежнее scheduled_time - местное время сервера без пояса ('utc' переводит его в UTC),
+        # created_at - CURRENT_TIMESTAMP в UTC, next_attempt_at - секунды Unix
+        '''
+        CREATE TABLE scheduled_posts_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            text TEXT NOT NULL,
+            media_path TEXT,
+            media_type TEXT,
+            scheduled_time INTEGER NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT (CAST(ROUND((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+            status TEXT NOT NULL DEFAULT 'pending',
+            claimed_by TEXT,
+            lease_expires_at REAL,
+            social_post_id TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER,
+            last_error TEXT
+        )
+        ''',
+        '''
+        INSERT INTO scheduled_posts_new
+        SELECT id, user_id, platform, text, media_path, media_type,
+            CAST(ROUND((julianday(scheduled_time, 'utc') - 2440587.5) * 86400000) AS INTEGER),
+            COALESCE(CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER), 0),
+            status, claimed_by, lease_expires_at, social_post_id, attempts,
+            CAST(ROUND(next_attempt_at * 1000) AS INTEGER), last_error
+        FROM scheduled_posts
+        ''',
+        '''
+        CREATE TABLE posts_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            text TEXT NOT NULL,
+            media_path TEXT,
+            social_post_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at INTEGER NOT NULL DEFAULT (CAST(ROUND((julianday('now') - 2440587.5) * 86400000) AS INTEGER)),
+            idempotency_key TEXT,
+            likes INTEGER,
+            retweets INTEGER,
+            replies INTEGER,
+            engagement_at REAL,
+            engagement_due_at REAL
+        )
+        ''',
+        '''
+        INSERT INTO posts_new
+        SELECT id, user_id, platform, text, media_path, social_post_id, status,
+            COALESCE(CAST(ROUND((julianday(created_at) - 2440587.5) * 86400000) AS INTEGER), 0),
+            idempotency_key, likes, retweets, replies, engagement_at, engagement_due_at
+        FROM posts
+        ''',
+        '''
+        CREATE TABLE dead_letter_posts_new (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            text TEXT NOT NULL,
+            media_path TEXT,
+            media_type TEXT,
+            scheduled_time INTEGER NOT NULL,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            failed_at REAL NOT NULL
+        )
+        ''',
+        '''
+        INSERT INTO dead_letter_posts_new
+        SELECT id, user_id, platform, text, media_path, media_type,
+            CAST(ROUND((julianday(scheduled_time, 'utc') - 2440587.5) * 86400000) AS INTEGER),
+            attempts, last_error, failed_at
+        FROM dead_letter_posts
+        ''',
+        # Счетчики AUTOINCREMENT переносятся, чтобы ID удаленных постов не выдавались повторно
+        "DELETE FROM sqlite_sequence WHERE name IN ('scheduled_posts_new', 'posts_new')",
+        "UPDATE sqlite_sequence SET name = name || '_new' WHERE name IN ('scheduled_posts', 'posts')",
+        "DROP TABLE scheduled_posts",
+        "DROP TABLE posts",
+        "DROP TABLE dead_letter_posts",
+        "ALTER TABLE scheduled_posts_new RENAME TO scheduled_posts",
+        "ALTER TABLE posts_new RENAME TO posts",
+        "ALTER TABLE dead_letter_posts_new RENAME TO dead_letter_posts",
+        # Индексы удаленных таблиц создаются заново
+        "CREATE INDEX idx_posts_user_created ON posts (user_id, created_at, id)",
+        "CREATE INDEX idx_posts_media_path ON posts (media_path)",
+        "CREATE UNIQUE INDEX idx_posts_idempotency_key ON posts (idempotency_key)",
+        '''
+        CREATE INDEX idx_posts_engagement_due
+        ON posts (engagement_due_at)
+        WHERE engagement_due_at IS NOT NULL
+        ''',
+        "CREATE INDEX idx_scheduled_posts_user_time ON scheduled_posts (user_id, scheduled_time)",
+        "CREATE INDEX idx_scheduled_posts_time ON scheduled_posts (scheduled_time)",
+        "CREATE INDEX idx_scheduled_posts_media_path ON scheduled_posts (media_path)",
+        '''
+        CREATE INDEX idx_scheduled_posts_active
+        ON scheduled_posts (id)
+        WHERE status IN ('pending', 'claimed')
+        ''',
+        "CREATE INDEX idx_dead_letter_posts_user ON dead_letter_posts (user_id, failed_at)",
+        # Часовой пояс пользователя (имя базы IANA, например Europe/Moscow)
+        '''
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id INTEGER PRIMARY KEY,
+            timezone TEXT
+        )
+        ''',
+        "ANALYZE",
+    ]),
+    (10, "медиафайлы запланированных постов, загруженные заранее", [
+        # media_id, полученный до времени публикации, и срок его действия в миллисекундах
+        # Unix (NULL - неизвестен); в момент публикации остается только создать пост
+        "ALTER TABLE scheduled_posts ADD COLUMN staged_media_id TEXT",
+        "ALTER TABLE scheduled_posts ADD COLUMN staged_media_expires_at INTEGER",
+    ]),
+    (11, "оптимизированные варианты изображений", [
+        # Хэш исходного изображения -> хэш результата оптимизации с заданными параметрами
+        '''
+        CREATE TABLE IF NOT EXISTS media_variants (
+            source_hash TEXT NOT NULL,
+            profile TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            PRIMARY KEY (source_hash, profile)
+        )
+        ''',
+    ]),
+]
+
+@timed_methods(DB_QUERY_SECONDS, exclude=("close",))
 class DatabaseManager:
     """Класс для работы с базой данных SQLite."""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, media_root: str = "media", view_cache_bytes: int = VIEW_CACHE_MAX_BYTES):
         """
         Инициализация менеджера базы данных.
         
         Args:
             db_path (str): Путь к файлу базы данных
+            media_root (str): Каталог хранилища медиафайлов
+            view_cache_bytes (int): Объем кэша отображений /history и /scheduled в байтах
         """
         self.db_path = db_path
+        # У каждого потока (цикл событий бота, поток планировщика) свое долгоживущее соединение
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.init_db()
+        
+        # Записи из обработчиков и планировщика выполняет один поток с групповой фиксацией
+        self.writer = DatabaseWriter(self._get_connection)
+        
+        # Медиафайлы постов хранятся по хэшу содержимого и удаляются по последней ссылке
+        self.media_store = MediaStore(self, media_root)
+        
+        # Готовые отображения пользователей; сбрасываются методами записи ниже
+        self.view_cache = ViewCache(view_cache_bytes)
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """
+        Получение постоянного соединения для текущего потока.
+        
+        Соединение создается один раз на поток, переводится в режим WAL и
+        переиспользует подготовленные выражения между вызовами.
+        
+        Returns:
+            sqlite3.Connection: Соединение с базой данных
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            # Соединение используется только своим потоком, но закрывается из close()
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        
+        self._local.conn = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    def close(self) -> None:
+        """Закрытие всех открытых соединений с базой данных."""
+        # Операции, уже поставленные в очередь, фиксируются до закрытия соединений
+        self.writer.stop()
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.error(f"Ошибка при закрытии соединения с базой данных: {e}")
+            self._connections.clear()
+        self._local = threading.local()
+    
+    def _rollback(self) -> None:
+        """Откат незавершенной транзакции текущего потока после ошибки."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+    
+    def _write(self, operation: Callable, args: Tuple, action: str, default: Any = None,
+               done: Optional[Callable] = None) -> Any:
+        """
+        Выполнение операции в потоке записи с ожиданием фиксации.
+        
+        Args:
+            operation (Callable): Операция (соединение, *args) -> результат
+            args (Tuple): Аргументы операции
+            action (str): Описание операции для журнала ошибок
+            default (Any): Результат при ошибке базы данных
+            done (Optional[Callable]): Действия после фиксации (результат, *args) -> результат метода
+            
+        Returns:
+            Any: Результат done (или операции, если done не задан) либо default
+        """
+        try:
+            result = self.writer.submit(operation, *args).result()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при {action}: {e}")
+            return default
+        return done(result, *args) if done else result
+    
+    async def _write_async(self, operation: Callable, args: Tuple, action: str, default: Any = None,
+                           done: Optional[Callable] = None) -> Any:
+        """Вариант _write для цикла событий: фиксация ожидается без блокировки цикла."""
+        try:
+            result = await asyncio.wrap_future(self.writer.submit(operation, *args))
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при {action}: {e}")
+            return default
+        return done(result, *args) if done else result
+    
+    def _write_later(self, operation: Callable, args: Tuple, action: str) -> None:
+        """Постановка операции в очередь потока записи без ожидания; ошибка записывается в журнал."""
+        def log_error(future) -> None:
+            if not future.cancelled() and future.exception() is not None:
+                logger.error(f"Ошибка при {action}: {future.exception()}")
+        
+        self.writer.submit(operation, *args).add_done_callback(log_error)
     
     def init_db(self) -> None:
-        """Инициализация базы данных и создание необходимых таблиц, если они не существуют."""
+        """Инициализация базы данных: создание таблиц и применение недостающих миграций схемы."""
         # Проверяем существование директории
         db_dir = os.path.dirname(self.db_path)
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
         
         try:
-            # Создаем соединение с базой данных
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Получаем соединение с базой данных
+            conn = self._get_connection()
             
-            # Создаем таблицу для хранения опубликованных постов
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                platform TEXT NOT NULL,
-                text TEXT NOT NULL,
-                media_path TEXT,
-                social_post_id TEXT NOT NULL,
-                status TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-            
-            # Создаем таблицу для хранения запланированных постов
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS scheduled_posts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                platform TEXT NOT NULL,
-                text TEXT NOT NULL,
-                media_path TEXT,
-                media_type TEXT,
-                scheduled_time TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
+            # Номер последней примененной миграции хранится в заголовке файла БД
+            current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+            
+            for version, description, statements in MIGRATIONS:
+                if version <= current_version:
+                    continue
+                
+                # Каждая миграция применяется в отдельной транзакции вместе с номером версии
+                conn.execute("BEGIN IMMEDIATE")
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+                logger.info(f"Применена миграция базы данных {version}: {description}")
             
-            conn.commit()
             logger.info("База данных успешно инициализирована")
         except sqlite3.Error as e:
+            self._rollback()
             logger.error(f"Ошибка при инициализации базы данных: {e}")
-        finally:
-            if conn:
-                conn.close()
+    
+    def _add_post(self, conn: sqlite3.Connection, user_id: int, platform: str, text: str,
+                  media_path: Optional[str], social_post_id: str, status: str) -> int:
+        """Операция записи add_post. Выполняется в потоке записи."""
+        cursor = conn.execute(
+            '''
+            INSERT INTO posts
+            (user_id, platform, text, media_path, social_post_id, status, engagement_due_at)
+            VALUES (?, ?, ?, ?, ?, ?, CASE WHEN ? = 'published' THEN 0 END)
+            ''',
+            (user_id, platform, text, media_path, social_post_id, status, status)
+        )
+        return cursor.lastrowid
+    
+    def _post_added(self, post_id: int, user_id: int, *_) -> int:
+        """Действия после фиксации add_post."""
+        self.view_cache.invalidate(user_id, "history")
+        logger.info(f"Пост успешно добавлен в базу данных, ID: {post_id}")
+        return post_id
     
     def add_post(self, user_id: int, platform: str, text: str, media_path: Optional[str], 
                  social_post_id: str, status: str) -> int:
@@ -88,32 +564,40 @@ class DatabaseManager:
         Returns:
             int: ID добавленной записи
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                '''
-                INSERT INTO posts (user_id, platform, text, media_path, social_post_id, status)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ''',
-                (user_id, platform, text, media_path, social_post_id, status)
-            )
-            
-            post_id = cursor.lastrowid
-            conn.commit()
-            logger.info(f"Пост успешно добавлен в базу данных, ID: {post_id}")
-            
-            return post_id
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка при добавлении поста в базу данных: {e}")
-            return -1
-        finally:
-            if conn:
-                conn.close()
+        return self._write(
+            self._add_post, (user_id, platform, text, media_path, social_post_id, status),
+            "добавлении поста в базу данных", -1, self._post_added
+        )
+    
+    async def add_post_async(self, user_id: int, platform: str, text: str, media_path: Optional[str],
+                             social_post_id: str, status: str) -> int:
+        """Вариант add_post для цикла событий: ожидание фиксации не блокирует цикл."""
+        return await self._write_async(
+            self._add_post, (user_id, platform, text, media_path, social_post_id, status),
+            "добавлении поста в базу данных", -1, self._post_added
+        )
+    
+    def _add_scheduled_post(self, conn: sqlite3.Connection, user_id: int, platform: str, text: str,
+                            media_path: Optional[str], media_type: Optional[str], scheduled_time: int) -> int:
+        """Операция записи add_scheduled_post. Выполняется в потоке записи."""
+        cursor = conn.execute(
+            '''
+            INSERT INTO scheduled_posts 
+            (user_id, platform, text, media_path, media_type, scheduled_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            (user_id, platform, text, media_path, media_type, scheduled_time)
+        )
+        return cursor.lastrowid
+    
+    def _scheduled_post_added(self, post_id: int, user_id: int, *_) -> int:
+        """Действия после фиксации add_scheduled_post."""
+        self.view_cache.invalidate(user_id, "scheduled")
+        logger.info(f"Запланированный пост успешно добавлен в базу данных, ID: {post_id}")
+        return post_id
     
     def add_scheduled_post(self, user_id: int, platform: str, text: str, media_path: Optional[str],
-                           media_type: Optional[str], scheduled_time: datetime.datetime) -> int:
+                           media_type: Optional[str], scheduled_time: int) -> int:
         """
         Добавление запланированного поста в базу данных.
         
@@ -123,35 +607,83 @@ class DatabaseManager:
             text (str): Текст публикации
             media_path (Optional[str]): Путь к медиафайлу
             media_type (Optional[str]): Тип медиафайла (photo, video)
-            scheduled_time (datetime.datetime): Запланированное время публикации
+            scheduled_time (int): Запланированное время публикации в миллисекундах Unix
             
         Returns:
             int: ID добавленной записи
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                '''
-                INSERT INTO scheduled_posts 
-                (user_id, platform, text, media_path, media_type, scheduled_time)
-                VALUES (?, ?, ?, ?, ?, ?)
-                ''',
-                (user_id, platform, text, media_path, media_type, scheduled_time)
-            )
-            
-            post_id = cursor.lastrowid
-            conn.commit()
-            logger.info(f"Запланированный пост успешно добавлен в базу данных, ID: {post_id}")
+        return self._write(
+            self._add_scheduled_post, (user_id, platform, text, media_path, media_type, scheduled_time),
+            "добавлении запланированного поста в базу данных", -1, self._scheduled_post_added
+        )
+    
+    async def add_scheduled_post_async(self, user_id: int, platform: str, text: str, media_path: Optional[str],
+                                       media_type: Optional[str], scheduled_time: int) -> int:
+        """Вариант add_scheduled_post для цикла событий."""
+        return await self._write_async(
+            self._add_scheduled_post, (user_id, platform, text, media_path, media_type, scheduled_time),
+            "добавлении запланированного поста в базу данных", -1, self._scheduled_post_added
+        )
+    
+    def _add_scheduled_posts(self, conn: sqlite3.Connection, user_id: int, rows: List[Tuple]) -> List[Tuple[int, int]]:
+        """Операция записи add_scheduled_posts. Выполняется в потоке записи."""
+        cursor = conn.cursor()
+        
+        # Транзакция потока записи держит блокировку записи: ID, выданные после
+        # текущего максимума, принадлежат только этой операции
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM scheduled_posts")
+        last_id = cursor.fetchone()[0]
+        
+        cursor.executemany(
+            '''
+            INSERT INTO scheduled_posts 
+            (user_id, platform, text, media_path, media_type, scheduled_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            ((user_id,) + tuple(row) for row in rows)
+        )
+        
+        cursor.execute(
+            '''
+            SELECT id, scheduled_time
+            FROM scheduled_posts
+            WHERE id > ?
+            ORDER BY id
+            ''',
+            (last_id,)
+        )
+        return cursor.fetchall()
+    
+    def _scheduled_posts_added(self, added: List[Tuple[int, int]], user_id: int, *_) -> List[Tuple[int, int]]:
+        """Действия после фиксации add_scheduled_posts."""
+        self.view_cache.invalidate(user_id, "scheduled")
+        logger.info(f"В базу данных добавлено запланированных постов: {len(added)}")
+        return added
+    
+    def add_scheduled_posts(self, user_id: int, rows: List[Tuple]) -> List[Tuple[int, int]]:
+        """
+        Добавление нескольких запланированных постов одной транзакцией (массовый импорт).
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            rows (List[Tuple]): Строки (платформа, текст, путь к медиафайлу, тип медиафайла,
+                время публикации в миллисекундах Unix)
             
-            return post_id
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка при добавлении запланированного поста в базу данных: {e}")
-            return -1
-        finally:
-            if conn:
-                conn.close()
+        Returns:
+            List[Tuple[int, int]]: Пары (ID поста, время публикации) в порядке rows
+                или пустой список при ошибке (тогда не добавлен ни один пост)
+        """
+        return self._write(
+            self._add_scheduled_posts, (user_id, rows),
+            "добавлении запланированных постов в базу данных", [], self._scheduled_posts_added
+        )
+    
+    async def add_scheduled_posts_async(self, user_id: int, rows: List[Tuple]) -> List[Tuple[int, int]]:
+        """Вариант add_scheduled_posts для цикла событий."""
+        return await self._write_async(
+            self._add_scheduled_posts, (user_id, rows),
+            "добавлении запланированных постов в базу данных", [], self._scheduled_posts_added
+        )
     
     def get_user_posts(self, user_id: int) -> List[Tuple]:
         """
@@ -164,9 +696,7 @@ class DatabaseManager:
             List[Tuple]: Список кортежей с информацией о постах
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            # Устанавливаем row_factory для получения строк в виде кортежей
-            conn.row_factory = sqlite3.Row
+            conn = self._get_connection()
             cursor = conn.cursor()
             
             cursor.execute(
@@ -184,9 +714,75 @@ class DatabaseManager:
         except sqlite3.Error as e:
             logger.error(f"Ошибка при получении постов пользователя: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
+    
+    def get_user_posts_page(self, user_id: int, limit: int,
+                            cursor: Optional[Tuple[int, int]] = None,
+                            older: bool = True) -> Tuple[List[Tuple], bool]:
+        """
+        Получение одной страницы истории постов пользователя (keyset-пагинация).
+        
+        Страница выбирается по ключу (created_at, id) через индекс idx_posts_user_created,
+        поэтому время выборки не зависит от длины истории.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            limit (int): Размер страницы
+            cursor (Optional[Tuple[int, int]]): Ключ (created_at, id) граничного поста
+                предыдущей страницы; None - первая (самая новая) страница
+            older (bool): True - посты старше курсора, False - новее курсора
+            
+        Returns:
+            Tuple[List[Tuple], bool]: Посты страницы от новых к старым и признак того,
+                что в направлении листания есть еще посты
+        """
+        try:
+            conn = self._get_connection()
+            cursor_obj = conn.cursor()
+            
+            if cursor is None:
+                cursor_obj.execute(
+                    '''
+                    SELECT id, platform, text, media_path, social_post_id, status, created_at
+                    FROM posts
+                    WHERE user_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                    ''',
+                    (user_id, limit + 1)
+                )
+            elif older:
+                cursor_obj.execute(
+                    '''
+                    SELECT id, platform, text, media_path, social_post_id, status, created_at
+                    FROM posts
+                    WHERE user_id = ? AND (created_at, id) < (?, ?)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                    ''',
+                    (user_id, cursor[0], cursor[1], limit + 1)
+                )
+            else:
+                cursor_obj.execute(
+                    '''
+                    SELECT id, platform, text, media_path, social_post_id, status, created_at
+                    FROM posts
+                    WHERE user_id = ? AND (created_at, id) > (?, ?)
+                    ORDER BY created_at ASC, id ASC
+                    LIMIT ?
+                    ''',
+                    (user_id, cursor[0], cursor[1], limit + 1)
+                )
+            
+            posts = cursor_obj.fetchall()
+            has_more = len(posts) > limit
+            posts = posts[:limit]
+            if cursor is not None and not older:
+                # Более новые посты выбирались по возрастанию, возвращаем от новых к старым
+                posts.reverse()
+            return posts, has_more
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении страницы истории постов: {e}")
+            return [], False
     
     def get_scheduled_posts(self, user_id: int) -> List[Tuple]:
         """
@@ -197,21 +793,22 @@ class DatabaseManager:
             
         Returns:
             List[Tuple]: Список кортежей с информацией о запланированных постах
+                (время публикации - в миллисекундах Unix)
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            # Настройка для возврата datetime вместо строк
-            conn.row_factory = sqlite3.Row
+            conn = self._get_connection()
             cursor = conn.cursor()
             
+            # Диапазон по индексу idx_scheduled_posts_user_time - сравнение целых чисел
             cursor.execute(
                 '''
                 SELECT id, platform, text, media_path, media_type, scheduled_time
                 FROM scheduled_posts
-                WHERE user_id = ? AND scheduled_time > datetime('now')
+                WHERE user_id = ? AND scheduled_time > ?
+                AND status IN ('pending', 'claimed')
                 ORDER BY scheduled_time ASC
                 ''',
-                (user_id,)
+                (user_id, now_ms())
             )
             
             posts = cursor.fetchall()
@@ -219,9 +816,6 @@ class DatabaseManager:
         except sqlite3.Error as e:
             logger.error(f"Ошибка при получении запланированных постов пользователя: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
     
     def get_post_by_id(self, user_id: int, post_id: str) -> Optional[Tuple]:
         """
@@ -235,7 +829,7 @@ class DatabaseManager:
             Optional[Tuple]: Кортеж с информацией о посте или None, если пост не найден
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
             cursor.execute(
@@ -252,9 +846,6 @@ class DatabaseManager:
         except sqlite3.Error as e:
             logger.error(f"Ошибка при получении информации о посте: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
     
     def get_scheduled_post_by_id(self, user_id: int, post_id: int) -> Optional[Tuple]:
         """
@@ -268,14 +859,14 @@ class DatabaseManager:
             Optional[Tuple]: Кортеж с информацией о запланированном посте или None
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
             cursor.execute(
                 '''
                 SELECT id, platform, text, media_path, media_type, scheduled_time
                 FROM scheduled_posts
-                WHERE id = ? AND user_id = ?
+                WHERE id = ? AND user_id = ? AND status != 'published'
                 ''',
                 (post_id, user_id)
             )
@@ -285,9 +876,42 @@ class DatabaseManager:
         except sqlite3.Error as e:
             logger.error(f"Ошибка при получении информации о запланированном посте: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
+    
+    def _delete_post(self, conn: sqlite3.Connection, user_id: int, post_id: str) -> Tuple[bool, Optional[str]]:
+        """Операция записи delete_post: признак удаления и путь к медиафайлу, если он больше не нужен."""
+        cursor = conn.cursor()
+        
+        # Удаляем запись и получаем путь к медиафайлу, если он есть
+        cursor.execute(
+            '''
+            DELETE FROM posts
+            WHERE id = ? AND user_id = ?
+            RETURNING media_path
+            ''',
+            (post_id, user_id)
+        )
+        
+        post = cursor.fetchone()
+        if post is None:
+            return False, None
+        
+        # Замеры удаленного поста больше не нужны; прирост за прошлые дни сохраняется
+        cursor.execute("DELETE FROM post_engagement WHERE post_id = ?", (post_id,))
+        
+        # Медиафайл удаляется, только если на него больше не ссылается ни один пост
+        media_path = post[0]
+        if media_path and not self._delete_media_file_if_unused(conn, media_path):
+            media_path = None
+        return True, media_path
+    
+    def _post_deleted(self, result: Tuple[bool, Optional[str]], user_id: int, *_) -> bool:
+        """Действия после фиксации delete_post."""
+        deleted, unused_media_path = result
+        if deleted:
+            self.view_cache.invalidate(user_id, "history")
+        if unused_media_path:
+            self.media_store.remove_file(unused_media_path)
+        return deleted
     
     def delete_post(self, user_id: int, post_id: str) -> bool:
         """
@@ -300,48 +924,52 @@ class DatabaseManager:
         Returns:
             bool: True если удаление успешно, иначе False
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Получаем информацию о посте для удаления медиафайла, если он есть
-            cursor.execute(
-                '''
-                SELECT media_path FROM posts
-                WHERE id = ? AND user_id = ?
-                ''',
-                (post_id, user_id)
-            )
-            
-            post = cursor.fetchone()
-            
-            if post and post[0]:
-                media_path = post[0]
-                # Удаляем медиафайл, если он существует
-                if os.path.exists(media_path):
-                    os.remove(media_path)
-            
-            # Удаляем запись из базы данных
-            cursor.execute(
-                '''
-                DELETE FROM posts
-                WHERE id = ? AND user_id = ?
-                ''',
-                (post_id, user_id)
-            )
-            
-            conn.commit()
-            return cursor.rowcount > 0
-        except sqlite3.Error as e:
-            logger.error(f"Ошибка при удалении поста: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+        return self._write(
+            self._delete_post, (user_id, post_id), "удалении поста", False, self._post_deleted
+        )
+    
+    async def delete_post_async(self, user_id: int, post_id: str) -> bool:
+        """Вариант delete_post для цикла событий."""
+        return await self._write_async(
+            self._delete_post, (user_id, post_id), "удалении поста", False, self._post_deleted
+        )
+    
+    def _delete_scheduled_post(self, conn: sqlite3.Connection, user_id: int,
+                               post_id: int) -> Tuple[bool, Optional[str]]:
+        """Операция записи delete_scheduled_post: признак удаления и путь к ненужному медиафайлу."""
+        # Пост, который уже публикуется или опубликован, не удаляется
+        cursor = conn.execute(
+            '''
+            DELETE FROM scheduled_posts
+            WHERE id = ? AND user_id = ? AND status IN ('pending', 'failed')
+            RETURNING media_path
+            ''',
+            (post_id, user_id)
+        )
+        
+        post = cursor.fetchone()
+        if post is None:
+            return False, None
+        
+        # Медиафайл удаляется, только если на него больше не ссылается ни один пост
+        media_path = post[0]
+        if media_path and not self._delete_media_file_if_unused(conn, media_path):
+            media_path = None
+        return True, media_path
+    
+    def _scheduled_post_deleted(self, result: Tuple[bool, Optional[str]], user_id: int, *_) -> bool:
+        """Действия после фиксации delete_scheduled_post."""
+        deleted, unused_media_path = result
+        if deleted:
+            self.view_cache.invalidate(user_id, "scheduled")
+        if unused_media_path:
+            self.media_store.remove_file(unused_media_path)
+        return deleted
     
     def delete_scheduled_post(self, user_id: int, post_id: int) -> bool:
         """
-        Удаление запланированного поста из базы данных.
+        Удаление запланированного поста из базы данных. Пост, который уже публикуется
+        или опубликован, не удаляется.
         
         Args:
             user_id (int): ID пользователя Telegram
@@ -350,105 +978,1385 @@ class DatabaseManager:
         Returns:
             bool: True если удаление успешно, иначе False
         """
+        return self._write(
+            self._delete_scheduled_post, (user_id, post_id),
+            "удалении запланированного поста", False, self._scheduled_post_deleted
+        )
+    
+    async def delete_scheduled_post_async(self, user_id: int, post_id: int) -> bool:
+        """Вариант delete_scheduled_post для цикла событий."""
+        return await self._write_async(
+            self._delete_scheduled_post, (user_id, post_id),
+            "удалении запланированного поста", False, self._scheduled_post_deleted
+        )
+    
+    def get_pending_scheduled_posts(self) -> List[Tuple]:
+        """
+        Получение запланированных постов, которые должны быть опубликованы.
+        
+        Returns:
+            List[Tuple]: Список кортежей с информацией о запланированных постах
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
-            # Получаем информацию о посте для удаления медиафайла, если он есть
+            # Получаем посты, запланированные на период до текущего времени
             cursor.execute(
                 '''
-                SELECT media_path FROM scheduled_posts
-                WHERE id = ? AND user_id = ?
+                SELECT id, user_id, platform, text, media_path, media_type
+                FROM scheduled_posts
+                WHERE scheduled_time <= ? AND status = 'pending'
+                ORDER BY scheduled_time ASC
                 ''',
-                (post_id, user_id)
+                (now_ms(),)
             )
             
-            post = cursor.fetchone()
-            
-            if post and post[0]:
-                media_path = post[0]
-                # Удаляем медиафайл, если он существует
-                if os.path.exists(media_path):
-                    os.remove(media_path)
+            posts = cursor.fetchall()
+            return posts
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении запланированных постов: {e}")
+            return []
+
+    def get_scheduled_post_times(self, after_id: int = 0) -> List[Tuple[int, int, bool]]:
+        """
+        Получение времени публикации неопубликованных запланированных постов.
+        
+        Используется планировщиком для заполнения очереди таймеров при запуске и
+        для подхвата постов, запланированных другими процессами.
+        
+        Args:
+            after_id (int): Вернуть только посты с ID больше заданного
+        
+        Returns:
+            List[Tuple[int, int, bool]]: Список (ID поста, время публикации в миллисекундах Unix,
+                есть ли медиафайл) по возрастанию ID
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
             
-            # Удаляем запись из базы данных
+            # Посты, ожидающие повторной попытки, возвращаются со временем этой попытки
             cursor.execute(
                 '''
-                DELETE FROM scheduled_posts
-                WHERE id = ? AND user_id = ?
+                SELECT id, COALESCE(next_attempt_at, scheduled_time), media_path IS NOT NULL
+                FROM scheduled_posts
+                WHERE id > ? AND status IN ('pending', 'claimed')
+                ORDER BY id
                 ''',
-                (post_id, user_id)
+                (after_id,)
             )
             
-            conn.commit()
-            return cursor.rowcount > 0
+            return [(post_id, scheduled_time, bool(has_media)) for post_id, scheduled_time, has_media in cursor]
         except sqlite3.Error as e:
-            logger.error(f"Ошибка при удалении запланированного поста: {e}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+            logger.error(f"Ошибка при получении времени запланированных постов: {e}")
+            return []
     
-    def get_pending_scheduled_posts(self) -> List[Tuple]:
+    def _claim_scheduled_post(self, conn: sqlite3.Connection, post_id: int, owner: str,
+                              lease_secs: float, now: float) -> Optional[Tuple]:
+        """Операция записи claim_scheduled_post. Выполняется в потоке записи."""
+        cursor = conn.execute(
+            '''
+            UPDATE scheduled_posts
+            SET status = 'claimed', claimed_by = ?, lease_expires_at = ?
+            WHERE id = ?
+            AND (status = 'pending' OR (status = 'claimed' AND lease_expires_at < ?))
+            RETURNING id, user_id, platform, text, media_path, media_type, social_post_id, attempts,
+                staged_media_id, staged_media_expires_at
+            ''',
+            (owner, now + lease_secs, post_id, now)
+        )
+        return cursor.fetchone()
+    
+    def claim_scheduled_post(self, post_id: int, owner: str, lease_secs: float, now: float) -> Optional[Tuple]:
         """
-        Получение запланированных постов, которые должны быть опубликованы.
+        Атомарный захват запланированного поста для публикации.
         
+        Захватить можно пост в состоянии pending или пост, захват которого истек
+        (процесс-владелец завершился во время публикации).
+        
+        Args:
+            post_id (int): ID запланированного поста
+            owner (str): Идентификатор процесса планировщика
+            lease_secs (float): Длительность захвата в секундах
+            now (float): Текущее время в секундах Unix
+            
         Returns:
-            List[Tuple]: Список кортежей с информацией о запланированных постах
+            Optional[Tuple]: (id, user_id, platform, text, media_path, media_type, social_post_id,
+                attempts, staged_media_id, staged_media_expires_at) или None, если пост удален,
+                опубликован или захвачен другим процессом
+        """
+        return self._write(
+            self._claim_scheduled_post, (post_id, owner, lease_secs, now), "захвате запланированного поста"
+        )
+    
+    async def claim_scheduled_post_async(self, post_id: int, owner: str, lease_secs: float,
+                                         now: float) -> Optional[Tuple]:
+        """Вариант claim_scheduled_post для цикла событий."""
+        return await self._write_async(
+            self._claim_scheduled_post, (post_id, owner, lease_secs, now), "захвате запланированного поста"
+        )
+    
+    def _extend_scheduled_claim(self, conn: sqlite3.Connection, post_id: int, owner: str,
+                                lease_secs: float, now: float) -> bool:
+        """Операция записи extend_scheduled_claim. Выполняется в потоке записи."""
+        cursor = conn.execute(
+            '''
+            UPDATE scheduled_posts
+            SET lease_expires_at = ?
+            WHERE id = ? AND status = 'claimed' AND claimed_by = ?
+            ''',
+            (now + lease_secs, post_id, owner)
+        )
+        return cursor.rowcount > 0
+    
+    def extend_scheduled_claim(self, post_id: int, owner: str, lease_secs: float, now: float) -> bool:
+        """
+        Продление захвата запланированного поста, публикация которого еще выполняется.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            owner (str): Идентификатор процесса планировщика
+            lease_secs (float): Длительность захвата в секундах от now
+            now (float): Текущее время в секундах Unix
+            
+        Returns:
+            bool: True если пост по-прежнему захвачен этим процессом
+        """
+        return self._write(
+            self._extend_scheduled_claim, (post_id, owner, lease_secs, now),
+            "продлении захвата запланированного поста", False
+        )
+    
+    async def extend_scheduled_claim_async(self, post_id: int, owner: str, lease_secs: float,
+                                           now: float) -> bool:
+        """Вариант extend_scheduled_claim для цикла событий."""
+        return await self._write_async(
+            self._extend_scheduled_claim, (post_id, owner, lease_secs, now),
+            "продлении захвата запланированного поста", False
+        )
+    
+    def get_scheduled_post_state(self, post_id: int) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        Получение состояния запланированного поста.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            
+        Returns:
+            Optional[Tuple[str, Optional[float]]]: Состояние и время окончания захвата или None
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
-            # Получаем посты, запланированные на период до текущего времени
             cursor.execute(
                 '''
-                SELECT id, user_id, platform, text, media_path, media_type
-                FROM scheduled_posts
-                WHERE scheduled_time <= datetime('now')
-                ORDER BY scheduled_time ASC
-                '''
+                SELECT status, lease_expires_at FROM scheduled_posts
+                WHERE id = ?
+                ''',
+                (post_id,)
             )
             
-            posts = cursor.fetchall()
-            return posts
+            return cursor.fetchone()
         except sqlite3.Error as e:
-            logger.error(f"Ошибка при получении запланированных постов: {e}")
-            return []
-        finally:
-            if conn:
-                conn.close()
-
-    def update_post_status(self, post_id: int, social_post_id: str, status: str) -> bool:
+            logger.error(f"Ошибка при получении состояния запланированного поста: {e}")
+            return None
+    
+    def get_scheduled_post_for_staging(self, post_id: int, now: int) -> Optional[Tuple[str, str, str]]:
         """
-        Обновление статуса поста.
+        Получение медиафайла запланированного поста, который нужно загрузить заранее.
         
         Args:
-            post_id (int): ID поста в базе данных
-            social_post_id (str): ID поста в социальной сети
-            status (str): Новый статус поста
+            post_id (int): ID запланированного поста
+            now (int): Текущее время в миллисекундах Unix
             
         Returns:
-            bool: True если обновление успешно, иначе False
+            Optional[Tuple[str, str, str]]: (platform, media_path, media_type) или None, если
+                у поста нет медиафайла, он уже загружен или пост больше не ожидает публикации
         """
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_connection()
             cursor = conn.cursor()
             
             cursor.execute(
                 '''
-                UPDATE posts
-                SET social_post_id = ?, status = ?
-                WHERE id = ?
+                SELECT platform, media_path, media_type FROM scheduled_posts
+                WHERE id = ? AND status = 'pending' AND media_path IS NOT NULL
+                AND (staged_media_id IS NULL OR staged_media_expires_at <= ?)
                 ''',
-                (social_post_id, status, post_id)
+                (post_id, now)
             )
             
-            conn.commit()
-            return cursor.rowcount > 0
+            return cursor.fetchone()
         except sqlite3.Error as e:
-            logger.error(f"Ошибка при обновлении статуса поста: {e}")
+            logger.error(f"Ошибка при получении медиафайла запланированного поста: {e}")
+            return None
+    
+    def _set_staged_media(self, conn: sqlite3.Connection, post_id: int, media_id: str,
+                          expires_at: Optional[int]) -> bool:
+        """Операция записи set_staged_media. Выполняется в потоке записи."""
+        cursor = conn.execute(
+            '''
+            UPDATE scheduled_posts
+            SET staged_media_id = ?, staged_media_expires_at = ?
+            WHERE id = ? AND status = 'pending'
+            ''',
+            (media_id, expires_at, post_id)
+        )
+        return cursor.rowcount > 0
+    
+    def set_staged_media(self, post_id: int, media_id: str, expires_at: Optional[int]) -> bool:
+        """
+        Сохранение media_id медиафайла, загруженного до времени публикации.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            media_id (str): ID медиафайла в социальной сети
+            expires_at (Optional[int]): Время истечения media_id в миллисекундах Unix (None - неизвестно)
+            
+        Returns:
+            bool: True если пост все еще ожидает публикации
+        """
+        return self._write(
+            self._set_staged_media, (post_id, media_id, expires_at), "сохранении загруженного заранее медиафайла", False
+        )
+    
+    async def set_staged_media_async(self, post_id: int, media_id: str, expires_at: Optional[int]) -> bool:
+        """Вариант set_staged_media для цикла событий."""
+        return await self._write_async(
+            self._set_staged_media, (post_id, media_id, expires_at), "сохранении загруженного заранее медиафайла", False
+        )
+    
+    def _record_scheduled_publication(self, conn: sqlite3.Connection, post_id: int, owner: str,
+                                      social_post_id: str) -> bool:
+        """Операция записи record_scheduled_publication. Выполняется в потоке записи."""
+        cursor = conn.execute(
+            '''
+            UPDATE scheduled_posts
+            SET social_post_id = ?
+            WHERE id = ? AND status = 'claimed' AND claimed_by = ?
+            ''',
+            (social_post_id, post_id, owner)
+        )
+        return cursor.rowcount > 0
+    
+    def record_scheduled_publication(self, post_id: int, owner: str, social_post_id: str) -> bool:
+        """
+        Сохранение ID опубликованного поста сразу после публикации. Если процесс
+        завершится до complete_scheduled_post, следующий владелец не опубликует пост повторно.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            owner (str): Идентификатор процесса планировщика
+            social_post_id (str): ID поста в социальной сети
+            
+        Returns:
+            bool: True если пост все еще захвачен этим процессом
+        """
+        return self._write(
+            self._record_scheduled_publication, (post_id, owner, social_post_id),
+            "сохранении ID опубликованного поста", False
+        )
+    
+    async def record_scheduled_publication_async(self, post_id: int, owner: str, social_post_id: str) -> bool:
+        """Вариант record_scheduled_publication для цикла событий."""
+        return await self._write_async(
+            self._record_scheduled_publication, (post_id, owner, social_post_id),
+            "сохранении ID опубликованного поста", False
+        )
+    
+    def _complete_scheduled_post(self, conn: sqlite3.Connection, post_id: int,
+                                 social_post_id: str) -> Optional[int]:
+        """Операция записи complete_scheduled_post: ID пользователя или None."""
+        cursor = conn.cursor()
+        
+        # Точка сохранения операции делает запись в историю и смену состояния атомарными
+        cursor.execute(
+            '''
+            INSERT OR IGNORE INTO posts
+            (user_id, platform, text, media_path, social_post_id, status, idempotency_key, engagement_due_at)
+            SELECT user_id, platform, text, media_path, ?, 'published', 'scheduled:' || id, 0
+            FROM scheduled_posts
+            WHERE id = ? AND status = 'claimed'
+            ''',
+            (social_post_id, post_id)
+        )
+        cursor.execute(
+            '''
+            UPDATE scheduled_posts
+            SET status = 'published', social_post_id = ?, claimed_by = NULL, lease_expires_at = NULL
+            WHERE id = ? AND status = 'claimed'
+            RETURNING user_id
+            ''',
+            (social_post_id, post_id)
+        )
+        
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _scheduled_post_completed(self, user_id: Optional[int], *_) -> bool:
+        """Действия после фиксации complete_scheduled_post."""
+        if user_id is None:
             return False
-        finally:
-            if conn:
-                conn.close()
\ No newline at end of file
+        
+        # Пост перешел из запланированных в историю
+        self.view_cache.invalidate(user_id)
+        return True
+    
+    def complete_scheduled_post(self, post_id: int, social_post_id: str) -> bool:
+        """
+        Завершение публикации: запись в историю и перевод в состояние published
+        в одной транзакции. Повторный вызов не создает вторую запись в истории.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            social_post_id (str): ID поста в социальной сети
+            
+        Returns:
+            bool: True если публикация завершена этим вызовом
+        """
+        return self._write(
+            self._complete_scheduled_post, (post_id, social_post_id),
+            "завершении публикации запланированного поста", False, self._scheduled_post_completed
+        )
+    
+    async def complete_scheduled_post_async(self, post_id: int, social_post_id: str) -> bool:
+        """Вариант complete_scheduled_post для цикла событий."""
+        return await self._write_async(
+            self._complete_scheduled_post, (post_id, social_post_id),
+            "завершении публикации запланированного поста", False, self._scheduled_post_completed
+        )
+    
+    def _release_scheduled_post(self, conn: sqlite3.Connection, post_id: int, owner: str,
+                                error: str, next_attempt_at: int) -> bool:
+        """Операция записи release_scheduled_post. Выполняется в потоке записи."""
+        cursor = conn.execute(
+            '''
+            UPDATE scheduled_posts
+            SET status = 'pending', claimed_by = NULL, lease_expires_at = NULL,
+                attempts = attempts + 1, last_error = ?, next_attempt_at = ?
+            WHERE id = ? AND status = 'claimed' AND claimed_by = ?
+            ''',
+            (error, next_attempt_at, post_id, owner)
+        )
+        return cursor.rowcount > 0
+    
+    def release_scheduled_post(self, post_id: int, owner: str, error: str, next_attempt_at: int) -> bool:
+        """
+        Снятие захвата после неудачной попытки публикации и планирование следующей.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            owner (str): Идентификатор процесса планировщика
+            error (str): Текст ошибки
+            next_attempt_at (int): Время следующей попытки в миллисекундах Unix
+            
+        Returns:
+            bool: True если пост был захвачен этим процессом
+        """
+        return self._write(
+            self._release_scheduled_post, (post_id, owner, error, next_attempt_at),
+            "снятии захвата запланированного поста", False
+        )
+    
+    async def release_scheduled_post_async(self, post_id: int, owner: str, error: str,
+                                           next_attempt_at: int) -> bool:
+        """Вариант release_scheduled_post для цикла событий."""
+        return await self._write_async(
+            self._release_scheduled_post, (post_id, owner, error, next_attempt_at),
+            "снятии захвата запланированного поста", False
+        )
+    
+    def _dead_letter_scheduled_post(self, conn: sqlite3.Connection, post_id: int, owner: str,
+                                    error: str, now: float) -> Optional[Tuple[Optional[str], int]]:
+        """Операция записи dead_letter_scheduled_post: (путь к ненужному медиафайлу, ID пользователя) или None."""
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            '''
+            INSERT INTO dead_letter_posts
+            (id, user_id, platform, text, media_path, media_type, scheduled_time, attempts, last_error, failed_at)
+            SELECT id, user_id, platform, text, media_path, media_type, scheduled_time, attempts + 1, ?, ?
+            FROM scheduled_posts
+            WHERE id = ? AND status = 'claimed' AND claimed_by = ?
+            RETURNING media_path, user_id
+            ''',
+            (error, now, post_id, owner)
+        )
+        
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        cursor.execute('DELETE FROM scheduled_posts WHERE id = ?', (post_id,))
+        
+        # Медиафайл больше не понадобится, если на него не ссылаются другие посты
+        media_path, user_id = row
+        if media_path and not self._delete_media_file_if_unused(conn, media_path):
+            media_path = None
+        return media_path, user_id
+    
+    def _scheduled_post_dead_lettered(self, row: Optional[Tuple[Optional[str], int]], *_) -> bool:
+        """Действия после фиксации dead_letter_scheduled_post."""
+        if row is None:
+            return False
+        
+        unused_media_path, user_id = row
+        self.view_cache.invalidate(user_id, "scheduled")
+        if unused_media_path:
+            self.media_store.remove_file(unused_media_path)
+        return True
+    
+    def dead_letter_scheduled_post(self, post_id: int, owner: str, error: str, now: float) -> bool:
+        """
+        Перенос поста, от публикации которого планировщик отказался, в таблицу dead_letter_posts.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            owner (str): Идентификатор процесса планировщика
+            error (str): Текст последней ошибки
+            now (float): Текущее время в секундах Unix
+            
+        Returns:
+            bool: True если пост перенесен
+        """
+        return self._write(
+            self._dead_letter_scheduled_post, (post_id, owner, error, now),
+            "переносе поста в таблицу неудавшихся", False, self._scheduled_post_dead_lettered
+        )
+    
+    async def dead_letter_scheduled_post_async(self, post_id: int, owner: str, error: str, now: float) -> bool:
+        """Вариант dead_letter_scheduled_post для цикла событий."""
+        return await self._write_async(
+            self._dead_letter_scheduled_post, (post_id, owner, error, now),
+            "переносе поста в таблицу неудавшихся", False, self._scheduled_post_dead_lettered
+        )
+    
+    def count_media_references(self, media_path: str) -> int:
+        """
+        Подсчет постов, запланированных постов и черновиков, ссылающихся на медиафайл.
+        
+        Args:
+            media_path (str): Путь к медиафайлу
+            
+        Returns:
+            int: Количество ссылок (-1 при ошибке, чтобы файл не был удален)
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT
+                    (SELECT COUNT(*) FROM posts WHERE media_path = ?) +
+                    (SELECT COUNT(*) FROM scheduled_posts
+                     WHERE media_path = ? AND status != 'published') +
+                    (SELECT COUNT(*) FROM conversation_drafts WHERE media_path = ?)
+                ''',
+                (media_path, media_path, media_path)
+            )
+            
+            return cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при подсчете ссылок на медиафайл: {e}")
+            return -1
+    
+    def _add_media_file(self, conn: sqlite3.Connection, content_hash: str, path: str, size: int,
+                        telegram_file_unique_id: Optional[str] = None) -> str:
+        """Операция записи add_media_file. Выполняется в потоке записи."""
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            '''
+            INSERT OR IGNORE INTO media_files (content_hash, path, size)
+            VALUES (?, ?, ?)
+            ''',
+            (content_hash, path, size)
+        )
+        cursor.execute(
+            '''
+            SELECT path FROM media_files
+            WHERE content_hash = ?
+            ''',
+            (content_hash,)
+        )
+        stored_path = cursor.fetchone()[0]
+        
+        if telegram_file_unique_id:
+            self._add_media_alias(conn, telegram_file_unique_id, content_hash)
+        return stored_path
+    
+    def add_media_file(self, content_hash: str, path: str, size: int,
+                       telegram_file_unique_id: Optional[str] = None) -> str:
+        """
+        Регистрация файла в хранилище медиафайлов.
+        
+        Args:
+            content_hash (str): Хэш содержимого файла
+            path (str): Путь к файлу в хранилище
+            size (int): Размер файла в байтах
+            telegram_file_unique_id (Optional[str]): Уникальный ID файла Telegram (сохраняется
+                в той же транзакции, см. add_media_alias)
+            
+        Returns:
+            str: Путь к файлу с этим содержимым (существующий, если он уже был зарегистрирован)
+        """
+        return self._write(
+            self._add_media_file, (content_hash, path, size, telegram_file_unique_id),
+            "регистрации медиафайла", path
+        )
+    
+    async def add_media_file_async(self, content_hash: str, path: str, size: int,
+                                   telegram_file_unique_id: Optional[str] = None) -> str:
+        """Вариант add_media_file для цикла событий."""
+        return await self._write_async(
+            self._add_media_file, (content_hash, path, size, telegram_file_unique_id),
+            "регистрации медиафайла", path
+        )
+    
+    def get_media_file(self, content_hash: str) -> Optional[str]:
+        """
+        Получение пути к файлу хранилища по хэшу содержимого.
+        
+        Args:
+            content_hash (str): Хэш содержимого файла
+            
+        Returns:
+            Optional[str]: Путь к файлу или None
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT path FROM media_files
+                WHERE content_hash = ?
+                ''',
+                (content_hash,)
+            )
+            
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении медиафайла: {e}")
+            return None
+    
+    def get_media_hash(self, path: str) -> Optional[str]:
+        """
+        Получение хэша содержимого файла хранилища по его пути.
+        
+        Args:
+            path (str): Путь к файлу
+            
+        Returns:
+            Optional[str]: Хэш содержимого или None, если файл не из хранилища
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT content_hash FROM media_files
+                WHERE path = ?
+                ''',
+                (path,)
+            )
+            
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении хэша медиафайла: {e}")
+            return None
+    
+    def _delete_media_file_if_unused(self, conn: sqlite3.Connection, path: str) -> bool:
+        """
+        Операция записи delete_media_file_if_unused. Выполняется в потоке записи, в том
+        числе внутри операций удаления постов - тогда проверка ссылок видит само удаление.
+        
+        Хранилище хранит одинаковое содержимое один раз, поэтому на файл может ссылаться
+        и черновик другого пользователя: такой файл тоже не удаляется.
+        """
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            '''
+            SELECT
+                (SELECT COUNT(*) FROM posts WHERE media_path = ?) +
+                (SELECT COUNT(*) FROM scheduled_posts
+                 WHERE media_path = ? AND status != 'published') +
+                (SELECT COUNT(*) FROM conversation_drafts WHERE media_path = ?)
+            ''',
+            (path, path, path)
+        )
+        
+        if cursor.fetchone()[0] > 0:
+            return False
+        
+        cursor.execute(
+            '''
+            DELETE FROM media_files
+            WHERE path = ?
+            RETURNING content_hash
+            ''',
+            (path,)
+        )
+        
+        # media_id удаленного файла больше не нужны
+        row = cursor.fetchone()
+        if row is not None:
+            cursor.execute('DELETE FROM media_upload_cache WHERE content_hash = ?', (row[0],))
+        return True
+    
+    def delete_media_file_if_unused(self, path: str) -> bool:
+        """
+        Удаление записи о файле хранилища, если на него не ссылается ни один пост.
+        
+        Проверка ссылок и удаление выполняются в одной транзакции.
+        
+        Args:
+            path (str): Путь к файлу
+            
+        Returns:
+            bool: True если ссылок нет и файл можно удалить с диска
+        """
+        return self._write(
+            self._delete_media_file_if_unused, (path,), "удалении медиафайла из хранилища", False
+        )
+    
+    async def delete_media_file_if_unused_async(self, path: str) -> bool:
+        """Вариант delete_media_file_if_unused для цикла событий."""
+        return await self._write_async(
+            self._delete_media_file_if_unused, (path,), "удалении медиафайла из хранилища", False
+        )
+    
+    def _add_media_alias(self, conn: sqlite3.Connection, telegram_file_unique_id: str, content_hash: str) -> None:
+        """Операция записи add_media_alias. Выполняется в потоке записи."""
+        conn.execute(
+            '''
+            INSERT OR REPLACE INTO media_aliases (telegram_file_unique_id, content_hash)
+            VALUES (?, ?)
+            ''',
+            (telegram_file_unique_id, content_hash)
+        )
+    
+    def add_media_alias(self, telegram_file_unique_id: str, content_hash: str) -> None:
+        """
+        Сохранение соответствия файла Telegram хэшу его содержимого.
+        
+        Args:
+            telegram_file_unique_id (str): Уникальный ID файла Telegram
+            content_hash (str): Хэш содержимого файла
+        """
+        self._write(
+            self._add_media_alias, (telegram_file_unique_id, content_hash),
+            "сохранении идентификатора файла Telegram"
+        )
+    
+    async def add_media_alias_async(self, telegram_file_unique_id: str, content_hash: str) -> None:
+        """Вариант add_media_alias для цикла событий."""
+        await self._write_async(
+            self._add_media_alias, (telegram_file_unique_id, content_hash),
+            "сохранении идентификатора файла Telegram"
+        )
+    
+    def get_media_alias(self, telegram_file_unique_id: str) -> Optional[str]:
+        """
+        Получение хэша содержимого по уникальному ID файла Telegram.
+        
+        Args:
+            telegram_file_unique_id (str): Уникальный ID файла Telegram
+            
+        Returns:
+            Optional[str]: Хэш содержимого или None
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT content_hash FROM media_aliases
+                WHERE telegram_file_unique_id = ?
+                ''',
+                (telegram_file_unique_id,)
+            )
+            
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении идентификатора файла Telegram: {e}")
+            return None
+    
+    def _add_media_variant(self, conn: sqlite3.Connection, source_hash: str, profile: str, content_hash: str) -> None:
+        """Операция записи add_media_variant. Выполняется в потоке записи."""
+        conn.execute(
+            '''
+            INSERT OR REPLACE INTO media_variants (source_hash, profile, content_hash)
+            VALUES (?, ?, ?)
+            ''',
+            (source_hash, profile, content_hash)
+        )
+    
+    def add_media_variant(self, source_hash: str, profile: str, content_hash: str) -> None:
+        """
+        Сохранение результата оптимизации изображения.
+        
+        Args:
+            source_hash (str): Хэш исходного содержимого
+            profile (str): Параметры оптимизации
+            content_hash (str): Хэш содержимого результата (равен source_hash, если файл не изменен)
+        """
+        self._write(
+            self._add_media_variant, (source_hash, profile, content_hash),
+            "сохранении оптимизированного изображения"
+        )
+    
+    async def add_media_variant_async(self, source_hash: str, profile: str, content_hash: str) -> None:
+        """Вариант add_media_variant для цикла событий."""
+        await self._write_async(
+            self._add_media_variant, (source_hash, profile, content_hash),
+            "сохранении оптимизированного изображения"
+        )
+    
+    def get_media_variant(self, source_hash: str, profile: str) -> Optional[Tuple[str, str]]:
+        """
+        Получение сохраненного результата оптимизации изображения.
+        
+        Args:
+            source_hash (str): Хэш исходного содержимого
+            profile (str): Параметры оптимизации
+            
+        Returns:
+            Optional[Tuple[str, str]]: Хэш содержимого и путь к файлу хранилища или None
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT v.content_hash, f.path
+                FROM media_variants v
+                JOIN media_files f ON f.content_hash = v.content_hash
+                WHERE v.source_hash = ? AND v.profile = ?
+                ''',
+                (source_hash, profile)
+            )
+            
+            return cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении оптимизированного изображения: {e}")
+            return None
+    
+    def _cache_media_id(self, conn: sqlite3.Connection, content_hash: str, platform: str,
+                        media_id: str, expires_at: float) -> None:
+        """Операция записи cache_media_id. Выполняется в потоке записи."""
+        conn.execute(
+            '''
+            INSERT OR REPLACE INTO media_upload_cache (content_hash, platform, media_id, expires_at)
+            VALUES (?, ?, ?, ?)
+            ''',
+            (content_hash, platform, media_id, expires_at)
+        )
+    
+    def cache_media_id(self, content_hash: str, platform: str, media_id: str, expires_at: float) -> None:
+        """
+        Сохранение media_id загруженного в социальную сеть файла.
+        
+        Args:
+            content_hash (str): Хэш содержимого файла
+            platform (str): Название платформы
+            media_id (str): ID медиафайла в социальной сети
+            expires_at (float): Время истечения media_id в секундах Unix
+        """
+        self._write(
+            self._cache_media_id, (content_hash, platform, media_id, expires_at),
+            "сохранении media_id в кэш"
+        )
+    
+    async def cache_media_id_async(self, content_hash: str, platform: str, media_id: str,
+                                   expires_at: float) -> None:
+        """Вариант cache_media_id для цикла событий."""
+        await self._write_async(
+            self._cache_media_id, (content_hash, platform, media_id, expires_at),
+            "сохранении media_id в кэш"
+        )
+    
+    def get_cached_media_id(self, content_hash: str, platform: str, now: float) -> Optional[str]:
+        """
+        Получение действующего media_id для файла.
+        
+        Args:
+            content_hash (str): Хэш содержимого файла
+            platform (str): Название платформы
+            now (float): Текущее время в секундах Unix
+            
+        Returns:
+            Optional[str]: media_id или None, если файл не загружался или media_id истек
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT media_id FROM media_upload_cache
+                WHERE content_hash = ? AND platform = ? AND expires_at > ?
+                ''',
+                (content_hash, platform, now)
+            )
+            
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении media_id из кэша: {e}")
+            return None
+    
+    def _save_draft(self, conn: sqlite3.Connection, user_id: int, fields: Tuple, updated_at: float) -> None:
+        """Операция записи save_draft. Выполняется в потоке записи."""
+        conn.execute(
+            '''
+            INSERT OR REPLACE INTO conversation_drafts
+            (user_id, platform, text, media_path, media_type, file_id, file_unique_id, mime_type, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''',
+            (user_id, *fields, updated_at)
+        )
+    
+    def save_draft(self, user_id: int, fields: Tuple, updated_at: float) -> None:
+        """
+        Сохранение черновика публикации пользователя. Не ожидает фиксации: актуальный
+        черновик хранится в памяти ConversationStore.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            fields (Tuple): Поля черновика (platform, text, media_path, media_type,
+                file_id, file_unique_id, mime_type)
+            updated_at (float): Время последнего изменения в секундах Unix
+        """
+        self._write_later(self._save_draft, (user_id, fields, updated_at), "сохранении черновика")
+    
+    def get_draft(self, user_id: int, min_updated_at: float) -> Optional[Tuple]:
+        """
+        Получение черновика публикации пользователя.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            min_updated_at (float): Более старые черновики считаются брошенными
+            
+        Returns:
+            Optional[Tuple]: Поля черновика и время изменения или None
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT platform, text, media_path, media_type, file_id, file_unique_id, mime_type, updated_at
+                FROM conversation_drafts
+                WHERE user_id = ? AND updated_at >= ?
+                ''',
+                (user_id, min_updated_at)
+            )
+            
+            return cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении черновика: {e}")
+            return None
+    
+    def _delete_draft(self, conn: sqlite3.Connection, user_id: int) -> None:
+        """Операция записи delete_draft. Выполняется в потоке записи."""
+        conn.execute('DELETE FROM conversation_drafts WHERE user_id = ?', (user_id,))
+    
+    def delete_draft(self, user_id: int) -> None:
+        """
+        Удаление черновика публикации пользователя. Не ожидает фиксации.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+        """
+        self._write_later(self._delete_draft, (user_id,), "удалении черновика")
+    
+    def _delete_expired_drafts(self, conn: sqlite3.Connection, min_updated_at: float) -> Tuple[int, List[str]]:
+        """
+        Операция записи delete_expired_drafts: количество удаленных черновиков и пути
+        их медиафайлов, на которые больше нет ссылок.
+        """
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            'DELETE FROM conversation_drafts WHERE updated_at < ? RETURNING media_path',
+            (min_updated_at,)
+        )
+        drafts = cursor.fetchall()
+        cursor.execute('DELETE FROM conversation_states WHERE updated_at < ?', (min_updated_at,))
+        
+        # Медиафайлы брошенных черновиков удаляются, если на них не ссылаются посты
+        media_paths = {media_path for media_path, in drafts if media_path}
+        unused_media_paths = [path for path in media_paths if self._delete_media_file_if_unused(conn, path)]
+        return len(drafts), unused_media_paths
+    
+    def _expired_drafts_deleted(self, result: Tuple[int, List[str]], *_) -> int:
+        """Действия после фиксации delete_expired_drafts."""
+        deleted, unused_media_paths = result
+        for media_path in unused_media_paths:
+            self.media_store.remove_file(media_path)
+        return deleted
+    
+    def delete_expired_drafts(self, min_updated_at: float) -> int:
+        """
+        Удаление брошенных черновиков и состояний разговоров.
+        
+        Args:
+            min_updated_at (float): Записи, измененные раньше, удаляются
+            
+        Returns:
+            int: Количество удаленных черновиков
+        """
+        return self._write(
+            self._delete_expired_drafts, (min_updated_at,), "удалении устаревших черновиков", 0,
+            self._expired_drafts_deleted
+        )
+    
+    async def delete_expired_drafts_async(self, min_updated_at: float) -> int:
+        """Вариант delete_expired_drafts для цикла событий."""
+        return await self._write_async(
+            self._delete_expired_drafts, (min_updated_at,), "удалении устаревших черновиков", 0,
+            self._expired_drafts_deleted
+        )
+    
+    def _save_conversation_state(self, conn: sqlite3.Connection, name: str, key: str,
+                                 state: int, updated_at: float) -> None:
+        """Операция записи save_conversation_state. Выполняется в потоке записи."""
+        conn.execute(
+            '''
+            INSERT OR REPLACE INTO conversation_states (name, key, state, updated_at)
+            VALUES (?, ?, ?, ?)
+            ''',
+            (name, key, state, updated_at)
+        )
+    
+    def save_conversation_state(self, name: str, key: str, state: int, updated_at: float) -> None:
+        """
+        Сохранение состояния разговора ConversationHandler. Не ожидает фиксации:
+        состояния читаются из базы данных только при запуске.
+        
+        Args:
+            name (str): Имя разговора
+            key (str): Ключ разговора в формате JSON
+            state (int): Состояние разговора
+            updated_at (float): Время изменения в секундах Unix
+        """
+        self._write_later(
+            self._save_conversation_state, (name, key, state, updated_at), "сохранении состояния разговора"
+        )
+    
+    def _delete_conversation_state(self, conn: sqlite3.Connection, name: str, key: str) -> None:
+        """Операция записи delete_conversation_state. Выполняется в потоке записи."""
+        conn.execute('DELETE FROM conversation_states WHERE name = ? AND key = ?', (name, key))
+    
+    def delete_conversation_state(self, name: str, key: str) -> None:
+        """
+        Удаление состояния завершенного разговора. Не ожидает фиксации.
+        
+        Args:
+            name (str): Имя разговора
+            key (str): Ключ разговора в формате JSON
+        """
+        self._write_later(self._delete_conversation_state, (name, key), "удалении состояния разговора")
+    
+    def get_conversation_states(self, name: str, min_updated_at: float) -> List[Tuple[str, int]]:
+        """
+        Получение активных состояний разговора.
+        
+        Args:
+            name (str): Имя разговора
+            min_updated_at (float): Более старые состояния считаются брошенными
+            
+        Returns:
+            List[Tuple[str, int]]: Список пар (ключ в формате JSON, состояние)
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT key, state FROM conversation_states
+                WHERE name = ? AND updated_at >= ?
+                ''',
+                (name, min_updated_at)
+            )
+            
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении состояний разговора: {e}")
+            return []
+    
+    def acquire_lease(self, name: str, owner: str, ttl: float, now: float) -> bool:
+        """
+        Получение или продление аренды. Аренда переходит к новому владельцу, только
+        если текущая истекла.
+        
+        Args:
+            name (str): Название аренды
+            owner (str): Идентификатор процесса-владельца
+            ttl (float): Срок аренды в секундах
+            now (float): Текущее время в секундах Unix
+            
+        Returns:
+            bool: True если аренда принадлежит owner
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                INSERT INTO leases (name, owner, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE
+                SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+                ''',
+                (name, owner, now + ttl, now)
+            )
+            
+            conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            self._rollback()
+            logger.error(f"Ошибка при получении аренды {name}: {e}")
+            return False
+    
+    def release_lease(self, name: str, owner: str) -> None:
+        """
+        Досрочное освобождение аренды, чтобы другой процесс мог сразу ее получить.
+        
+        Args:
+            name (str): Название аренды
+            owner (str): Идентификатор процесса-владельца
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+            
+            conn.commit()
+        except sqlite3.Error as e:
+            self._rollback()
+            logger.error(f"Ошибка при освобождении аренды {name}: {e}")
+
+    def get_posts_due_for_engagement(self, now: float, limit: int) -> List[Tuple[int, str, str, int]]:
+        """
+        Получение опубликованных постов, счетчики которых пора обновить.
+        
+        Args:
+            now (float): Текущее время в секундах Unix
+            limit (int): Максимальное число постов
+        
+        Returns:
+            List[Tuple[int, str, str, int]]: Кортежи (ID поста, платформа, ID поста в социальной сети,
+                время публикации в секундах Unix), начиная с самых просроченных
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT id, platform, social_post_id, created_at / 1000
+                FROM posts
+                WHERE engagement_due_at IS NOT NULL AND engagement_due_at <= ?
+                ORDER BY engagement_due_at
+                LIMIT ?
+                ''',
+                (now, limit)
+            )
+            
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении постов для обновления статистики: {e}")
+            return []
+    
+    def save_post_engagement(self, samples: List[Tuple], collected_at: float) -> int:
+        """
+        Запись замеров вовлеченности одной транзакцией: временной ряд, последние значения
+        в posts и прирост по дням в user_engagement_daily для команды /stats.
+        
+        Args:
+            samples (List[Tuple]): Кортежи (ID поста, лайки, ретвиты, ответы, время следующего
+                обновления). Лайки None - пост не найден в социальной сети; время None -
+                пост больше не отслеживается
+            collected_at (float): Время замера в секундах Unix
+        
+        Returns:
+            int: Количество записанных замеров или -1 при ошибке
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            day = int(collected_at // 86400)
+            
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            # Прирост считается от предыдущего замера; первый замер поста - весь прирост
+            deltas = {}
+            series = []
+            for post_id, likes, retweets, replies, _ in samples:
+                if likes is None:
+                    continue
+                cursor.execute(
+                    "SELECT user_id, likes, retweets, replies FROM posts WHERE id = ?",
+                    (post_id,)
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    continue
+                user_id, old_likes, old_retweets, old_replies = row
+                total = deltas.setdefault(user_id, [0, 0, 0])
+                total[0] += likes - (old_likes or 0)
+                total[1] += retweets - (old_retweets or 0)
+                total[2] += replies - (old_replies or 0)
+                series.append((post_id, int(collected_at), likes, retweets, replies))
+            
+            cursor.executemany(
+                '''
+                INSERT OR REPLACE INTO post_engagement (post_id, collected_at, likes, retweets, replies)
+                VALUES (?, ?, ?, ?, ?)
+                ''',
+                series
+            )
+            cursor.executemany(
+                '''
+                UPDATE posts
+                SET likes = COALESCE(?, likes), retweets = COALESCE(?, retweets), replies = COALESCE(?, replies),
+                    engagement_at = ?, engagement_due_at = ?
+                WHERE id = ?
+                ''',
+                (
+                    (likes, retweets, replies, collected_at, due_at, post_id)
+                    for post_id, likes, retweets, replies, due_at in samples
+                )
+            )
+            cursor.executemany(
+                '''
+                INSERT INTO user_engagement_daily (user_id, day, likes, retweets, replies)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, day) DO UPDATE SET
+                    likes = likes + excluded.likes,
+                    retweets = retweets + excluded.retweets,
+                    replies = replies + excluded.replies
+                ''',
+                ((user_id, day, *total) for user_id, total in deltas.items())
+            )
+            
+            conn.commit()
+            return len(series)
+        except sqlite3.Error as e:
+            self._rollback()
+            logger.error(f"Ошибка при сохранении статистики вовлеченности: {e}")
+            return -1
+    
+    def prune_post_engagement(self, before: float) -> int:
+        """
+        Удаление замеров временного ряда старше заданного времени (прирост по дням сохраняется).
+        
+        Args:
+            before (float): Время в секундах Unix
+        
+        Returns:
+            int: Количество удаленных замеров
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("DELETE FROM post_engagement WHERE collected_at < ?", (int(before),))
+            
+            deleted = cursor.rowcount
+            conn.commit()
+            return deleted
+        except sqlite3.Error as e:
+            self._rollback()
+            logger.error(f"Ошибка при удалении старых замеров вовлеченности: {e}")
+            return 0
+    
+    def get_user_engagement(self, user_id: int, since_day: int) -> Tuple[int, int, int, int, int, int]:
+        """
+        Суммарная вовлеченность пользователя из предварительно агрегированных данных.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            since_day (int): Первый день периода (номер дня UTC с начала эпохи Unix)
+        
+        Returns:
+            Tuple[int, int, int, int, int, int]: Лайки, ретвиты и ответы за все время,
+                затем они же начиная с since_day
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT
+                    COALESCE(SUM(likes), 0), COALESCE(SUM(retweets), 0), COALESCE(SUM(replies), 0),
+                    COALESCE(SUM(CASE WHEN day >= ? THEN likes END), 0),
+                    COALESCE(SUM(CASE WHEN day >= ? THEN retweets END), 0),
+                    COALESCE(SUM(CASE WHEN day >= ? THEN replies END), 0)
+                FROM user_engagement_daily
+                WHERE user_id = ?
+                ''',
+                (since_day, since_day, since_day, user_id)
+            )
+            
+            return cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении статистики пользователя: {e}")
+            return (0, 0, 0, 0, 0, 0)
+    
+    def get_top_posts(self, user_id: int, limit: int) -> List[Tuple]:
+        """
+        Получение самых популярных постов пользователя по последним замерам.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            limit (int): Количество постов
+        
+        Returns:
+            List[Tuple]: Кортежи (ID поста, платформа, текст, лайки, ретвиты, ответы)
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                '''
+                SELECT id, platform, text, likes, retweets, replies
+                FROM posts
+                WHERE user_id = ? AND likes IS NOT NULL
+                ORDER BY likes + retweets + replies DESC
+                LIMIT ?
+                ''',
+                (user_id, limit)
+            )
+            
+            return cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении популярных постов: {e}")
+            return []
+    
+    def get_user_timezone(self, user_id: int) -> Optional[str]:
+        """
+        Получение часового пояса пользователя.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+        
+        Returns:
+            Optional[str]: Имя часового пояса или None, если пользователь его не задавал
+        """
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT timezone FROM user_settings WHERE user_id = ?", (user_id,))
+            
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при получении часового пояса пользователя: {e}")
+            return None
+    
+    def _set_user_timezone(self, conn: sqlite3.Connection, user_id: int, timezone: Optional[str]) -> bool:
+        """Операция записи set_user_timezone. Выполняется в потоке записи."""
+        conn.execute(
+            '''
+            INSERT INTO user_settings (user_id, timezone)
+            VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET timezone = excluded.timezone
+            ''',
+            (user_id, timezone)
+        )
+        return True
+    
+    def _user_timezone_set(self, saved: bool, user_id: int, *_) -> bool:
+        """Действия после фиксации set_user_timezone."""
+        # Время в готовых отображениях показано в прежнем поясе
+        self.view_cache.invalidate(user_id)
+        return saved
+    
+    def set_user_timezone(self, user_id: int, timezone: Optional[str]) -> bool:
+        """
+        Сохранение часового пояса пользователя.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            timezone (Optional[str]): Имя часового пояса (None - пояс по умолчанию)
+        
+        Returns:
+            bool: True если сохранение успешно, иначе False
+        """
+        return self._write(
+            self._set_user_timezone, (user_id, timezone),
+            "сохранении часового пояса пользователя", False, self._user_timezone_set
+        )
+    
+    async def set_user_timezone_async(self, user_id: int, timezone: Optional[str]) -> bool:
+        """Вариант set_user_timezone для цикла событий."""
+        return await self._write_async(
+            self._set_user_timezone, (user_id, timezone),
+            "сохранении часового пояса пользователя", False, self._user_timezone_set
+        )
+    
+    def _update_post_status(self, conn: sqlite3.Connection, post_id: int, social_post_id: str,
+                            status: str) -> Optional[int]:
+        """Операция записи update_post_status: ID пользователя или None."""
+        cursor = conn.execute(
+            '''
+            UPDATE posts
+            SET social_post_id = ?, status = ?
+            WHERE id = ?
+            RETURNING user_id
+            ''',
+            (social_post_id, status, post_id)
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _post_status_updated(self, user_id: Optional[int], *_) -> bool:
+        """Действия после фиксации update_post_status."""
+        if user_id is None:
+            return False
+        self.view_cache.invalidate(user_id, "history")
+        return True
+    
+    def update_post_status(self, post_id: int, social_post_id: str, status: str) -> bool:
+        """
+        Обновление статуса поста.
+        
+        Args:
+            post_id (int): ID поста в базе данных
+            social_post_id (str): ID поста в социальной сети
+            status (str): Новый статус поста
+            
+        Returns:
+            bool: True если обновление успешно, иначе False
+        """
+        return self._write(
+            self._update_post_status, (post_id, social_post_id, status),
+            "обновлении статуса поста", False, self._post_status_updated
+        )
+    
+    async def update_post_status_async(self, post_id: int, social_post_id: str, status: str) -> bool:
+        """Вариант update_post_status для цикла событий."""
+        return await self._write_async(
+            self._update_post_status, (post_id, social_post_id, status),
+            "обновлении статуса поста", False, self._post_status_updated
+        )
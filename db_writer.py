@@ -0,0 +1,158 @@
+import time
+import queue
+import logging
+import sqlite3
+import threading
+import concurrent.futures
+from typing import Callable, List, Optional, Tuple
+
+from metrics import Gauge, Histogram
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Параметры потока записи
+WRITER_MAX_BATCH = 256  # Максимальное число операций в одной транзакции
+
+DB_WRITE_BATCH_SIZE = Histogram(
+    "db_write_batch_size",
+    "Количество операций записи, зафиксированных одной транзакцией",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+DB_WRITE_COMMIT_SECONDS = Histogram(
+    "db_write_commit_seconds",
+    "Длительность транзакции потока записи (операции и фиксация)"
+)
+DB_WRITE_QUEUE_SIZE = Gauge(
+    "db_write_queue_size",
+    "Количество операций записи, ожидающих потока записи"
+)
+
+class DatabaseWriter:
+    """
+    Единственный поток записи в базу данных с групповой фиксацией.
+    
+    Операции ставятся в очередь и возвращают concurrent.futures.Future (в цикле событий
+    его можно ожидать через asyncio.wrap_future). Поток забирает все накопившиеся операции,
+    выполняет каждую в своей точке сохранения и фиксирует их одной транзакцией: чем больше
+    одновременных записей, тем больше операций приходится на одну запись на диск, а
+    блокировка записи SQLite не переходит между потоками. Ошибка операции откатывает только
+    ее точку сохранения. Результат операции становится доступен после фиксации.
+    """
+    
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_batch: int = WRITER_MAX_BATCH):
+        """
+        Инициализация.
+        
+        Args:
+            connect (Callable[[], sqlite3.Connection]): Получение соединения; вызывается в потоке записи
+            max_batch (int): Максимальное число операций в одной транзакции
+        """
+        self.connect = connect
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue[Optional[Tuple]]" = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        
+        DB_WRITE_QUEUE_SIZE.set_function(self._queue.qsize)
+    
+    def submit(self, operation: Callable, *args) -> concurrent.futures.Future:
+        """
+        Постановка операции записи в очередь.
+        
+        Args:
+            operation (Callable): Функция (соединение, *args) -> результат. Выполняется внутри
+                транзакции потока записи и не должна вызывать commit или rollback
+            *args: Аргументы операции
+        
+        Returns:
+            concurrent.futures.Future: Результат операции или ее исключение после фиксации
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                # Поток запускается при первой записи (и заново после stop)
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((operation, args, future))
+        return future
+    
+    def stop(self) -> None:
+        """Остановка потока после выполнения уже поставленных операций."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None and thread.is_alive():
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+    
+    def _run(self) -> None:
+        """Цикл потока записи: ожидание операций и их групповая фиксация."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            # Все, что накопилось, пока фиксировалась предыдущая транзакция
+            batch = [item]
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            self._commit(batch)
+            if stopping:
+                return
+    
+    def _commit(self, batch: List[Tuple]) -> None:
+        """
+        Выполнение пакета операций одной транзакцией.
+        
+        Args:
+            batch (List[Tuple]): Кортежи (операция, аргументы, Future)
+        """
+        # Операции, ожидание которых отменено, не выполняются
+        batch = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        
+        start = time.perf_counter()
+        outcomes = []
+        conn = None
+        try:
+            conn = self.connect()
+            conn.execute("BEGIN IMMEDIATE")
+            for operation, args, future in batch:
+                conn.execute("SAVEPOINT operation")
+                try:
+                    outcomes.append((future, operation(conn, *args), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO operation")
+                    outcomes.append((future, None, e))
+                conn.execute("RELEASE operation")
+            conn.commit()
+        except sqlite3.Error as e:
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            logger.error(f"Ошибка при фиксации пакета записи ({len(batch)} операций): {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        
+        DB_WRITE_BATCH_SIZE.observe(len(batch))
+        DB_WRITE_COMMIT_SECONDS.observe(time.perf_counter() - start)
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
@@ -0,0 +1,175 @@
+import os
+import time
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from metrics import Counter
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Периодичность обновления счетчиков в зависимости от возраста поста:
+# (максимальный возраст в секундах, интервал обновления в секундах). Посты старше
+# последнего уровня больше не обновляются
+ENGAGEMENT_TIERS = (
+    (60 * 60, 5 * 60),  # Первый час - каждые 5 минут
+    (24 * 60 * 60, 30 * 60),  # Первые сутки - каждые 30 минут
+    (7 * 24 * 60 * 60, 6 * 60 * 60),  # Первая неделя - каждые 6 часов
+    (30 * 24 * 60 * 60, 24 * 60 * 60),  # Первый месяц - раз в сутки
+)
+COLLECT_INTERVAL = 60.0  # Период проверки постов, счетчики которых пора обновить, в секундах
+MAX_POSTS_PER_PASS = 1000  # Максимум постов за один проход
+SAMPLE_RETENTION = 90 * 24 * 60 * 60  # Время хранения замеров временного ряда в секундах
+COLLECTOR_LEASE = "engagement_collector"  # Аренда, чтобы сбором занимался один процесс
+
+POSTS_REFRESHED = Counter(
+    "engagement_posts_refreshed",
+    "Посты, счетчики вовлеченности которых обновлены",
+    ("platform", "outcome")
+)
+
+def next_refresh(created_at: float, now: float,
+                 tiers: Tuple[Tuple[int, int], ...] = ENGAGEMENT_TIERS) -> Optional[float]:
+    """
+    Время следующего обновления счетчиков поста.
+    
+    Args:
+        created_at (float): Время публикации в секундах Unix
+        now (float): Текущее время в секундах Unix
+        tiers (Tuple[Tuple[int, int], ...]): Уровни (максимальный возраст, интервал)
+    
+    Returns:
+        Optional[float]: Время в секундах Unix или None, если пост больше не отслеживается
+    """
+    age = now - created_at
+    for max_age, interval in tiers:
+        if age < max_age:
+            return now + interval
+    return None
+
+class EngagementCollector:
+    """
+    Фоновый сбор лайков, репостов и ответов опубликованных постов.
+    
+    Посты, которым пора обновиться, запрашиваются пачками по engagement_batch_size
+    публикатора (у Twitter - 100 ID за запрос), а замеры записываются одной транзакцией
+    вместе с приростом по дням, из которого команда /stats строит отчет без обращения к API.
+    """
+    
+    def __init__(self, db_manager, publishers, interval: float = COLLECT_INTERVAL,
+                 owner: Optional[str] = None):
+        """
+        Инициализация.
+        
+        Args:
+            db_manager: Менеджер базы данных
+            publishers (PublisherRegistry): Реестр публикаторов по платформам
+            interval (float): Период проверки в секундах
+            owner (Optional[str]): Идентификатор процесса для аренды, по умолчанию хост и PID
+        """
+        self.db_manager = db_manager
+        self.publishers = publishers
+        self.interval = interval
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self) -> None:
+        """Запуск потока сбора."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="engagement-collector", daemon=True)
+        self._thread.start()
+        logger.info("Сбор статистики вовлеченности запущен")
+    
+    def stop(self) -> None:
+        """Остановка потока сбора."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+            self.db_manager.release_lease(COLLECTOR_LEASE, self.owner)
+            logger.info("Сбор статистики вовлеченности остановлен")
+    
+    def _run(self) -> None:
+        """Цикл сбора."""
+        while not self._stop_event.is_set():
+            try:
+                # Аренда продлевается каждый проход; при нескольких процессах собирает один
+                if self.db_manager.acquire_lease(COLLECTOR_LEASE, self.owner, self.interval * 3, time.time()):
+                    self.collect()
+            except Exception as e:
+                logger.error(f"Ошибка при сборе статистики вовлеченности: {e}")
+            self._stop_event.wait(self.interval)
+    
+    def collect(self) -> int:
+        """
+        Один проход: обновление счетчиков всех постов, которым пора обновиться.
+        
+        Returns:
+            int: Количество записанных замеров
+        """
+        now = time.time()
+        posts = self.db_manager.get_posts_due_for_engagement(now, MAX_POSTS_PER_PASS)
+        if not posts:
+            return 0
+        
+        by_platform: Dict[str, List[Tuple[int, str, int]]] = {}
+        for post_id, platform, social_post_id, created_at in posts:
+            by_platform.setdefault(platform, []).append((post_id, social_post_id, created_at))
+        
+        samples = []
+        for platform, platform_posts in by_platform.items():
+            samples.extend(self._collect_platform(platform, platform_posts, now))
+        
+        saved = self.db_manager.save_post_engagement(samples, now) if samples else 0
+        self.db_manager.prune_post_engagement(now - SAMPLE_RETENTION)
+        if saved > 0:
+            logger.info(f"Обновлена статистика вовлеченности постов: {saved}")
+        return saved
+    
+    def _collect_platform(self, platform: str, posts: List[Tuple[int, str, int]], now: float) -> List[Tuple]:
+        """
+        Запрос счетчиков постов одной платформы пачками.
+        
+        Args:
+            platform (str): Платформа
+            posts (List[Tuple[int, str, int]]): Кортежи (ID поста, ID в социальной сети, время публикации)
+            now (float): Время прохода в секундах Unix
+        
+        Returns:
+            List[Tuple]: Замеры для DatabaseManager.save_post_engagement
+        """
+        publisher = self.publishers.get(platform)
+        batch_size = publisher.engagement_batch_size if publisher else 0
+        if not batch_size:
+            # Платформа не сообщает статистику - посты больше не отслеживаются
+            POSTS_REFRESHED.inc(platform, "unsupported", amount=len(posts))
+            return [(post_id, None, None, None, None) for post_id, _, _ in posts]
+        
+        samples = []
+        for start in range(0, len(posts), batch_size):
+            batch = posts[start:start + batch_size]
+            result = publisher.get_engagement([social_post_id for _, social_post_id, _ in batch])
+            if not result["success"]:
+                # Посты остаются просроченными и будут запрошены на следующем проходе
+                logger.warning(f"Не удалось получить статистику {platform}: {result['error']}")
+                POSTS_REFRESHED.inc(platform, "error", amount=len(posts) - start)
+                break
+            
+            engagement = result["engagement"]
+            for post_id, social_post_id, created_at in batch:
+                counts = engagement.get(social_post_id)
+                if counts is None:
+                    # Пост удален в социальной сети
+                    samples.append((post_id, None, None, None, None))
+                    POSTS_REFRESHED.inc(platform, "missing")
+                else:
+                    samples.append((post_id, *counts, next_refresh(created_at, now)))
+                    POSTS_REFRESHED.inc(platform, "success")
+        return samples
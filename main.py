@@ -1,20 +1,44 @@
+import io
 import os
+import ssl
+import time
+import signal
+import functools
+import asyncio
 import logging
+import secrets
+import urllib.parse
 import datetime
+import hashlib
 import sqlite3
+from typing import Tuple, List, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.helpers import escape_markdown
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     CallbackQueryHandler,
     ContextTypes,
     ConversationHandler,
     filters
 )
-from social_api import TwitterAPI
-from scheduler import PostScheduler
+from social_api import TwitterAPI, AsyncTwitterAPI
+from publishers import PublisherRegistry, FakePublisher
+from scheduler import PostScheduler, AsyncPostScheduler
 from db_manager import DatabaseManager
+from media_stream import iter_telegram_file, guess_mime_type
+from media_store import hashing_stream
+from media_optimizer import MediaOptimizer
+from media_preflight import probe_media, telegram_media_info, check_limits
+from conversation_store import ConversationStore, SQLitePersistence, PostDraft
+from bulk_import import detect_format, parse_import_file, MAX_IMPORT_FILE_SIZE, MAX_ERRORS_IN_MESSAGE
+from webhook_server import WebhookServer
+from sharding import ShardPool, start_application, stop_application
+from metrics import Counter, Gauge, Histogram, MetricsServer
+from engagement import EngagementCollector
+from timeutils import now_ms, to_epoch_ms, format_epoch_ms, get_timezone
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,7 +48,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Состояния разговора
-CHOOSING_PLATFORM, TYPING_MESSAGE, UPLOADING_MEDIA, SCHEDULING = range(4)
+CHOOSING_PLATFORM, TYPING_MESSAGE, UPLOADING_MEDIA, SCHEDULING, IMPORTING = range(5)
 
 # Токен телеграм бота
 TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_TOKEN")
@@ -35,27 +59,189 @@ TWITTER_API_SECRET = os.environ.get("TWITTER_API_SECRET", "YOUR_TWITTER_SECRET")
 TWITTER_ACCESS_TOKEN = os.environ.get("TWITTER_ACCESS_TOKEN", "YOUR_TWITTER_ACCESS_TOKEN")
 TWITTER_ACCESS_SECRET = os.environ.get("TWITTER_ACCESS_SECRET", "YOUR_TWITTER_ACCESS_SECRET")
 
+# Ограничения для асинхронных вызовов Twitter API
+TWITTER_MAX_WORKERS = int(os.environ.get("TWITTER_MAX_WORKERS", "4"))
+TWITTER_TIMEOUT = float(os.environ.get("TWITTER_TIMEOUT", "120"))
+
+# Локальные публикаторы без сети для тестов, например "mastodon,linkedin"
+FAKE_PUBLISHERS = [name for name in os.environ.get("FAKE_PUBLISHERS", "").split(",") if name]
+
+# Период проверки постов, статистику которых пора обновить, в секундах (0 - сбор отключен)
+ENGAGEMENT_COLLECT_INTERVAL = float(os.environ.get("ENGAGEMENT_COLLECT_INTERVAL", "60"))
+
+# Количество запланированных постов, публикуемых одновременно
+SCHEDULER_CONCURRENCY = int(os.environ.get("SCHEDULER_CONCURRENCY", "4"))
+
+# Режим планировщика: "asyncio" - задачи в цикле событий бота, "thread" - отдельный поток с пулом
+SCHEDULER_MODE = os.environ.get("SCHEDULER_MODE", "asyncio")
+
+# За сколько секунд до публикации загружать медиафайл запланированного поста (0 - в момент публикации)
+MEDIA_PRESTAGE_SECS = float(os.environ.get("MEDIA_PRESTAGE_SECS", str(30 * 60)))
+
+# Количество процессов оптимизации изображений перед сохранением (0 - изображения не изменяются)
+MEDIA_OPTIMIZER_WORKERS = int(os.environ.get("MEDIA_OPTIMIZER_WORKERS", "2"))
+
+# Количество постов на одной странице истории
+HISTORY_PAGE_SIZE = 10
+
+# Объем кэша готовых страниц /history и /scheduled в байтах (0 - кэш отключен)
+VIEW_CACHE_MAX_BYTES = int(os.environ.get("VIEW_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Часовой пояс пользователей, не выбравших свой командой /timezone (пусто - пояс сервера)
+DEFAULT_TIMEZONE = os.environ.get("DEFAULT_TIMEZONE", "")
+
+# Период и количество популярных постов в отчете /stats
+STATS_PERIOD_DAYS = 7
+STATS_TOP_POSTS = 3
+
+# Хранение черновиков /new_post: "sqlite" (переживают перезапуск) или "memory"
+CONVERSATION_PERSISTENCE = os.environ.get("CONVERSATION_PERSISTENCE", "sqlite")
+DRAFT_TTL = int(os.environ.get("DRAFT_TTL", str(24 * 60 * 60)))
+MAX_DRAFTS_IN_MEMORY = int(os.environ.get("MAX_DRAFTS_IN_MEMORY", "10000"))
+# Период удаления брошенных черновиков и состояний разговоров в секундах
+DRAFT_SWEEP_INTERVAL = float(os.environ.get("DRAFT_SWEEP_INTERVAL", str(60 * 60)))
+
+# Способ получения обновлений: "polling" или "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+
+# Настройки webhook: публичный HTTPS-адрес, адрес и порт встроенного сервера
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+# Если секрет не задан, он генерируется при каждом запуске
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+# Сертификат и ключ TLS, если сервер принимает HTTPS без обратного прокси
+WEBHOOK_CERT = os.environ.get("WEBHOOK_CERT")
+WEBHOOK_KEY = os.environ.get("WEBHOOK_KEY")
+
+# Количество рабочих процессов; при значении больше 1 пользователи распределяются
+# между процессами по ID, а планировщик работает в одном из них
+SHARD_WORKERS = int(os.environ.get("SHARD_WORKERS", "1"))
+
+# Адрес HTTP-сервера метрик /metrics (0 - сервер не запускается). Рабочие процессы
+# используют следующие порты: METRICS_PORT + 1 + номер процесса
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+
+# Метрики обработки обновлений
+HANDLER_SECONDS = Histogram(
+    "telegram_handler_seconds",
+    "Длительность обработчиков команд и сообщений",
+    ("handler",)
+)
+HANDLER_ERRORS = Counter(
+    "telegram_handler_errors",
+    "Исключения в обработчиках команд и сообщений",
+    ("handler",)
+)
+UPDATE_QUEUE_SIZE = Gauge(
+    "telegram_update_queue_size",
+    "Количество обновлений, ожидающих обработки"
+)
+
 class SocialMediaBot:
     """Основной класс для Telegram-бота, управляющего публикациями в социальных сетях."""
     
     def __init__(self):
         """Инициализация бота, API социальных сетей и базы данных."""
         # Настраиваем соединение с базой данных
-        self.db_manager = DatabaseManager("social_posts.db")
+        self.db_manager = DatabaseManager("social_posts.db", view_cache_bytes=VIEW_CACHE_MAX_BYTES)
+        
+        # Уменьшение и перекодирование изображений в отдельных процессах перед сохранением
+        self.media_optimizer = MediaOptimizer(self.db_manager, max_workers=MEDIA_OPTIMIZER_WORKERS)
         
         # Инициализируем API для Twitter
         self.twitter_api = TwitterAPI(
             TWITTER_API_KEY,
             TWITTER_API_SECRET,
             TWITTER_ACCESS_TOKEN,
-            TWITTER_ACCESS_SECRET
+            TWITTER_ACCESS_SECRET,
+            media_store=self.db_manager.media_store
         )
         
+        # Асинхронная обертка, чтобы запросы к Twitter не блокировали обработку обновлений
+        self.async_twitter_api = AsyncTwitterAPI(
+            self.twitter_api,
+            max_workers=TWITTER_MAX_WORKERS,
+            timeout=TWITTER_TIMEOUT
+        )
+        
+        # Реестр платформ: публикация в несколько платформ выполняется параллельно
+        self.publishers = PublisherRegistry(max_workers=TWITTER_MAX_WORKERS, timeout=TWITTER_TIMEOUT)
+        self.publishers.register(self.twitter_api, self.async_twitter_api)
+        for name in FAKE_PUBLISHERS:
+            self.publishers.register(FakePublisher(name))
+        
         # Инициализируем планировщик задач
-        self.scheduler = PostScheduler(self.db_manager, self.twitter_api)
+        if SCHEDULER_MODE == "thread":
+            self.scheduler = PostScheduler(
+                self.db_manager,
+                self.publishers,
+                concurrency=SCHEDULER_CONCURRENCY,
+                notifier=self.notify_user,
+                media_prestage=MEDIA_PRESTAGE_SECS
+            )
+        else:
+            # Публикации выполняются задачами в цикле событий бота, уведомления отправляются сразу
+            self.scheduler = AsyncPostScheduler(
+                self.db_manager,
+                self.publishers,
+                concurrency=SCHEDULER_CONCURRENCY,
+                notifier=self.send_notification,
+                media_prestage=MEDIA_PRESTAGE_SECS
+            )
+        
+        # Планировщик запускается вместе с приложением; в рабочих процессах его запускает выбор ведущего
+        self.run_scheduler = False
+        
+        # Фоновый сбор лайков, ретвитов и ответов для команды /stats
+        self.engagement_collector = None
+        if ENGAGEMENT_COLLECT_INTERVAL > 0:
+            self.engagement_collector = EngagementCollector(
+                self.db_manager,
+                self.publishers,
+                interval=ENGAGEMENT_COLLECT_INTERVAL
+            )
         
-        # Словарь для хранения данных пользователей во время разговора
-        self.user_data = {}
+        # Приложение и его цикл событий, доступные после запуска (для уведомлений из других потоков)
+        self.application = None
+        self.loop = None
+        
+        # Черновики публикаций во время разговора: ограниченный LRU-кэш с временем жизни,
+        # при персистентном режиме продублированный в базе данных
+        self.persistent_conversations = CONVERSATION_PERSISTENCE == "sqlite"
+        self.drafts = ConversationStore(
+            self.db_manager if self.persistent_conversations else None,
+            ttl=DRAFT_TTL,
+            max_entries=MAX_DRAFTS_IN_MEMORY
+        )
+        self._draft_sweeper = None
+
+    async def _draft_expired(self, update: Update) -> int:
+        """Завершение разговора, черновик которого устарел или был вытеснен."""
+        message = "⌛ Черновик публикации устарел. Начните заново с помощью /new_post"
+        if update.callback_query:
+            await update.callback_query.edit_message_text(message)
+        else:
+            await update.message.reply_text(message)
+        return ConversationHandler.END
+
+    def _user_timezone(self, user_id: int):
+        """
+        Часовой пояс, в котором пользователь вводит и видит время.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            
+        Returns:
+            Optional[datetime.tzinfo]: Пояс пользователя или DEFAULT_TIMEZONE (None - пояс сервера)
+        """
+        name = self.db_manager.get_user_timezone(user_id) or DEFAULT_TIMEZONE
+        try:
+            return get_timezone(name)
+        except ValueError as e:
+            logger.warning(f"{e}, используется часовой пояс сервера")
+            return None
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обработчик команды /start."""
@@ -65,8 +251,10 @@ class SocialMediaBot:
             "Вот что я умею:\n"
             "/new_post - Создать новую публикацию\n"
             "/schedule - Запланировать публикацию\n"
+            "/import - Запланировать публикации из файла CSV/JSON\n"
             "/history - Посмотреть историю публикаций\n"
             "/delete_post - Удалить публикацию\n"
+            "/timezone - Часовой пояс для планирования\n"
             "/help - Справка по командам"
         )
 
@@ -78,14 +266,17 @@ class SocialMediaBot:
             "/new_post - Создать и опубликовать новый пост\n"
             "/schedule - Запланировать публикацию на определенное время\n"
             "/scheduled - Показать список запланированных публикаций\n"
+            "/import - Запланировать много публикаций из файла CSV, JSON или JSON Lines\n"
             "/history - Посмотреть историю ваших публикаций\n"
+            "/stats - Статистика лайков, ретвитов и ответов\n"
             "/delete_post - Удалить опубликованный пост\n"
+            "/timezone - Посмотреть или изменить часовой пояс\n"
             "/cancel - Отменить текущую операцию\n\n"
             "*Поддерживаемые платформы:*\n"
             "- Twitter (текст, изображения, видео)\n\n"
             "*Планирование публикаций:*\n"
             "Вы можете запланировать посты на конкретную дату и время.\n"
-            "Формат времени: ДД.ММ.ГГГГ ЧЧ:ММ",
+            "Формат времени: ДД.ММ.ГГГГ ЧЧ:ММ в вашем часовом поясе (/timezone)",
             parse_mode="Markdown"
         )
 
@@ -93,8 +284,12 @@ class SocialMediaBot:
         """Начало создания новой публикации."""
         # Создаем клавиатуру для выбора платформы
         keyboard = [
-            [InlineKeyboardButton("Twitter", callback_data="platform_twitter")]
+            [InlineKeyboardButton(self.publishers.get(name).title, callback_data=f"platform_{name}")]
+            for name in self.publishers.names()
         ]
+        if len(keyboard) > 1:
+            # Кросспостинг: один черновик публикуется во все платформы
+            keyboard.append([InlineKeyboardButton("Во все платформы", callback_data="platform_all")])
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(
@@ -104,12 +299,7 @@ class SocialMediaBot:
         
         # Инициализируем данные для нового поста
         user_id = update.effective_user.id
-        self.user_data[user_id] = {
-            "platform": None,
-            "text": None,
-            "media_path": None,
-            "media_type": None
-        }
+        self.drafts.create(user_id)
         
         return CHOOSING_PLATFORM
 
@@ -119,12 +309,20 @@ class SocialMediaBot:
         await query.answer()
         
         user_id = query.from_user.id
-        chosen_platform = query.data.split("_")[1]
+        chosen_platform = query.data.split("_", 1)[1]
         
-        self.user_data[user_id]["platform"] = chosen_platform
+        post_data = self.drafts.get(user_id)
+        if post_data is None:
+            return await self._draft_expired(update)
+        if chosen_platform == "all":
+            post_data.platforms = self.publishers.names()
+        else:
+            post_data.platforms = [chosen_platform]
+        self.drafts.save(user_id, post_data)
         
+        chosen = ", ".join(platform.capitalize() for platform in post_data.platforms)
         await query.edit_message_text(
-            f"Вы выбрали {chosen_platform.capitalize()}. Теперь отправьте текст вашей публикации:"
+            f"Вы выбрали {chosen}. Теперь отправьте текст вашей публикации:"
         )
         
         return TYPING_MESSAGE
@@ -135,7 +333,11 @@ class SocialMediaBot:
         message_text = update.message.text
         
         # Сохраняем текст публикации
-        self.user_data[user_id]["text"] = message_text
+        post_data = self.drafts.get(user_id)
+        if post_data is None:
+            return await self._draft_expired(update)
+        post_data.text = message_text
+        self.drafts.save(user_id, post_data)
         
         # Спрашиваем о медиафайле
         keyboard = [
@@ -182,17 +384,27 @@ class SocialMediaBot:
         user_id = update.effective_user.id
         
         # Определяем тип медиафайла
+        mime_type = None
         if update.message.photo:
             # Для фото берем самое большое изображение
-            file_id = update.message.photo[-1].file_id
+            photo = update.message.photo[-1]
+            file_id = photo.file_id
+            file_unique_id = photo.file_unique_id
             media_type = "photo"
+            media_info = telegram_media_info("image/jpeg", photo.file_size, photo.width, photo.height)
         elif update.message.video:
-            file_id = update.message.video.file_id
+            video = update.message.video
+            file_id = video.file_id
+            file_unique_id = video.file_unique_id
+            mime_type = video.mime_type
             media_type = "video"
+            media_info = telegram_media_info(mime_type, video.file_size, video.width, video.height, video.duration)
         elif update.message.document:
             file_id = update.message.document.file_id
+            file_unique_id = update.message.document.file_unique_id
             # Для документов проверяем MIME-тип
             mime_type = update.message.document.mime_type
+            media_info = telegram_media_info(mime_type, update.message.document.file_size)
             if mime_type and mime_type.startswith("image"):
                 media_type = "photo"
             elif mime_type and mime_type.startswith("video"):
@@ -210,23 +422,27 @@ class SocialMediaBot:
             )
             return UPLOADING_MEDIA
         
-        # Скачиваем файл
-        file = await context.bot.get_file(file_id)
-        file_path = f"media/user_{user_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        # Создаем папку, если не существует
-        os.makedirs("media", exist_ok=True)
+        # Запоминаем файл Telegram. При немедленной публикации он передается в Twitter
+        # потоком, а на диск сохраняется только для запланированных постов
+        post_data = self.drafts.get(user_id)
+        if post_data is None:
+            return await self._draft_expired(update)
         
-        if media_type == "photo":
-            file_path += ".jpg"
-        else:
-            file_path += ".mp4"
+        # Мгновенная проверка по метаданным Telegram: файлы, которые платформа заведомо
+        # отклонит, не скачиваются и не загружаются
+        if media_type == "photo" and self.media_optimizer.rewrites(media_info["format"]):
+            # Размер и разрешение JPEG и PNG оптимизатор приведет к ограничениям сам;
+            # GIF, WebP и неизвестные форматы сохраняются как есть и проверяются сразу
+            media_info.update(size=None, width=None, height=None)
+        error = self._check_media(post_data.platforms, media_type, media_info)
+        if error:
+            return await self._reject_media(update, user_id, post_data, error)
         
-        await file.download_to_drive(file_path)
-        
-        # Сохраняем путь к файлу и тип
-        self.user_data[user_id]["media_path"] = file_path
-        self.user_data[user_id]["media_type"] = media_type
+        post_data.file_id = file_id
+        post_data.file_unique_id = file_unique_id
+        post_data.mime_type = mime_type
+        post_data.media_type = media_type
+        self.drafts.save(user_id, post_data)
         
         # Переходим к планированию или публикации
         keyboard = [
@@ -242,6 +458,172 @@ class SocialMediaBot:
         
         return SCHEDULING
 
+    def _check_media(self, platforms: List[str], media_type: str, media_info: dict) -> Optional[str]:
+        """
+        Проверка медиафайла по ограничениям выбранных платформ (см. media_preflight).
+        
+        Args:
+            platforms (List[str]): Идентификаторы платформ
+            media_type (str): Тип медиафайла ('photo' или 'video')
+            media_info (dict): Описание файла (probe_media или telegram_media_info)
+        
+        Returns:
+            Optional[str]: Первое нарушение с названием платформы или None, если файл подходит
+        """
+        for name in platforms:
+            publisher = self.publishers.get(name)
+            limits = publisher.media_limits.get(media_type) if publisher else None
+            if limits is None:
+                continue
+            error = check_limits(media_info, limits)
+            if error:
+                logger.info(f"Медиафайл отклонен до загрузки в {name}: {error}")
+                return f"{publisher.title}: {error}"
+        return None
+
+    def _check_stored_media(self, post_data: PostDraft) -> Optional[str]:
+        """
+        Проверка скачанного медиафайла по заголовкам контейнера: кодеки и длительность
+        видео известны только из самого файла.
+        
+        Args:
+            post_data (PostDraft): Черновик публикации
+        
+        Returns:
+            Optional[str]: Первое нарушение или None, если файл подходит или его нет
+        """
+        if not post_data.media_path:
+            return None
+        return self._check_media(post_data.platforms, post_data.media_type, probe_media(post_data.media_path))
+
+    async def _reject_media(self, update: Update, user_id: int, post_data: PostDraft, error: str) -> int:
+        """
+        Отказ в публикации медиафайла: файл удаляется из черновика, пользователь
+        может отправить другой.
+        
+        Args:
+            update (Update): Обновление Telegram
+            user_id (int): ID пользователя Telegram
+            post_data (PostDraft): Черновик публикации
+            error (str): Описание нарушения
+        
+        Returns:
+            int: Состояние ожидания медиафайла
+        """
+        media_path = post_data.media_path
+        post_data.media_path = None
+        post_data.media_type = None
+        post_data.file_id = None
+        post_data.file_unique_id = None
+        post_data.mime_type = None
+        self.drafts.save(user_id, post_data)
+        if media_path:
+            # Файл не попал ни в один пост - удаляем его, если на него нет других ссылок
+            # (черновик без файла уже стоит в очереди записи перед проверкой ссылок)
+            await self.db_manager.media_store.release_async(media_path)
+        
+        message = (
+            f"❌ Этот медиафайл нельзя опубликовать.\n{error}\n\n"
+            "Пожалуйста, отправьте другое изображение или видео."
+        )
+        if update.callback_query:
+            await update.callback_query.edit_message_text(message)
+        else:
+            await update.message.reply_text(message)
+        return UPLOADING_MEDIA
+
+    async def _download_media(self, context: ContextTypes.DEFAULT_TYPE, user_id: int, post_data: PostDraft) -> None:
+        """
+        Сохранение медиафайла черновика на диск (нужно для отложенной публикации).
+        
+        Args:
+            context (ContextTypes.DEFAULT_TYPE): Контекст обработчика
+            user_id (int): ID пользователя Telegram
+            post_data (PostDraft): Черновик публикации
+        """
+        if post_data.media_path or not post_data.file_id:
+            return
+        
+        # Этот файл Telegram уже есть в хранилище - повторно не скачиваем
+        media_store = self.db_manager.media_store
+        stored_path = media_store.find_by_telegram_id(post_data.file_unique_id)
+        if stored_path:
+            post_data.media_path = stored_path
+            return
+        
+        # Скачиваем файл во временный каталог хранилища
+        file = await context.bot.get_file(post_data.file_id)
+        file_name = f"user_{user_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        
+        if post_data.media_type == "photo":
+            file_name += ".jpg"
+        else:
+            file_name += ".mp4"
+        
+        file_path = media_store.temp_path(file_name)
+        await file.download_to_drive(file_path)
+        
+        # Уменьшаем изображение до ограничений платформ и перемещаем файл в хранилище
+        # по хэшу содержимого (одинаковые файлы хранятся один раз)
+        post_data.media_path = await self.media_optimizer.store(
+            file_path,
+            post_data.media_type,
+            post_data.file_unique_id
+        )
+
+    async def _publish_media_now(self, context: ContextTypes.DEFAULT_TYPE, post_data: PostDraft) -> dict:
+        """
+        Немедленная публикация черновика с медиафайлом Telegram в Twitter.
+        
+        Уже сохраненные или недавно загруженные файлы не скачиваются и не загружаются
+        повторно; остальные передаются из Telegram в Twitter потоком, без копии на диске.
+        
+        Args:
+            context (ContextTypes.DEFAULT_TYPE): Контекст обработчика
+            post_data (PostDraft): Черновик публикации
+            
+        Returns:
+            dict: Результат публикации (см. TwitterAPI.post_with_media)
+        """
+        media_store = self.db_manager.media_store
+        text = post_data.text
+        media_type = post_data.media_type
+        file_unique_id = post_data.file_unique_id
+        
+        # Файл уже есть в хранилище - публикуем через кэш media_id
+        stored_path = media_store.find_by_telegram_id(file_unique_id)
+        if stored_path:
+            post_data.media_path = stored_path
+            return await self.async_twitter_api.post_with_media(text, stored_path, media_type)
+        
+        # Файл недавно передавался потоком и его media_id еще действует
+        content_hash = self.db_manager.get_media_alias(file_unique_id)
+        cached_media_id = media_store.get_cached_media_id("twitter", content_hash=content_hash)
+        if cached_media_id:
+            return await self.async_twitter_api.post_with_media_ids(text, [cached_media_id])
+        
+        file = await context.bot.get_file(post_data.file_id)
+        hasher = hashlib.sha256()
+        result = await self.async_twitter_api.post_with_media_stream(
+            text,
+            hashing_stream(iter_telegram_file(file), hasher),
+            file.file_size,
+            guess_mime_type(media_type, post_data.mime_type),
+            media_type
+        )
+        
+        if result["success"]:
+            # Запоминаем загруженный файл, чтобы повторная публикация не загружала его снова
+            content_hash = hasher.hexdigest()
+            await self.db_manager.add_media_alias_async(file_unique_id, content_hash)
+            await media_store.cache_media_id_async(
+                "twitter",
+                result["media_id"],
+                result["expires_after_secs"],
+                content_hash
+            )
+        return result
+
     async def schedule_choice(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Обработка выбора между немедленной публикацией и планированием."""
         query = update.callback_query
@@ -251,27 +633,39 @@ class SocialMediaBot:
         
         if query.data == "publish_now":
             # Публикуем сейчас
-            post_data = self.user_data[user_id]
-            platform = post_data["platform"]
-            text = post_data["text"]
-            media_path = post_data["media_path"]
-            media_type = post_data["media_type"]
+            post_data = self.drafts.get(user_id)
+            if post_data is None:
+                return await self._draft_expired(update)
+            platforms = post_data.platforms
+            text = post_data.text
+            media_type = post_data.media_type
             
             await query.edit_message_text("Публикую ваш пост...")
             
-            # Публикация в зависимости от платформы
-            if platform == "twitter":
-                if media_path:
-                    # Публикация с медиафайлом
-                    result = self.twitter_api.post_with_media(text, media_path, media_type)
-                else:
-                    # Текстовая публикация
-                    result = self.twitter_api.post_text(text)
-                
-                # Проверяем результат
+            # Изображения перед публикацией оптимизируются, поэтому потоком передается только видео
+            streamable = media_type == "video" or not self.media_optimizer.enabled
+            if post_data.file_id and not post_data.media_path and platforms == ["twitter"] and streamable:
+                # Только Twitter: медиафайл передается из Telegram потоком, без копии на диске
+                results = {"twitter": await self._publish_media_now(context, post_data)}
+            else:
+                # Медиафайл сохраняется один раз, и все платформы публикуют его параллельно
+                await self._download_media(context, user_id, post_data)
+                error = self._check_stored_media(post_data)
+                if error:
+                    return await self._reject_media(update, user_id, post_data, error)
+                results = await self.publishers.publish_many(
+                    platforms,
+                    text,
+                    post_data.media_path,
+                    media_type
+                )
+            media_path = post_data.media_path
+            
+            # Сохраняем в базу данных результат каждой платформы
+            messages = []
+            for platform, result in results.items():
                 if result["success"]:
-                    # Сохраняем в базу данных
-                    self.db_manager.add_post(
+                    await self.db_manager.add_post_async(
                         user_id,
                         platform,
                         text,
@@ -279,27 +673,35 @@ class SocialMediaBot:
                         result["post_id"],
                         "published"
                     )
-                    
-                    await query.edit_message_text(
+                    messages.append(
                         f"✅ Успешно опубликовано в {platform.capitalize()}!\n\n"
                         f"ID поста: {result['post_id']}\n"
                         f"Ссылка: {result.get('post_url', 'Недоступно')}"
                     )
                 else:
-                    await query.edit_message_text(
+                    messages.append(
                         f"❌ Ошибка при публикации в {platform.capitalize()}:\n"
                         f"{result['error']}"
                     )
             
             # Очищаем данные пользователя
-            del self.user_data[user_id]
+            self.drafts.delete(user_id)
+            
+            if media_path and not any(result["success"] for result in results.values()):
+                # Медиафайл не попал ни в один пост - удаляем его, если на него нет других ссылок
+                # (удаление черновика уже стоит в очереди записи перед проверкой ссылок)
+                await self.db_manager.media_store.release_async(media_path)
+            
+            await query.edit_message_text("\n\n".join(messages))
             return ConversationHandler.END
         else:
             # Планируем на будущее
+            tz = self._user_timezone(user_id)
             await query.edit_message_text(
                 "Пожалуйста, укажите дату и время для публикации в формате:\n"
                 "ДД.ММ.ГГГГ ЧЧ:ММ\n\n"
-                "Например: 25.12.2023 15:30"
+                "Например: 25.12.2023 15:30\n\n"
+                f"Часовой пояс: {tz or 'сервера'} (изменить - /timezone)"
             )
             return SCHEDULING
 
@@ -309,48 +711,61 @@ class SocialMediaBot:
         schedule_text = update.message.text
         
         try:
-            # Парсим дату и время
+            # Парсим дату и время в часовом поясе пользователя
             schedule_datetime = datetime.datetime.strptime(schedule_text, "%d.%m.%Y %H:%M")
+            tz = self._user_timezone(user_id)
+            scheduled_at = to_epoch_ms(schedule_datetime, tz)
             
             # Проверяем, что дата в будущем
-            if schedule_datetime <= datetime.datetime.now():
+            if scheduled_at <= now_ms():
                 await update.message.reply_text(
                     "❌ Дата должна быть в будущем. Пожалуйста, укажите корректную дату и время:"
                 )
                 return SCHEDULING
             
             # Получаем данные поста
-            post_data = self.user_data[user_id]
-            platform = post_data["platform"]
-            text = post_data["text"]
-            media_path = post_data["media_path"]
-            media_type = post_data["media_type"]
+            post_data = self.drafts.get(user_id)
+            if post_data is None:
+                return await self._draft_expired(update)
             
-            # Сохраняем запланированную публикацию в базу данных
-            post_id = self.db_manager.add_scheduled_post(
-                user_id,
-                platform,
-                text,
-                media_path,
-                media_type,
-                schedule_datetime
-            )
+            # Для отложенной публикации медиафайл сохраняется на диск
+            await self._download_media(context, user_id, post_data)
+            error = self._check_stored_media(post_data)
+            if error:
+                return await self._reject_media(update, user_id, post_data, error)
             
-            # Добавляем задачу в планировщик
-            self.scheduler.schedule_post(post_id, schedule_datetime)
+            text = post_data.text
+            media_path = post_data.media_path
+            media_type = post_data.media_type
+            
+            # Для каждой платформы создается своя запланированная публикация,
+            # которая публикуется и повторяется независимо от остальных
+            scheduled = []
+            for platform in post_data.platforms:
+                post_id = await self.db_manager.add_scheduled_post_async(
+                    user_id,
+                    platform,
+                    text,
+                    media_path,
+                    media_type,
+                    scheduled_at
+                )
+                
+                # Добавляем задачу в планировщик
+                self.scheduler.schedule_post(post_id, scheduled_at, media_path is not None)
+                scheduled.append(f"{platform.capitalize()}: {post_id}")
             
             # Форматируем дату и время для отображения
-            formatted_datetime = schedule_datetime.strftime("%d.%m.%Y в %H:%M")
+            formatted_datetime = format_epoch_ms(scheduled_at, tz, "%d.%m.%Y в %H:%M")
             
             await update.message.reply_text(
                 f"✅ Публикация успешно запланирована на {formatted_datetime}!\n\n"
-                f"Платформа: {platform.capitalize()}\n"
-                f"ID запланированной публикации: {post_id}\n\n"
+                "ID запланированных публикаций:\n" + "\n".join(scheduled) + "\n\n"
                 "Вы можете просмотреть все запланированные публикации с помощью команды /scheduled"
             )
             
             # Очищаем данные пользователя
-            del self.user_data[user_id]
+            self.drafts.delete(user_id)
             return ConversationHandler.END
             
         except ValueError:
@@ -360,18 +775,132 @@ class SocialMediaBot:
             )
             return SCHEDULING
 
-    async def show_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-        """Показать историю публикаций."""
+    async def import_start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Начало импорта запланированных публикаций из файла."""
+        platforms = ", ".join(self.publishers.names())
+        await update.message.reply_text(
+            "📥 Отправьте файл CSV, JSON (массив объектов) или JSON Lines с публикациями.\n\n"
+            "Поля каждой записи:\n"
+            f"platform - платформа ({platforms}), несколько через запятую или all\n"
+            "text - текст публикации\n"
+            "scheduled_time - время публикации: ДД.ММ.ГГГГ ЧЧ:ММ (ваш часовой пояс, /timezone) "
+            "или ISO 8601\n\n"
+            "Пример строки CSV:\n"
+            "platform,text,scheduled_time\n"
+            "twitter,Всем привет!,25.12.2023 15:30\n\n"
+            "Для отмены используйте /cancel"
+        )
+        return IMPORTING
+
+    async def receive_import(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Разбор файла импорта и планирование корректных публикаций одной транзакцией."""
         user_id = update.effective_user.id
+        document = update.message.document
         
-        # Получаем историю публикаций из базы данных
-        posts = self.db_manager.get_user_posts(user_id)
-        
-        if not posts:
+        fmt = detect_format(document.file_name, document.mime_type)
+        if fmt is None:
             await update.message.reply_text(
-                "У вас пока нет опубликованных постов."
+                "❌ Поддерживаются только файлы .csv, .json и .jsonl. Отправьте другой файл или /cancel"
             )
-            return
+            return IMPORTING
+        if document.file_size and document.file_size > MAX_IMPORT_FILE_SIZE:
+            await update.message.reply_text(
+                f"❌ Файл больше {MAX_IMPORT_FILE_SIZE // (1024 * 1024)} МБ. Разделите его на части."
+            )
+            return IMPORTING
+        
+        message = await update.message.reply_text("Проверяю файл...")
+        
+        file = await context.bot.get_file(document.file_id)
+        file_path = self.db_manager.media_store.temp_path(
+            f"import_{user_id}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+        )
+        await file.download_to_drive(file_path)
+        try:
+            # Разбор файла занимает заметное время, поэтому выполняется вне цикла событий
+            report = await asyncio.get_running_loop().run_in_executor(
+                None,
+                functools.partial(parse_import_file, tz=self._user_timezone(user_id)),
+                file_path,
+                fmt,
+                self.publishers.names()
+            )
+        finally:
+            os.remove(file_path)
+        
+        # Все корректные публикации добавляются одной транзакцией и одной блокировкой планировщика
+        scheduled = []
+        if report.rows:
+            scheduled = await self.db_manager.add_scheduled_posts_async(user_id, report.rows)
+            if not scheduled:
+                await message.edit_text("❌ Не удалось сохранить публикации. Попробуйте позже.")
+                return ConversationHandler.END
+            # Третье поле строки импорта - путь к медиафайлу
+            self.scheduler.schedule_posts([
+                (post_id, scheduled_time, row[2] is not None)
+                for (post_id, scheduled_time), row in zip(scheduled, report.rows)
+            ])
+        
+        lines = [
+            f"✅ Запланировано публикаций: {len(scheduled)} (записей в файле: {report.records})"
+        ]
+        if report.errors:
+            lines.append(f"\n❌ Записей с ошибками: {len(report.errors)}")
+            for number, error in report.errors[:MAX_ERRORS_IN_MESSAGE]:
+                lines.append(f"Строка {number}: {error}")
+            if len(report.errors) > MAX_ERRORS_IN_MESSAGE:
+                lines.append("Полный список ошибок - в файле ниже.")
+        await message.edit_text("\n".join(lines))
+        
+        if len(report.errors) > MAX_ERRORS_IN_MESSAGE:
+            await update.message.reply_document(
+                io.BytesIO(report.error_report()),
+                filename="import_errors.csv"
+            )
+        
+        return ConversationHandler.END
+
+    async def receive_import_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        """Напоминание, что для импорта нужен файл."""
+        await update.message.reply_text(
+            "Отправьте файл с публикациями как документ или используйте /cancel для отмены."
+        )
+        return IMPORTING
+
+    def _render_history_page(self, user_id: int, cursor=None, older: bool = True):
+        """
+        Формирование текста и кнопок навигации для одной страницы истории.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            cursor: Ключ (created_at, id) граничного поста предыдущей страницы или None
+            older (bool): Направление листания относительно курсора
+            
+        Returns:
+            Tuple[Optional[str], Optional[InlineKeyboardMarkup]]: Текст страницы и клавиатура
+                (None, None), если постов нет
+        """
+        # Страница не изменилась с прошлого просмотра - база данных не нужна
+        view_cache = self.db_manager.view_cache
+        key = (cursor, older)
+        cached = view_cache.get(user_id, "history", key)
+        if cached is not None:
+            return cached
+        version = view_cache.version()
+        
+        page = self._build_history_page(user_id, cursor, older)
+        view_cache.put(user_id, "history", key, page, version)
+        return page
+
+    def _build_history_page(self, user_id: int, cursor, older: bool):
+        """Построение страницы истории по данным из базы (см. _render_history_page)."""
+        posts, has_more = self.db_manager.get_user_posts_page(
+            user_id, HISTORY_PAGE_SIZE, cursor, older
+        )
+        
+        if not posts:
+            return None, None
+        tz = self._user_timezone(user_id)
         
         # Формируем сообщение с историей
         history_text = "📜 *История ваших публикаций:*\n\n"
@@ -388,7 +917,7 @@ class SocialMediaBot:
                 f"*{i}. Платформа:* {platform.capitalize()}\n"
                 f"*ID:* {social_post_id}\n"
                 f"*Статус:* {status}\n"
-                f"*Дата:* {created_at}\n"
+                f"*Дата:* {format_epoch_ms(created_at, tz)}\n"
                 f"*Текст:* {text}\n\n"
             )
             
@@ -400,26 +929,123 @@ class SocialMediaBot:
             "/delete_post [ID поста]"
         )
         
+        # Есть ли посты новее и старше текущей страницы
+        if cursor is None:
+            has_newer, has_older = False, has_more
+        elif older:
+            has_newer, has_older = True, has_more
+        else:
+            has_newer, has_older = has_more, True
+        
+        # Курсор страницы - ключ (created_at, id) ее крайнего поста
+        buttons = []
+        if has_newer:
+            first = posts[0]
+            buttons.append(InlineKeyboardButton(
+                "⬅️ Новее", callback_data=f"history:newer:{first[0]}:{first[6]}"
+            ))
+        if has_older:
+            last = posts[-1]
+            buttons.append(InlineKeyboardButton(
+                "Старше ➡️", callback_data=f"history:older:{last[0]}:{last[6]}"
+            ))
+        reply_markup = InlineKeyboardMarkup([buttons]) if buttons else None
+        
+        return history_text, reply_markup
+
+    async def show_history(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Показать первую страницу истории публикаций."""
+        user_id = update.effective_user.id
+        
+        # Получаем первую страницу истории из базы данных
+        history_text, reply_markup = self._render_history_page(user_id)
+        
+        if history_text is None:
+            await update.message.reply_text(
+                "У вас пока нет опубликованных постов."
+            )
+            return
+        
         await update.message.reply_text(
             history_text,
-            parse_mode="Markdown"
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+
+    async def history_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Переход на соседнюю страницу истории по кнопке навигации."""
+        query = update.callback_query
+        await query.answer()
+        
+        user_id = query.from_user.id
+        _, direction, post_id, created_at = query.data.split(":", 3)
+        try:
+            cursor = (int(created_at), int(post_id))
+        except ValueError:
+            # Кнопка из сообщения, отправленного до перехода на время в миллисекундах
+            cursor = None
+        
+        history_text, reply_markup = self._render_history_page(
+            user_id,
+            cursor=cursor,
+            older=(direction == "older")
+        )
+        
+        if history_text is None:
+            await query.edit_message_text("На этой странице больше нет публикаций.")
+            return
+        
+        await query.edit_message_text(
+            history_text,
+            parse_mode="Markdown",
+            reply_markup=reply_markup
         )
 
     async def show_scheduled(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Показать запланированные публикации."""
         user_id = update.effective_user.id
         
-        # Получаем запланированные публикации из базы данных
-        scheduled_posts = self.db_manager.get_scheduled_posts(user_id)
+        # Список не изменился с прошлого просмотра - база данных не нужна
+        view_cache = self.db_manager.view_cache
+        cached = view_cache.get(user_id, "scheduled")
+        if cached is not None:
+            scheduled_text, = cached
+        else:
+            version = view_cache.version()
+            scheduled_text, expires_at = self._render_scheduled(user_id)
+            view_cache.put(user_id, "scheduled", (), (scheduled_text,), version, expires_at)
         
-        if not scheduled_posts:
+        if scheduled_text is None:
             await update.message.reply_text(
                 "У вас нет запланированных публикаций."
             )
             return
         
+        await update.message.reply_text(
+            scheduled_text,
+            parse_mode="Markdown"
+        )
+
+    def _render_scheduled(self, user_id: int):
+        """
+        Формирование текста списка запланированных публикаций.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            
+        Returns:
+            Tuple[Optional[str], Optional[float]]: Текст (None, если публикаций нет) и время
+                в секундах Unix, когда первая публикация выйдет из списка
+        """
+        # Получаем запланированные публикации из базы данных
+        scheduled_posts = self.db_manager.get_scheduled_posts(user_id)
+        
+        if not scheduled_posts:
+            return None, None
+        
         # Формируем сообщение с запланированными публикациями
         scheduled_text = "📅 *Запланированные публикации:*\n\n"
+        tz = self._user_timezone(user_id)
         
         for i, post in enumerate(scheduled_posts, 1):
             post_id, platform, text, media_path, media_type, scheduled_time = post
@@ -429,7 +1055,7 @@ class SocialMediaBot:
                 text = text[:47] + "..."
             
             # Форматируем дату и время
-            formatted_time = scheduled_time.strftime("%d.%m.%Y в %H:%M")
+            formatted_time = format_epoch_ms(scheduled_time, tz, "%d.%m.%Y в %H:%M")
             
             # Формируем сообщение о запланированном посте
             post_info = (
@@ -447,9 +1073,76 @@ class SocialMediaBot:
             "/cancel_scheduled [ID публикации]"
         )
         
+        # Список отсортирован по времени: первым из него выйдет первый пост
+        return scheduled_text, scheduled_posts[0][5] / 1000
+
+    async def show_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Статистика вовлеченности из заранее агрегированных данных, без запросов к API."""
+        user_id = update.effective_user.id
+        
+        since_day = int(time.time() // 86400) - STATS_PERIOD_DAYS + 1
+        likes, retweets, replies, recent_likes, recent_retweets, recent_replies = (
+            self.db_manager.get_user_engagement(user_id, since_day)
+        )
+        top_posts = self.db_manager.get_top_posts(user_id, STATS_TOP_POSTS)
+        
+        if not top_posts and not (likes or retweets or replies):
+            await update.message.reply_text(
+                "📊 Статистика пока не собрана. Она появится через несколько минут после публикации."
+            )
+            return
+        
+        message = (
+            "📊 *Статистика ваших публикаций*\n\n"
+            f"*Всего:* ❤️ {likes}  🔁 {retweets}  💬 {replies}\n"
+            f"*За {STATS_PERIOD_DAYS} дней:* ❤️ {recent_likes}  🔁 {recent_retweets}  💬 {recent_replies}\n"
+        )
+        if top_posts:
+            message += "\n*Самые популярные посты:*\n"
+            for post_id, platform, text, post_likes, post_retweets, post_replies in top_posts:
+                if len(text) > 50:
+                    text = text[:47] + "..."
+                # Текст поста может содержать символы разметки (_, *, `, [)
+                message += (
+                    f"\n*ID:* {post_id} ({escape_markdown(platform.capitalize())})\n"
+                    f"{escape_markdown(text)}\n"
+                    f"❤️ {post_likes}  🔁 {post_retweets}  💬 {post_replies}\n"
+                )
+        
+        await update.message.reply_text(message, parse_mode="Markdown")
+
+    async def set_timezone(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Просмотр и изменение часового пояса, в котором вводится и показывается время."""
+        user_id = update.effective_user.id
+        
+        if not context.args:
+            tz = self._user_timezone(user_id)
+            await update.message.reply_text(
+                f"🕒 Ваш часовой пояс: {tz or 'сервера'}\n"
+                f"Сейчас: {format_epoch_ms(now_ms(), tz)}\n\n"
+                "Чтобы изменить его, укажите название из базы IANA.\n"
+                "Например: /timezone Europe/Moscow"
+            )
+            return
+        
+        name = context.args[0]
+        try:
+            tz = get_timezone(name)
+        except ValueError:
+            await update.message.reply_text(
+                f"❌ Неизвестный часовой пояс: {name}\n"
+                "Например: Europe/Moscow, Asia/Yekaterinburg, UTC"
+            )
+            return
+        
+        if not await self.db_manager.set_user_timezone_async(user_id, name):
+            await update.message.reply_text("❌ Не удалось сохранить часовой пояс. Попробуйте позже.")
+            return
+        
+        # Уже запланированные публикации выйдут в то же абсолютное время
         await update.message.reply_text(
-            scheduled_text,
-            parse_mode="Markdown"
+            f"✅ Часовой пояс изменен на {tz}.\n"
+            f"Сейчас: {format_epoch_ms(now_ms(), tz)}"
         )
 
     async def delete_post(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -477,24 +1170,19 @@ class SocialMediaBot:
         platform = post[1]
         social_post_id = post[4]
         
-        if platform == "twitter":
-            result = self.twitter_api.delete_post(social_post_id)
+        result = await self.publishers.delete_post(platform, social_post_id)
+        
+        if result["success"]:
+            # Удаляем пост из базы данных
+            await self.db_manager.delete_post_async(user_id, post_id)
             
-            if result["success"]:
-                # Удаляем пост из базы данных
-                self.db_manager.delete_post(user_id, post_id)
-                
-                await update.message.reply_text(
-                    f"✅ Пост успешно удален из {platform.capitalize()}!"
-                )
-            else:
-                await update.message.reply_text(
-                    f"❌ Ошибка при удалении поста из {platform.capitalize()}:\n"
-                    f"{result['error']}"
-                )
+            await update.message.reply_text(
+                f"✅ Пост успешно удален из {platform.capitalize()}!"
+            )
         else:
             await update.message.reply_text(
-                f"❌ Удаление для платформы {platform} не поддерживается."
+                f"❌ Ошибка при удалении поста из {platform.capitalize()}:\n"
+                f"{result['error']}"
             )
 
     async def cancel_scheduled(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -518,11 +1206,17 @@ class SocialMediaBot:
             )
             return
         
-        # Отменяем публикацию в планировщике
-        self.scheduler.cancel_scheduled_post(post_id)
+        # Удаляем запланированную публикацию из базы данных. Из планировщика она убирается
+        # только после удаления: иначе при ошибке пост остался бы в базе, но не в куче
+        # и не был бы опубликован до перезапуска. Если планировщик успеет извлечь пост
+        # раньше, захват удаленной записи просто не удастся
+        if not await self.db_manager.delete_scheduled_post_async(user_id, post_id):
+            await update.message.reply_text(
+                f"❌ Публикация с ID {post_id} уже публикуется и не может быть отменена."
+            )
+            return
         
-        # Удаляем запланированную публикацию из базы данных
-        self.db_manager.delete_scheduled_post(user_id, post_id)
+        self.scheduler.cancel_scheduled_post(post_id)
         
         await update.message.reply_text(
             "✅ Запланированная публикация успешно отменена!"
@@ -533,8 +1227,7 @@ class SocialMediaBot:
         user_id = update.effective_user.id
         
         # Очищаем данные пользователя, если они существуют
-        if user_id in self.user_data:
-            del self.user_data[user_id]
+        self.drafts.delete(user_id)
         
         await update.message.reply_text(
             "🚫 Операция отменена. Что бы вы хотели сделать дальше?\n\n"
@@ -544,11 +1237,170 @@ class SocialMediaBot:
         
         return ConversationHandler.END
 
-def main():
-    """Запуск бота."""
-    # Создаем бота
-    bot = SocialMediaBot()
+    def notify_user(self, user_id: int, text: str) -> None:
+        """
+        Отправка сообщения пользователю из другого потока (например, планировщика).
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            text (str): Текст сообщения
+        """
+        if self.loop is None:
+            logger.warning(f"Бот еще не запущен, уведомление пользователю {user_id} не отправлено")
+            return
+        asyncio.run_coroutine_threadsafe(
+            self.application.bot.send_message(chat_id=user_id, text=text),
+            self.loop
+        )
+
+    async def send_notification(self, user_id: int, text: str) -> None:
+        """
+        Отправка сообщения пользователю из цикла событий (например, асинхронным планировщиком).
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            text (str): Текст сообщения
+        """
+        await self.application.bot.send_message(chat_id=user_id, text=text)
+
+    async def post_init(self, application: Application) -> None:
+        """Запоминание приложения и цикла событий после запуска, запуск фоновых задач."""
+        self.application = application
+        self.loop = asyncio.get_running_loop()
+        UPDATE_QUEUE_SIZE.set_function(application.update_queue.qsize)
+        if isinstance(self.scheduler, AsyncPostScheduler):
+            # Выбор ведущего запускает планировщик из своего потока, задачи создаются в этом цикле
+            self.scheduler.loop = self.loop
+        if self.run_scheduler:
+            self.scheduler.start()
+        if self.engagement_collector:
+            self.engagement_collector.start()
+        if application.job_queue is None:
+            logger.warning("Очередь заданий PTB недоступна (нет дополнения job-queue): "
+                           "брошенные разговоры не завершаются по таймауту")
+        if DRAFT_SWEEP_INTERVAL > 0:
+            self._draft_sweeper = self.loop.create_task(self._sweep_drafts())
+
+    async def _sweep_drafts(self) -> None:
+        """Периодическое удаление брошенных черновиков и состояний разговоров."""
+        while True:
+            await asyncio.sleep(DRAFT_SWEEP_INTERVAL)
+            try:
+                deleted = await self.drafts.purge_expired()
+                if deleted:
+                    logger.info(f"Удалено брошенных черновиков: {deleted}")
+            except Exception as e:
+                logger.error(f"Ошибка при удалении брошенных черновиков: {e}")
+
+    async def post_stop(self, application: Application) -> None:
+        """Остановка планировщика, пока клиент Telegram еще может отправлять уведомления."""
+        if self._draft_sweeper:
+            self._draft_sweeper.cancel()
+            self._draft_sweeper = None
+        if self.run_scheduler:
+            await self.scheduler.aclose()
+
+    async def post_shutdown(self, application: Application) -> None:
+        """Освобождение ресурсов при остановке приложения."""
+        if self.engagement_collector:
+            self.engagement_collector.stop()
+        self.publishers.close()
+        self.async_twitter_api.close()
+        self.media_optimizer.close()
+        self.db_manager.close()
+
+def instrument_handler(callback):
+    """
+    Обертка обработчика, записывающая его длительность и исключения в метрики.
+    
+    Args:
+        callback: Асинхронный обработчик (update, context)
     
+    Returns:
+        Обработчик с той же сигнатурой
+    """
+    name = callback.__name__
+    
+    @functools.wraps(callback)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+    return wrapper
+
+def instrument_handlers(handlers) -> None:
+    """Подключение метрик ко всем обработчикам, включая вложенные в ConversationHandler."""
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            instrument_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                instrument_handlers(state_handlers)
+            instrument_handlers(handler.fallbacks)
+        else:
+            handler.callback = instrument_handler(handler.callback)
+
+async def run_webhook(application: Application) -> None:
+    """
+    Работа бота в режиме webhook: Telegram присылает обновления во встроенный HTTP-сервер.
+    
+    Args:
+        application (Application): Приложение бота
+    """
+    ssl_context = None
+    if WEBHOOK_CERT and WEBHOOK_KEY:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(WEBHOOK_CERT, WEBHOOK_KEY)
+    
+    server = WebhookServer(
+        application,
+        WEBHOOK_SECRET,
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=urllib.parse.urlsplit(WEBHOOK_URL).path or "/",
+        ssl_context=ssl_context
+    )
+    
+    # Останавливаемся по SIGINT/SIGTERM (в Windows - по KeyboardInterrupt)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+    
+    # Повторяем последовательность запуска и остановки run_polling
+    try:
+        await start_application(application)
+        await server.start()
+        await application.bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"Webhook установлен: {WEBHOOK_URL}")
+        
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        await stop_application(application)
+
+def build_application(bot: SocialMediaBot, builder) -> Application:
+    """
+    Создание приложения с обработчиками бота.
+    
+    Args:
+        bot (SocialMediaBot): Бот
+        builder (ApplicationBuilder): Настроенный построитель приложения
+    
+    Returns:
+        Application: Приложение бота
+    """
     # Создаем обработчик разговора для создания публикации
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("new_post", bot.new_post)],
@@ -571,28 +1423,114 @@ def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, bot.receive_schedule)
             ]
         },
-        fallbacks=[CommandHandler("cancel", bot.cancel)]
+        fallbacks=[CommandHandler("cancel", bot.cancel)],
+        # Состояния разговоров сохраняются в SQLite и восстанавливаются после перезапуска
+        name="new_post",
+        persistent=bot.persistent_conversations,
+        # Брошенные разговоры завершаются одновременно с устареванием черновика (нужна
+        # очередь заданий PTB, дополнение job-queue)
+        conversation_timeout=DRAFT_TTL
+    )
+    
+    # Обработчик разговора для импорта запланированных публикаций из файла
+    import_handler = ConversationHandler(
+        entry_points=[CommandHandler("import", bot.import_start)],
+        states={
+            IMPORTING: [
+                MessageHandler(filters.Document.ALL, bot.receive_import),
+                MessageHandler(~filters.COMMAND, bot.receive_import_text)
+            ]
+        },
+        fallbacks=[CommandHandler("cancel", bot.cancel)],
+        name="import",
+        persistent=bot.persistent_conversations,
+        conversation_timeout=DRAFT_TTL
     )
     
     # Создаем приложение и добавляем обработчики
-    application = Application.builder().token(TOKEN).build()
+    builder = builder.post_init(bot.post_init).post_stop(bot.post_stop).post_shutdown(bot.post_shutdown)
+    if bot.persistent_conversations:
+        builder = builder.persistence(SQLitePersistence(bot.db_manager, ttl=DRAFT_TTL))
+    application = builder.build()
     
-    # Добавляем обработчик разговора
+    # Добавляем обработчики разговоров
     application.add_handler(conv_handler)
+    application.add_handler(import_handler)
     
     # Добавляем обработчики команд
     application.add_handler(CommandHandler("start", bot.start))
     application.add_handler(CommandHandler("help", bot.help_command))
     application.add_handler(CommandHandler("history", bot.show_history))
+    application.add_handler(CallbackQueryHandler(bot.history_page, pattern=r"^history:(older|newer):"))
     application.add_handler(CommandHandler("scheduled", bot.show_scheduled))
+    application.add_handler(CommandHandler("stats", bot.show_stats))
+    application.add_handler(CommandHandler("timezone", bot.set_timezone))
     application.add_handler(CommandHandler("delete_post", bot.delete_post))
     application.add_handler(CommandHandler("cancel_scheduled", bot.cancel_scheduled))
     
-    # Запускаем планировщик заданий для бота
-    bot.scheduler.start()
+    # Длительность каждого обработчика доступна в метриках
+    for handlers in application.handlers.values():
+        instrument_handlers(handlers)
+    
+    return application
+
+def build_worker() -> Tuple[SocialMediaBot, Application]:
+    """
+    Создание бота в рабочем процессе. Обновления приходят от родительского процесса,
+    поэтому Updater не нужен, а планировщик запускает выбор ведущего процесса.
+    
+    Returns:
+        Tuple[SocialMediaBot, Application]: Бот и его приложение
+    """
+    bot = SocialMediaBot()
+    return bot, build_application(bot, Application.builder().token(TOKEN).updater(None))
+
+def run_application(application: Application) -> None:
+    """
+    Получение обновлений выбранным способом до остановки бота.
+    
+    Args:
+        application (Application): Приложение бота
+    """
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise ValueError("Для режима webhook необходимо задать WEBHOOK_URL")
+        try:
+            asyncio.run(run_webhook(application))
+        except KeyboardInterrupt:
+            pass
+    else:
+        application.run_polling()
+
+def main():
+    """Запуск бота."""
+    if SHARD_WORKERS > 1:
+        # Родительский процесс только получает обновления и передает их рабочим процессам
+        pool = ShardPool(SHARD_WORKERS, build_worker, metrics_host=METRICS_HOST, metrics_port=METRICS_PORT)
+        pool.start()
+        if METRICS_PORT:
+            MetricsServer(METRICS_HOST, METRICS_PORT).start()
+        application = Application.builder().token(TOKEN).build()
+        application.add_handler(TypeHandler(Update, pool.route))
+        try:
+            run_application(application)
+        finally:
+            pool.stop()
+        return
+    
+    # Создаем бота
+    bot = SocialMediaBot()
+    application = build_application(bot, Application.builder().token(TOKEN))
+    
+    # Планировщик заданий запустится вместе с приложением (post_init)
+    bot.run_scheduler = True
+    
+    # Метрики процесса для Prometheus
+    if METRICS_PORT:
+        MetricsServer(METRICS_HOST, METRICS_PORT).start()
     
     # Запускаем бота
-    application.run_polling()
+    run_application(application)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,286 @@
+import io
+import os
+import time
+import asyncio
+import logging
+import functools
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from metrics import Counter, Histogram
+from media_store import hash_file
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    # Без Pillow изображения сохраняются без изменений
+    Image = None
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Ограничения изображений (Twitter: до 4096x4096 пикселей и 5 МБ)
+IMAGE_MAX_DIMENSION = 4096  # Максимальная сторона изображения в пикселях
+IMAGE_MAX_BYTES = 5 * 1024 * 1024  # Максимальный размер изображения в байтах
+JPEG_QUALITY = 85  # Качество JPEG при перекодировании
+JPEG_MIN_QUALITY = 65  # Ниже этого качества изображение уменьшается, а не сжимается сильнее
+OPTIMIZER_WORKERS = 2  # Количество процессов оптимизации (0 - оптимизация отключена)
+REWRITTEN_FORMATS = ("jpeg", "png")  # Форматы, которые всегда приводятся к ограничениям (GIF и WebP бывают анимированными)
+
+# Метаданные, которые не должны попасть в социальную сеть (EXIF с геопозицией, XMP, комментарии)
+METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+
+MEDIA_OPTIMIZED = Counter(
+    "media_optimized",
+    "Изображения, прошедшие оптимизацию перед сохранением, по результату",
+    ("outcome",)
+)
+MEDIA_OPTIMIZE_SECONDS = Histogram(
+    "media_optimize_seconds",
+    "Длительность оптимизации изображения (хэширование и перекодирование)"
+)
+MEDIA_OPTIMIZE_SAVED_BYTES = Counter(
+    "media_optimize_saved_bytes",
+    "Байты, на которые оптимизация уменьшила изображения"
+)
+
+def _encode(image, fmt: str, quality: int, icc_profile: Optional[bytes]) -> bytes:
+    """Кодирование изображения в JPEG или PNG без метаданных."""
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True, icc_profile=icc_profile)
+    else:
+        image.save(buffer, "PNG", optimize=True, icc_profile=icc_profile)
+    return buffer.getvalue()
+
+def optimize_image(src_path: str, dst_stem: str, max_dimension: int = IMAGE_MAX_DIMENSION,
+                   max_bytes: int = IMAGE_MAX_BYTES, quality: int = JPEG_QUALITY) -> Optional[str]:
+    """
+    Уменьшение изображения до max_dimension, перекодирование и удаление метаданных.
+    Выполняется в дочернем процессе MediaOptimizer.
+    
+    Изображения без прозрачности сохраняются в JPEG, с прозрачностью - в PNG; для PNG без
+    прозрачности (снимков экрана) выбирается меньший из двух форматов. Если результат больше
+    max_bytes, сначала снижается качество JPEG, затем изображение уменьшается.
+    
+    Args:
+        src_path (str): Путь к исходному изображению
+        dst_stem (str): Путь к результату без расширения (расширение выбирается по формату)
+        max_dimension (int): Максимальная сторона в пикселях
+        max_bytes (int): Максимальный размер файла в байтах
+        quality (int): Качество JPEG
+    
+    Returns:
+        Optional[str]: Путь к результату или None, если исходный файл лучше оставить как есть
+            (анимация или перекодирование не уменьшило файл без метаданных)
+    """
+    with Image.open(src_path) as original:
+        if getattr(original, "is_animated", False):
+            return None
+        
+        had_metadata = any(key in original.info for key in METADATA_KEYS) or bool(getattr(original, "text", None))
+        # Цветовой профиль не содержит личных данных и нужен для правильных цветов
+        icc_profile = original.info.get("icc_profile")
+        has_alpha = original.mode in ("RGBA", "LA", "PA") or "transparency" in original.info
+        
+        # Поворот по EXIF применяется до удаления метаданных
+        image = ImageOps.exif_transpose(original)
+        resized = max(image.size) > max_dimension
+        if resized:
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        
+        if has_alpha:
+            formats = ("PNG",)
+        elif original.format == "PNG":
+            # Снимки экрана с однотонными областями часто меньше в PNG, чем в JPEG
+            formats = ("JPEG", "PNG")
+        else:
+            formats = ("JPEG",)
+        
+        while True:
+            data, fmt = min(
+                ((_encode(image, fmt, quality, icc_profile), fmt) for fmt in formats),
+                key=lambda candidate: len(candidate[0])
+            )
+            if len(data) <= max_bytes:
+                break
+            if "JPEG" in formats and quality > JPEG_MIN_QUALITY:
+                quality = max(JPEG_MIN_QUALITY, quality - 10)
+                continue
+            # Сжатие больше не помогает - уменьшаем изображение
+            image = image.resize((max(1, image.width * 3 // 4), max(1, image.height * 3 // 4)), Image.LANCZOS)
+            resized = True
+    
+    if not resized and not had_metadata and len(data) >= os.path.getsize(src_path):
+        return None
+    
+    dst_path = dst_stem + (".png" if fmt == "PNG" else ".jpg")
+    with open(dst_path, "wb") as f:
+        f.write(data)
+    return dst_path
+
+def optimize_and_hash(src_path: str, dst_stem: str, max_dimension: int, max_bytes: int,
+                      quality: int) -> Optional[Tuple[str, str, int]]:
+    """
+    Оптимизация изображения (см. optimize_image) и хэширование результата в том же
+    дочернем процессе, чтобы хранилище не читало файл повторно.
+    
+    Returns:
+        Optional[Tuple[str, str, int]]: Путь к результату, хэш его содержимого и размер
+            или None, если исходный файл лучше оставить как есть
+    """
+    dst_path = optimize_image(src_path, dst_stem, max_dimension, max_bytes, quality)
+    if dst_path is None:
+        return None
+    return (dst_path,) + hash_file(dst_path)
+
+class MediaOptimizer:
+    """
+    Подготовка изображений к загрузке в социальные сети перед сохранением в хранилище.
+    
+    Хэширование и перекодирование выполняются в пуле процессов, поэтому не занимают GIL
+    и цикл событий; хранилище получает уже вычисленный хэш. Результат запоминается по
+    хэшу исходного содержимого: повторно присланное изображение не обрабатывается, а
+    сразу получает сохраненный вариант.
+    """
+    
+    def __init__(self, db_manager, max_workers: int = OPTIMIZER_WORKERS, max_dimension: int = IMAGE_MAX_DIMENSION,
+                 max_bytes: int = IMAGE_MAX_BYTES, quality: int = JPEG_QUALITY):
+        """
+        Инициализация.
+        
+        Args:
+            db_manager: Менеджер базы данных (с хранилищем медиафайлов media_store)
+            max_workers (int): Количество процессов оптимизации (0 - оптимизация отключена)
+            max_dimension (int): Максимальная сторона изображения в пикселях
+            max_bytes (int): Максимальный размер изображения в байтах
+            quality (int): Качество JPEG
+        """
+        self.db_manager = db_manager
+        self.media_store = db_manager.media_store
+        self.max_workers = max_workers
+        self.max_dimension = max_dimension
+        self.max_bytes = max_bytes
+        self.quality = quality
+        # Параметры входят в ключ кэша: после их изменения изображения обрабатываются заново
+        self.profile = f"{max_dimension}:{max_bytes}:{quality}"
+        self.executor = None
+        
+        if Image is None and max_workers > 0:
+            logger.warning("Pillow не установлен, изображения сохраняются без оптимизации")
+    
+    @property
+    def enabled(self) -> bool:
+        """Доступна ли оптимизация изображений."""
+        return Image is not None and self.max_workers > 0
+    
+    def rewrites(self, fmt: Optional[str]) -> bool:
+        """
+        Приводит ли оптимизатор изображения этого формата к ограничениям размера и разрешения.
+        Анимации и форматы, которые Pillow не открывает, сохраняются без изменений.
+        
+        Args:
+            fmt (Optional[str]): Формат изображения (см. media_preflight.MIME_FORMATS)
+        
+        Returns:
+            bool: True, если размер и разрешение исходного файла проверять не нужно
+        """
+        return self.enabled and fmt in REWRITTEN_FORMATS
+    
+    def _executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Пул процессов, создаваемый при первой оптимизации."""
+        if self.executor is None:
+            # spawn: в родительском процессе работают потоки записи и соединения SQLite,
+            # копировать их блокировки при fork небезопасно
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.executor
+    
+    async def store(self, src_path: str, media_type: str, telegram_file_unique_id: Optional[str] = None) -> str:
+        """
+        Оптимизация изображения и помещение результата в хранилище (см. MediaStore.put_file).
+        Видео и файлы, которые не удалось обработать, сохраняются без изменений.
+        
+        Args:
+            src_path (str): Путь к скачанному файлу (перемещается или удаляется)
+            media_type (str): Тип медиафайла ('photo' или 'video')
+            telegram_file_unique_id (Optional[str]): Уникальный ID файла Telegram
+        
+        Returns:
+            str: Путь к файлу в хранилище
+        """
+        if media_type != "photo" or not self.enabled:
+            return await self.media_store.put_file_async(src_path, telegram_file_unique_id)
+        
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            source_hash, source_size = await loop.run_in_executor(self._executor(), hash_file, src_path)
+            
+            # Это изображение уже обрабатывалось - используем сохраненный вариант
+            variant = await loop.run_in_executor(
+                None, self.db_manager.get_media_variant, source_hash, self.profile
+            )
+            if variant and os.path.exists(variant[1]):
+                content_hash, stored_path = variant
+                os.remove(src_path)
+                if telegram_file_unique_id:
+                    await self.db_manager.add_media_alias_async(telegram_file_unique_id, content_hash)
+                MEDIA_OPTIMIZED.inc("cached")
+                return stored_path
+            
+            optimized = await loop.run_in_executor(
+                self._executor(),
+                functools.partial(
+                    optimize_and_hash,
+                    src_path,
+                    os.path.splitext(src_path)[0] + "_optimized",
+                    self.max_dimension,
+                    self.max_bytes,
+                    self.quality
+                )
+            )
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # Процесс пула завершился аварийно - при следующем вызове пул создается заново
+                self.executor = None
+            logger.warning(f"Не удалось оптимизировать изображение {src_path}: {e}")
+            MEDIA_OPTIMIZED.inc("error")
+            return await self.media_store.put_file_async(src_path, telegram_file_unique_id)
+        MEDIA_OPTIMIZE_SECONDS.observe(time.perf_counter() - start)
+        
+        # Хэши вычислены в пуле процессов - хранилище не читает файл повторно
+        if optimized is None:
+            MEDIA_OPTIMIZED.inc("unchanged")
+            content_hash = source_hash
+            stored_path = await self.media_store.put_file_async(
+                src_path, telegram_file_unique_id, source_hash, source_size
+            )
+        else:
+            optimized_path, content_hash, optimized_size = optimized
+            logger.info(f"Изображение оптимизировано: {source_size} -> {optimized_size} байт")
+            MEDIA_OPTIMIZED.inc("optimized")
+            MEDIA_OPTIMIZE_SAVED_BYTES.inc(amount=max(0, source_size - optimized_size))
+            os.remove(src_path)
+            stored_path = await self.media_store.put_file_async(
+                optimized_path, telegram_file_unique_id, content_hash, optimized_size
+            )
+        
+        await self.db_manager.add_media_variant_async(source_hash, self.profile, content_hash)
+        return stored_path
+    
+    def close(self) -> None:
+        """Остановка пула процессов."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,343 @@
+import os
+import mmap
+import struct
+import logging
+from typing import Dict, Any, Optional, Tuple, Iterator
+
+from metrics import Counter
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"  # Первые 8 байт любого PNG
+MP4_CONTAINER_BOXES = (b"moov", b"trak", b"mdia", b"minf", b"stbl")  # Боксы, внутри которых ищутся заголовки
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}  # Маркеры начала кадра с размерами
+
+# Форматы по MIME-типу файла Telegram (до скачивания)
+MIME_FORMATS = {
+    "image/jpeg": "jpeg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "video/mp4": "mp4",
+    "video/quicktime": "mov",
+    "video/webm": "webm",
+    "video/x-matroska": "mkv",
+    "video/x-msvideo": "avi",
+}
+
+# Названия кодеков по коду формата из бокса stsd
+CODEC_NAMES = {
+    "avc1": "H.264",
+    "avc3": "H.264",
+    "hvc1": "H.265 (HEVC)",
+    "hev1": "H.265 (HEVC)",
+    "av01": "AV1",
+    "vp09": "VP9",
+    "mp4v": "MPEG-4 Part 2",
+    "mp4a": "AAC",
+    "Opus": "Opus",
+    "ac-3": "AC-3",
+    "ec-3": "E-AC-3",
+}
+
+MEDIA_PREFLIGHT_REJECTED = Counter(
+    "media_preflight_rejected",
+    "Медиафайлы, отклоненные до загрузки в социальную сеть, по причине",
+    ("reason",)
+)
+
+class MediaLimits:
+    """Ограничения платформы для одного типа медиафайлов. None - ограничения нет."""
+    
+    __slots__ = (
+        "max_bytes", "max_width", "max_height", "min_duration", "max_duration",
+        "formats", "video_codecs", "audio_codecs"
+    )
+    
+    def __init__(self, max_bytes: Optional[int] = None, max_width: Optional[int] = None,
+                 max_height: Optional[int] = None, min_duration: Optional[float] = None,
+                 max_duration: Optional[float] = None, formats: Optional[Tuple[str, ...]] = None,
+                 video_codecs: Optional[Tuple[str, ...]] = None, audio_codecs: Optional[Tuple[str, ...]] = None):
+        """
+        Инициализация ограничений.
+        
+        Args:
+            max_bytes (Optional[int]): Максимальный размер файла в байтах
+            max_width (Optional[int]): Максимальная ширина в пикселях
+            max_height (Optional[int]): Максимальная высота в пикселях
+            min_duration (Optional[float]): Минимальная длительность видео в секундах
+            max_duration (Optional[float]): Максимальная длительность видео в секундах
+            formats (Optional[Tuple[str, ...]]): Допустимые форматы (jpeg, png, gif, webp, mp4, mov)
+            video_codecs (Optional[Tuple[str, ...]]): Допустимые коды видеокодеков из бокса stsd
+            audio_codecs (Optional[Tuple[str, ...]]): Допустимые коды аудиокодеков из бокса stsd
+        """
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.max_height = max_height
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.formats = formats
+        self.video_codecs = video_codecs
+        self.audio_codecs = audio_codecs
+
+def _codec_names(codecs: Tuple[str, ...]) -> str:
+    """Названия кодеков через запятую без повторов."""
+    return ", ".join(dict.fromkeys(CODEC_NAMES.get(codec, codec) for codec in codecs))
+
+def _format_size(size: int) -> str:
+    """Размер файла в мегабайтах для сообщения пользователю."""
+    return f"{size / (1024 * 1024):.1f} МБ"
+
+def check_limits(info: Dict[str, Any], limits: MediaLimits) -> Optional[str]:
+    """
+    Проверка описания медиафайла по ограничениям платформы. Неизвестные значения
+    (None, например, кодек до скачивания файла) не проверяются.
+    
+    Args:
+        info (Dict[str, Any]): Описание файла (см. probe_media и telegram_media_info)
+        limits (MediaLimits): Ограничения платформы
+    
+    Returns:
+        Optional[str]: Описание первого нарушения или None, если файл подходит
+    """
+    fmt = info.get("format")
+    size = info.get("size")
+    width = info.get("width")
+    height = info.get("height")
+    duration = info.get("duration")
+    video_codec = info.get("video_codec")
+    audio_codec = info.get("audio_codec")
+    
+    if fmt == "unknown":
+        MEDIA_PREFLIGHT_REJECTED.inc("format")
+        return "не удалось распознать формат файла"
+    if fmt is not None and limits.formats is not None and fmt not in limits.formats:
+        MEDIA_PREFLIGHT_REJECTED.inc("format")
+        return f"формат {fmt.upper()} не поддерживается (допустимо: {', '.join(f.upper() for f in limits.formats)})"
+    if size is not None and limits.max_bytes is not None and size > limits.max_bytes:
+        MEDIA_PREFLIGHT_REJECTED.inc("size")
+        return f"файл слишком большой: {_format_size(size)} (максимум {_format_size(limits.max_bytes)})"
+    # Ограничение разрешения не зависит от ориентации: вертикальное видео 1080x1920
+    # сравнивается с 1920x1200 по длинной и короткой стороне
+    if width and height and limits.max_width is not None and limits.max_height is not None and (
+        max(width, height) > max(limits.max_width, limits.max_height)
+        or min(width, height) > min(limits.max_width, limits.max_height)
+    ):
+        MEDIA_PREFLIGHT_REJECTED.inc("resolution")
+        return f"разрешение {width}x{height} больше допустимого {limits.max_width}x{limits.max_height}"
+    if duration:
+        if limits.max_duration is not None and duration > limits.max_duration:
+            MEDIA_PREFLIGHT_REJECTED.inc("duration")
+            return f"видео слишком длинное: {duration:.1f} с (максимум {limits.max_duration:g} с)"
+        if limits.min_duration is not None and duration < limits.min_duration:
+            MEDIA_PREFLIGHT_REJECTED.inc("duration")
+            return f"видео слишком короткое: {duration:.1f} с (минимум {limits.min_duration:g} с)"
+    if video_codec is not None and limits.video_codecs is not None and video_codec not in limits.video_codecs:
+        MEDIA_PREFLIGHT_REJECTED.inc("codec")
+        return (
+            f"видеокодек {CODEC_NAMES.get(video_codec, video_codec)} не поддерживается "
+            f"(допустимо: {_codec_names(limits.video_codecs)})"
+        )
+    if audio_codec is not None and limits.audio_codecs is not None and audio_codec not in limits.audio_codecs:
+        MEDIA_PREFLIGHT_REJECTED.inc("codec")
+        return (
+            f"аудиокодек {CODEC_NAMES.get(audio_codec, audio_codec)} не поддерживается "
+            f"(допустимо: {_codec_names(limits.audio_codecs)})"
+        )
+    return None
+
+def telegram_media_info(mime_type: Optional[str], size: Optional[int] = None, width: Optional[int] = None,
+                        height: Optional[int] = None, duration: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Описание медиафайла по метаданным Telegram, без скачивания файла.
+    
+    Args:
+        mime_type (Optional[str]): MIME-тип файла
+        size (Optional[int]): Размер файла в байтах
+        width (Optional[int]): Ширина в пикселях
+        height (Optional[int]): Высота в пикселях
+        duration (Optional[float]): Длительность видео в секундах
+    
+    Returns:
+        Dict[str, Any]: Описание файла для check_limits (неизвестный MIME-тип - формат None)
+    """
+    return {
+        "format": MIME_FORMATS.get(mime_type),
+        "size": size,
+        "width": width,
+        "height": height,
+        "duration": duration,
+    }
+
+def _boxes(data, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    Перебор боксов MP4/MOV в диапазоне [start, end) без чтения их содержимого.
+    
+    Yields:
+        Tuple[bytes, int, int]: Тип бокса, начало содержимого и конец бокса
+    """
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, start)
+        header = 8
+        if size == 1:
+            # 64-битный размер (большие боксы mdat)
+            size = struct.unpack_from(">Q", data, start + 8)[0]
+            header = 16
+        elif size == 0:
+            # Бокс продолжается до конца файла
+            size = end - start
+        if size < header or start + size > end:
+            raise ValueError(f"Некорректный размер бокса {box_type!r}")
+        yield box_type, start + header, start + size
+        start += size
+
+def _probe_track(data, start: int, end: int, info: Dict[str, Any]) -> None:
+    """Кодек и размеры дорожки trak (видео или звук)."""
+    handler = None
+    codec = None
+    width = height = 0
+    
+    for box_type, payload, box_end in _boxes(data, start, end):
+        if box_type == b"tkhd":
+            # Ширина и высота - числа с фиксированной точкой 16.16 в конце бокса
+            offset = 88 if data[payload] == 1 else 76
+            width, height = struct.unpack_from(">II", data, payload + offset)
+            width >>= 16
+            height >>= 16
+        elif box_type in MP4_CONTAINER_BOXES:
+            # mdia/minf/stbl: ищем hdlr и stsd внутри без рекурсии по всем боксам
+            stack = [(payload, box_end)]
+            while stack:
+                inner_start, inner_end = stack.pop()
+                for inner_type, inner_payload, inner_box_end in _boxes(data, inner_start, inner_end):
+                    if inner_type == b"hdlr":
+                        handler = bytes(data[inner_payload + 8:inner_payload + 12])
+                    elif inner_type == b"stsd":
+                        # Первая запись описания: размер (4 байта) и код формата (4 байта)
+                        codec = bytes(data[inner_payload + 12:inner_payload + 16]).decode("latin-1")
+                    elif inner_type in MP4_CONTAINER_BOXES:
+                        stack.append((inner_payload, inner_box_end))
+    
+    if handler == b"vide" and info["video_codec"] is None:
+        info["video_codec"] = codec
+        info["width"] = width or None
+        info["height"] = height or None
+    elif handler == b"soun" and info["audio_codec"] is None:
+        info["audio_codec"] = codec
+
+def _probe_mp4(data) -> Dict[str, Any]:
+    """Формат, длительность, разрешение и кодеки MP4/MOV по заголовкам боксов."""
+    info = {"format": "mp4", "duration": None, "width": None, "height": None, "video_codec": None, "audio_codec": None}
+    
+    for box_type, payload, box_end in _boxes(data, 0, len(data)):
+        if box_type == b"ftyp":
+            if data[payload:payload + 4] == b"qt  ":
+                info["format"] = "mov"
+        elif box_type == b"moov":
+            for inner_type, inner_payload, inner_end in _boxes(data, payload, box_end):
+                if inner_type == b"mvhd":
+                    if data[inner_payload] == 1:
+                        timescale, duration = struct.unpack_from(">IQ", data, inner_payload + 20)
+                    else:
+                        timescale, duration = struct.unpack_from(">II", data, inner_payload + 12)
+                    # Фрагментированные MP4 хранят длительность во фрагментах (здесь 0)
+                    if timescale and duration:
+                        info["duration"] = duration / timescale
+                elif inner_type == b"trak":
+                    _probe_track(data, inner_payload, inner_end, info)
+            # Содержимое mdat после moov не нужно
+            break
+    return info
+
+def _probe_jpeg(data) -> Dict[str, Any]:
+    """Размеры JPEG из маркера начала кадра (SOF)."""
+    pos = 2
+    end = len(data)
+    while pos + 4 <= end:
+        if data[pos] != 0xFF:
+            raise ValueError("Некорректный маркер JPEG")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Заполняющий байт перед маркером
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Маркеры без длины
+            pos += 2
+            continue
+        length = struct.unpack_from(">H", data, pos + 2)[0]
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack_from(">HH", data, pos + 5)
+            return {"format": "jpeg", "width": width, "height": height}
+        if marker == 0xDA:
+            # Начало сжатых данных, а кадр так и не описан
+            break
+        pos += 2 + length
+    raise ValueError("В JPEG не найден маркер начала кадра")
+
+def _probe_webp(data) -> Dict[str, Any]:
+    """Размеры WebP из первого фрагмента (VP8X, VP8 или VP8L)."""
+    chunk = data[12:16]
+    if chunk == b"VP8X":
+        # Ширина и высота минус один, по 24 бита
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
+    elif chunk == b"VP8 ":
+        width, height = struct.unpack_from("<HH", data, 26)
+        width &= 0x3FFF
+        height &= 0x3FFF
+    elif chunk == b"VP8L":
+        bits = struct.unpack_from("<I", data, 21)[0]
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    else:
+        raise ValueError(f"Неизвестный фрагмент WebP {bytes(chunk)!r}")
+    return {"format": "webp", "width": width, "height": height}
+
+def probe_media(path: str) -> Dict[str, Any]:
+    """
+    Определение формата, размеров, длительности и кодеков медиафайла без декодирования.
+    
+    Файл отображается в память через mmap, и читаются только заголовки: JPEG/PNG/GIF/WebP
+    и боксы MP4/MOV (moov/mvhd, trak/tkhd, hdlr, stsd). Содержимое кадров не затрагивается,
+    поэтому проверка занимает микросекунды независимо от размера файла.
+    
+    Args:
+        path (str): Путь к медиафайлу
+    
+    Returns:
+        Dict[str, Any]: Описание файла с ключами format ('unknown', если формат не распознан),
+            size, width, height, duration, video_codec и audio_codec (None - неизвестно)
+    """
+    info = {"format": "unknown", "width": None, "height": None, "duration": None,
+            "video_codec": None, "audio_codec": None}
+    size = os.path.getsize(path)
+    info["size"] = size
+    if size == 0:
+        return info
+    
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                if data[:3] == b"\xff\xd8\xff":
+                    info.update(_probe_jpeg(data))
+                elif data[:8] == PNG_SIGNATURE and data[12:16] == b"IHDR":
+                    width, height = struct.unpack_from(">II", data, 16)
+                    info.update(format="png", width=width, height=height)
+                elif data[:6] in (b"GIF87a", b"GIF89a"):
+                    width, height = struct.unpack_from("<HH", data, 6)
+                    info.update(format="gif", width=width, height=height)
+                elif data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+                    info.update(_probe_webp(data))
+                elif data[4:8] == b"ftyp":
+                    info.update(_probe_mp4(data))
+            except (ValueError, struct.error, IndexError) as e:
+                # Обрезанный или поврежденный файл
+                logger.warning(f"Не удалось разобрать заголовки медиафайла {path}: {e}")
+                info["format"] = "unknown"
+    return info
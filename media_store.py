@@ -0,0 +1,237 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, Optional, Tuple
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Размер блока при вычислении хэша файла
+HASH_BLOCK_SIZE = 1024 * 1024
+# Время жизни media_id, если социальная сеть его не сообщила (Twitter - 24 часа)
+DEFAULT_MEDIA_ID_TTL = 24 * 60 * 60
+# Запас до истечения media_id, чтобы не публиковать с почти истекшим ID
+MEDIA_ID_EXPIRY_MARGIN = 10 * 60
+
+def hash_file(path: str) -> Tuple[str, int]:
+    """
+    Вычисление хэша SHA-256 файла блоками.
+    
+    Args:
+        path (str): Путь к файлу
+    
+    Returns:
+        Tuple[str, int]: Хэш содержимого и размер файла в байтах
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            hasher.update(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+async def hashing_stream(chunks: AsyncIterator[bytes], hasher) -> AsyncIterator[bytes]:
+    """
+    Передача потока без изменений с попутным вычислением хэша.
+    
+    Args:
+        chunks (AsyncIterator[bytes]): Исходный поток
+        hasher: Объект hashlib, обновляемый каждым блоком
+    
+    Yields:
+        bytes: Очередной блок исходного потока
+    """
+    async for block in chunks:
+        hasher.update(block)
+        yield block
+
+class MediaStore:
+    """
+    Контентно-адресуемое хранилище медиафайлов.
+    
+    Файл хранится один раз на уникальное содержимое по пути root/<2 символа хэша>/<хэш>.<расширение>.
+    Ссылками на файл считаются записи posts, scheduled_posts и conversation_drafts с этим media_path.
+    """
+    
+    def __init__(self, db_manager, root: str = "media"):
+        """
+        Инициализация хранилища.
+        
+        Args:
+            db_manager: Менеджер базы данных
+            root (str): Корневой каталог хранилища
+        """
+        self.db_manager = db_manager
+        self.root = root
+    
+    def _path_for(self, content_hash: str, extension: str) -> str:
+        """Путь к файлу хранилища для заданного хэша содержимого."""
+        return os.path.join(self.root, content_hash[:2], content_hash + extension)
+    
+    def temp_path(self, name: str) -> str:
+        """
+        Путь для временного файла, который затем будет помещен в хранилище через put_file.
+        
+        Args:
+            name (str): Имя файла
+        
+        Returns:
+            str: Путь во временном каталоге хранилища
+        """
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, name)
+    
+    @staticmethod
+    def _move_into_place(src_path: str, stored_path: str) -> None:
+        """Перемещение файла по пути хранилища или удаление, если такое содержимое уже сохранено."""
+        if os.path.exists(stored_path):
+            # Такое содержимое уже сохранено - копия не нужна
+            os.remove(src_path)
+            logger.info(f"Медиафайл уже есть в хранилище: {stored_path}")
+        else:
+            os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+            os.replace(src_path, stored_path)
+    
+    def put_file(self, src_path: str, telegram_file_unique_id: Optional[str] = None,
+                 content_hash: Optional[str] = None, size: Optional[int] = None) -> str:
+        """
+        Помещение файла в хранилище. Исходный файл перемещается или удаляется, если
+        такое содержимое уже есть в хранилище.
+        
+        Args:
+            src_path (str): Путь к исходному файлу
+            telegram_file_unique_id (Optional[str]): Уникальный ID файла Telegram
+            content_hash (Optional[str]): Уже вычисленный хэш содержимого (вместе с size);
+                если не задан, файл хэшируется
+            size (Optional[int]): Размер файла в байтах
+        
+        Returns:
+            str: Путь к файлу в хранилище
+        """
+        if content_hash is None:
+            content_hash, size = hash_file(src_path)
+        path = self._path_for(content_hash, os.path.splitext(src_path)[1])
+        
+        stored_path = self.db_manager.add_media_file(content_hash, path, size, telegram_file_unique_id)
+        self._move_into_place(src_path, stored_path)
+        return stored_path
+    
+    async def put_file_async(self, src_path: str, telegram_file_unique_id: Optional[str] = None,
+                             content_hash: Optional[str] = None, size: Optional[int] = None) -> str:
+        """
+        Вариант put_file для цикла событий: хэш (если не задан) вычисляется в пуле потоков,
+        а регистрация файла ожидается без блокировки цикла.
+        """
+        if content_hash is None:
+            content_hash, size = await asyncio.get_running_loop().run_in_executor(None, hash_file, src_path)
+        path = self._path_for(content_hash, os.path.splitext(src_path)[1])
+        
+        stored_path = await self.db_manager.add_media_file_async(content_hash, path, size, telegram_file_unique_id)
+        self._move_into_place(src_path, stored_path)
+        return stored_path
+    
+    def find_by_telegram_id(self, telegram_file_unique_id: str) -> Optional[str]:
+        """
+        Поиск уже сохраненного файла Telegram, чтобы не скачивать его повторно.
+        
+        Args:
+            telegram_file_unique_id (str): Уникальный ID файла Telegram
+        
+        Returns:
+            Optional[str]: Путь к файлу в хранилище или None
+        """
+        content_hash = self.db_manager.get_media_alias(telegram_file_unique_id)
+        if content_hash is None:
+            return None
+        path = self.db_manager.get_media_file(content_hash)
+        if path and os.path.exists(path):
+            return path
+        return None
+    
+    def release(self, media_path: str) -> None:
+        """
+        Освобождение ссылки на медиафайл: файл удаляется, когда на него больше
+        не ссылается ни один пост или черновик. Файлы вне хранилища (старого формата)
+        удаляются по тому же правилу. Черновик, освобождающий файл, должен быть
+        сохранен без него раньше: запись черновика стоит в очереди потока записи
+        перед проверкой ссылок.
+        
+        Args:
+            media_path (str): Путь к медиафайлу
+        """
+        if self.db_manager.delete_media_file_if_unused(media_path):
+            self.remove_file(media_path)
+    
+    async def release_async(self, media_path: str) -> None:
+        """Вариант release для цикла событий."""
+        if await self.db_manager.delete_media_file_if_unused_async(media_path):
+            self.remove_file(media_path)
+    
+    def remove_file(self, media_path: str) -> None:
+        """
+        Удаление с диска медиафайла, на который больше нет ссылок (запись о нем
+        уже удалена из базы данных).
+        
+        Args:
+            media_path (str): Путь к медиафайлу
+        """
+        if os.path.exists(media_path):
+            os.remove(media_path)
+            logger.info(f"Медиафайл удален: {media_path}")
+    
+    def get_cached_media_id(self, platform: str, media_path: Optional[str] = None,
+                            content_hash: Optional[str] = None) -> Optional[str]:
+        """
+        Получение действующего media_id для файла хранилища.
+        
+        Args:
+            platform (str): Название платформы
+            media_path (Optional[str]): Путь к файлу хранилища
+            content_hash (Optional[str]): Хэш содержимого (если путь неизвестен)
+        
+        Returns:
+            Optional[str]: media_id или None
+        """
+        if content_hash is None and media_path:
+            content_hash = self.db_manager.get_media_hash(media_path)
+        if content_hash is None:
+            return None
+        return self.db_manager.get_cached_media_id(content_hash, platform, time.time())
+    
+    def cache_media_id(self, platform: str, media_id: str, expires_after_secs: Optional[int],
+                       media_path: Optional[str] = None, content_hash: Optional[str] = None) -> None:
+        """
+        Сохранение media_id загруженного файла до истечения его срока действия.
+        
+        Args:
+            platform (str): Название платформы
+            media_id (str): ID медиафайла в социальной сети
+            expires_after_secs (Optional[int]): Время жизни media_id в секундах
+            media_path (Optional[str]): Путь к файлу хранилища
+            content_hash (Optional[str]): Хэш содержимого (если путь неизвестен)
+        """
+        if content_hash is None and media_path:
+            content_hash = self.db_manager.get_media_hash(media_path)
+        if content_hash is None:
+            return
+        ttl = (expires_after_secs or DEFAULT_MEDIA_ID_TTL) - MEDIA_ID_EXPIRY_MARGIN
+        if ttl > 0:
+            self.db_manager.cache_media_id(content_hash, platform, media_id, time.time() + ttl)
+    
+    async def cache_media_id_async(self, platform: str, media_id: str, expires_after_secs: Optional[int],
+                                   content_hash: str) -> None:
+        """Вариант cache_media_id для цикла событий (хэш содержимого известен)."""
+        ttl = (expires_after_secs or DEFAULT_MEDIA_ID_TTL) - MEDIA_ID_EXPIRY_MARGIN
+        if ttl > 0:
+            await self.db_manager.cache_media_id_async(content_hash, platform, media_id, time.time() + ttl)
@@ -0,0 +1,60 @@
+import logging
+from typing import AsyncIterator, Optional
+
+import httpx
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Размер блока, читаемого из ответа Telegram за один раз
+READ_CHUNK_SIZE = 256 * 1024
+# Таймауты скачивания файла из Telegram в секундах
+DOWNLOAD_TIMEOUT = httpx.Timeout(30.0, read=60.0)
+
+async def iter_telegram_file(file, chunk_size: int = READ_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Потоковое чтение файла Telegram без сохранения на диск.
+    
+    Args:
+        file (telegram.File): Файл, полученный через bot.get_file
+        chunk_size (int): Размер читаемого блока в байтах
+    
+    Yields:
+        bytes: Очередной блок содержимого файла
+    """
+    file_path = file.file_path
+    
+    # При работе с локальным Bot API сервером file_path указывает на файл на диске
+    if not file_path.startswith(("http://", "https://")):
+        with open(file_path, "rb") as f:
+            while True:
+                block = f.read(chunk_size)
+                if not block:
+                    return
+                yield block
+    
+    async with httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT) as client:
+        async with client.stream("GET", file_path) as response:
+            response.raise_for_status()
+            async for block in response.aiter_bytes(chunk_size):
+                yield block
+
+def guess_mime_type(media_type: str, mime_type: Optional[str] = None) -> str:
+    """
+    Определение MIME-типа медиафайла из Telegram.
+    
+    Args:
+        media_type (str): Тип медиафайла ('photo' или 'video')
+        mime_type (Optional[str]): MIME-тип, переданный Telegram (для видео и документов)
+    
+    Returns:
+        str: MIME-тип для загрузки в социальную сеть
+    """
+    if mime_type:
+        return mime_type
+    # Фотографии Telegram всегда пережимает в JPEG
+    return "image/jpeg" if media_type == "photo" else "video/mp4"
@@ -0,0 +1,268 @@
+import os
+import mmap
+import time
+import asyncio
+import logging
+import mimetypes
+import concurrent.futures
+from typing import Dict, Any, Optional, Callable
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Параметры загрузки по частям (INIT/APPEND/FINALIZE/STATUS)
+CHUNK_SIZE = 4 * 1024 * 1024  # Размер одной части в байтах (Twitter принимает до 5 МБ)
+MAX_PARALLEL_CHUNKS = 2  # Количество частей, отправляемых одновременно
+MAX_CHUNK_RETRIES = 3  # Количество повторных попыток для одной части
+PROCESSING_TIMEOUT = 600  # Максимальное время ожидания обработки видео в секундах
+
+# Категории медиа Twitter для разных типов файлов
+MEDIA_CATEGORIES = {
+    "photo": "tweet_image",
+    "video": "tweet_video",
+    "gif": "tweet_gif",
+}
+
+class UploadError(Exception):
+    """Ошибка загрузки медиафайла по частям."""
+    
+    def __init__(self, message: str, retryable: bool = True):
+        """
+        Args:
+            message (str): Текст ошибки
+            retryable (bool): Может ли повторная загрузка завершиться успешно
+        """
+        super().__init__(message)
+        self.retryable = retryable
+
+class ChunkedUploader:
+    """Загрузка медиафайлов в Twitter по частям без чтения файла в память целиком."""
+    
+    def __init__(self, api, call: Callable[..., Any], chunk_size: int = CHUNK_SIZE,
+                 max_parallel: int = MAX_PARALLEL_CHUNKS, max_retries: int = MAX_CHUNK_RETRIES):
+        """
+        Инициализация загрузчика.
+        
+        Args:
+            api: Клиент tweepy.API (v1.1)
+            call (Callable[..., Any]): Функция вызова метода tweepy с ограничением частоты,
+                сигнатура call(endpoint, func, *args, **kwargs)
+            chunk_size (int): Размер одной части в байтах
+            max_parallel (int): Количество частей, отправляемых одновременно
+            max_retries (int): Количество повторных попыток для одной части
+        """
+        self.api = api
+        self.call = call
+        self.chunk_size = chunk_size
+        self.max_parallel = max_parallel
+        self.max_retries = max_retries
+    
+    def init(self, total_bytes: int, mime_type: str, media_category: str) -> str:
+        """
+        Команда INIT: регистрация загрузки.
+        
+        Args:
+            total_bytes (int): Размер файла в байтах
+            mime_type (str): MIME-тип файла
+            media_category (str): Категория медиа Twitter
+        
+        Returns:
+            str: ID медиафайла
+        """
+        media = self.call(
+            "media_upload",
+            self.api.chunked_upload_init,
+            total_bytes,
+            mime_type,
+            media_category=media_category
+        )
+        return str(media.media_id)
+    
+    def append(self, media_id: str, segment_index: int, data, deadline: Optional[float] = None) -> None:
+        """
+        Команда APPEND с повторными попытками: отправка одной части.
+        
+        Args:
+            media_id (str): ID медиафайла
+            segment_index (int): Порядковый номер части
+            data: Содержимое части (bytes или memoryview)
+            deadline (Optional[float]): Срок загрузки по time.monotonic; после него часть не отправляется
+        """
+        for attempt in range(1, self.max_retries + 1):
+            if deadline is not None and time.monotonic() > deadline:
+                raise UploadError(f"Превышено время загрузки медиафайла {media_id}")
+            try:
+                self.call("media_upload", self.api.chunked_upload_append, media_id, data, segment_index)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise UploadError(f"Не удалось загрузить часть {segment_index}: {e}") from e
+                logger.warning(
+                    f"Ошибка при загрузке части {segment_index} медиафайла {media_id} "
+                    f"(попытка {attempt}): {e}"
+                )
+                time.sleep(2 ** attempt)
+    
+    def finalize(self, media_id: str) -> Dict[str, Any]:
+        """
+        Команда FINALIZE: завершение загрузки.
+        
+        Args:
+            media_id (str): ID медиафайла
+        
+        Returns:
+            Dict[str, Any]: Результат с ключами media_id, expires_after_secs и processing_info
+        """
+        media = self.call("media_upload", self.api.chunked_upload_finalize, media_id)
+        return {
+            "media_id": media_id,
+            "expires_after_secs": getattr(media, "expires_after_secs", None),
+            "processing_info": getattr(media, "processing_info", None)
+        }
+    
+    def status(self, media_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Команда STATUS: получение состояния обработки медиафайла.
+        
+        Args:
+            media_id (str): ID медиафайла
+        
+        Returns:
+            Optional[Dict[str, Any]]: Словарь processing_info или None, если обработка не требуется
+        """
+        media = self.call("media_upload", self.api.get_media_upload_status, media_id)
+        return getattr(media, "processing_info", None)
+    
+    def _upload_segments(self, media_id: str, view: memoryview, deadline: Optional[float] = None) -> None:
+        """
+        Параллельная отправка частей буфера. Части, отправленные успешно, не повторяются.
+        
+        Args:
+            media_id (str): ID медиафайла
+            view (memoryview): Содержимое файла
+            deadline (Optional[float]): Срок загрузки по time.monotonic (см. append)
+        """
+        total = len(view)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            futures = {}
+            for segment_index, offset in enumerate(range(0, total, self.chunk_size)):
+                # Срез memoryview не копирует данные файла
+                chunk = view[offset:offset + self.chunk_size]
+                futures[executor.submit(self.append, media_id, segment_index, chunk, deadline)] = chunk
+            
+            errors = []
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except UploadError as e:
+                    errors.append(str(e))
+                finally:
+                    futures[future].release()
+        
+        if errors:
+            raise UploadError("; ".join(errors))
+    
+    def upload_buffer(self, data, mime_type: str, media_category: str) -> Dict[str, Any]:
+        """
+        Загрузка медиафайла из буфера в памяти (INIT/APPEND/FINALIZE).
+        
+        Args:
+            data: Содержимое файла (bytes, bytearray или memoryview)
+            mime_type (str): MIME-тип файла
+            media_category (str): Категория медиа Twitter
+        
+        Returns:
+            Dict[str, Any]: Результат FINALIZE (см. finalize)
+        """
+        with memoryview(data) as view:
+            media_id = self.init(len(view), mime_type, media_category)
+            self._upload_segments(media_id, view)
+        return self.finalize(media_id)
+    
+    def upload_file(self, media_path: str, media_category: str,
+                    mime_type: Optional[str] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Загрузка файла с диска по частям через mmap (INIT/APPEND/FINALIZE).
+        
+        Args:
+            media_path (str): Путь к медиафайлу
+            media_category (str): Категория медиа Twitter
+            mime_type (Optional[str]): MIME-тип файла, по умолчанию определяется по расширению
+            deadline (Optional[float]): Срок загрузки по time.monotonic: после него оставшиеся
+                части не отправляются, и поток не занят загрузкой, которую уже никто не ждет
+        
+        Returns:
+            Dict[str, Any]: Результат FINALIZE (см. finalize)
+        """
+        mime_type = mime_type or mimetypes.guess_type(media_path)[0] or "application/octet-stream"
+        total_bytes = os.path.getsize(media_path)
+        if total_bytes == 0:
+            raise UploadError(f"Пустой файл: {media_path}", retryable=False)
+        
+        with open(media_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    media_id = self.init(total_bytes, mime_type, media_category)
+                    self._upload_segments(media_id, view, deadline)
+        
+        logger.info(f"Медиафайл {media_path} загружен по частям, ID: {media_id}")
+        return self.finalize(media_id)
+    
+    @staticmethod
+    def _check_processing(media_id: str, processing_info: Optional[Dict[str, Any]]) -> Optional[float]:
+        """
+        Разбор состояния обработки медиафайла.
+        
+        Args:
+            media_id (str): ID медиафайла
+            processing_info (Optional[Dict[str, Any]]): Состояние обработки
+        
+        Returns:
+            Optional[float]: Пауза до следующей проверки в секундах или None, если обработка завершена
+        """
+        if not processing_info or processing_info.get("state") == "succeeded":
+            return None
+        if processing_info.get("state") == "failed":
+            error = processing_info.get("error", {}).get("message", "неизвестная ошибка")
+            raise UploadError(f"Twitter не смог обработать медиафайл {media_id}: {error}", retryable=False)
+        return processing_info.get("check_after_secs", 1)
+    
+    def wait_for_processing(self, media_id: str, processing_info: Optional[Dict[str, Any]]) -> None:
+        """
+        Синхронное ожидание окончания обработки медиафайла на стороне Twitter.
+        
+        Args:
+            media_id (str): ID медиафайла
+            processing_info (Optional[Dict[str, Any]]): Состояние обработки из FINALIZE
+        """
+        deadline = time.monotonic() + PROCESSING_TIMEOUT
+        delay = self._check_processing(media_id, processing_info)
+        while delay is not None:
+            if time.monotonic() + delay > deadline:
+                raise UploadError(f"Превышено время обработки медиафайла {media_id}")
+            time.sleep(delay)
+            delay = self._check_processing(media_id, self.status(media_id))
+    
+    async def wait_for_processing_async(self, media_id: str, processing_info: Optional[Dict[str, Any]],
+                                        executor: Optional[concurrent.futures.Executor] = None) -> None:
+        """
+        Асинхронное ожидание окончания обработки медиафайла без блокировки цикла событий.
+        
+        Args:
+            media_id (str): ID медиафайла
+            processing_info (Optional[Dict[str, Any]]): Состояние обработки из FINALIZE
+            executor (Optional[concurrent.futures.Executor]): Пул для запросов STATUS
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PROCESSING_TIMEOUT
+        delay = self._check_processing(media_id, processing_info)
+        while delay is not None:
+            if loop.time() + delay > deadline:
+                raise UploadError(f"Превышено время обработки медиафайла {media_id}")
+            await asyncio.sleep(delay)
+            info = await loop.run_in_executor(executor, self.status, media_id)
+            delay = self._check_processing(media_id, info)
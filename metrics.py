@@ -0,0 +1,346 @@
+import abc
+import time
+import bisect
+import asyncio
+import logging
+import functools
+import threading
+import http.server
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм по умолчанию в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Корзины задержки отправки запланированных постов в секундах
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class _ThreadShards:
+    """
+    Значения метрики, разделенные по потокам.
+    
+    Каждый поток пишет только в свой словарь, поэтому запись не требует блокировок
+    и не создает конкуренции между потоками. Блокировка берется один раз при первом
+    обращении потока и при сборе значений.
+    """
+    
+    def __init__(self):
+        """Инициализация."""
+        self._local = threading.local()
+        self._shards: List[Dict] = []
+        self._lock = threading.Lock()
+    
+    def get(self) -> Dict:
+        """Словарь значений текущего потока."""
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = {}
+            self._local.values = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+    
+    def snapshot(self) -> List[Dict]:
+        """Копии словарей всех потоков (значения завершившихся потоков сохраняются)."""
+        with self._lock:
+            shards = list(self._shards)
+        # dict.copy выполняется атомарно относительно записи из других потоков
+        return [shard.copy() for shard in shards]
+
+class Metric(abc.ABC):
+    """Базовый класс метрики с именованными метками."""
+    
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 registry: Optional["Registry"] = None):
+        """
+        Инициализация и регистрация метрики.
+        
+        Args:
+            name (str): Имя метрики
+            documentation (str): Описание для строки HELP
+            labelnames (Tuple[str, ...]): Имена меток; значения передаются позиционно в том же порядке
+            registry (Optional[Registry]): Реестр (по умолчанию REGISTRY)
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        (registry if registry is not None else REGISTRY).register(self)
+    
+    def _format_labels(self, values: Tuple, extra: str = "") -> str:
+        """Метки в формате Prometheus: {name="value",...}."""
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+    
+    @abc.abstractmethod
+    def collect(self) -> Iterator[str]:
+        """Строки значений метрики в текстовом формате Prometheus."""
+
+class Counter(Metric):
+    """Монотонно возрастающий счетчик."""
+    
+    kind = "counter"
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = _ThreadShards()
+    
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """
+        Увеличение счетчика.
+        
+        Args:
+            *labels (str): Значения меток
+            amount (float): Величина увеличения
+        """
+        shard = self._values.get()
+        shard[labels] = shard.get(labels, 0.0) + amount
+    
+    def collect(self) -> Iterator[str]:
+        totals: Dict[Tuple, float] = {}
+        for shard in self._values.snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0.0) + value
+        for labels, value in sorted(totals.items()):
+            yield f"{self.name}_total{self._format_labels(labels)} {_format_value(value)}"
+
+class Gauge(Metric):
+    """Текущее значение, вычисляемое функцией в момент сбора метрик."""
+    
+    kind = "gauge"
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+    
+    def set_function(self, function: Callable[[], float], *labels: str) -> None:
+        """
+        Установка функции, возвращающей текущее значение.
+        
+        Args:
+            function (Callable[[], float]): Функция без аргументов
+            *labels (str): Значения меток
+        """
+        self._functions[labels] = function
+    
+    def collect(self) -> Iterator[str]:
+        for labels, function in sorted(self._functions.items()):
+            try:
+                value = function()
+            except Exception as e:
+                logger.warning(f"Не удалось получить значение метрики {self.name}: {e}")
+                continue
+            yield f"{self.name}{self._format_labels(labels)} {_format_value(value)}"
+
+class Histogram(Metric):
+    """Гистограмма распределения значений (длительностей) по корзинам."""
+    
+    kind = "histogram"
+    
+    def __init__(self, *args, buckets: Tuple[float, ...] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values = _ThreadShards()
+    
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Учет одного значения.
+        
+        Args:
+            value (float): Наблюдаемое значение
+            *labels (str): Значения меток
+        """
+        shard = self._values.get()
+        counts = shard.get(labels)
+        if counts is None:
+            # Счетчики корзин, затем корзина +Inf и сумма значений
+            counts = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+    
+    def time(self, *labels: str) -> "_Timer":
+        """Контекстный менеджер, измеряющий длительность блока."""
+        return _Timer(self, labels)
+    
+    def collect(self) -> Iterator[str]:
+        totals: Dict[Tuple, List[float]] = {}
+        for shard in self._values.snapshot():
+            for labels, counts in shard.items():
+                total = totals.setdefault(labels, [0] * len(counts))
+                for index, value in enumerate(list(counts)):
+                    total[index] += value
+        for labels, total in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), total[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                le_label = f'le="{le}"'
+                yield f"{self.name}_bucket{self._format_labels(labels, le_label)} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(labels)} {_format_value(total[-1])}"
+            yield f"{self.name}_count{self._format_labels(labels)} {cumulative}"
+
+class _Timer:
+    """Измерение длительности блока with для Histogram.time."""
+    
+    __slots__ = ("histogram", "labels", "start")
+    
+    def __init__(self, histogram: Histogram, labels: Tuple):
+        self.histogram = histogram
+        self.labels = labels
+    
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+class Registry:
+    """Набор метрик процесса."""
+    
+    def __init__(self):
+        """Инициализация пустого реестра."""
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric: Metric) -> None:
+        """Добавление метрики в реестр."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+    
+    def render(self) -> str:
+        """
+        Все метрики в текстовом формате Prometheus.
+        
+        Returns:
+            str: Текст для ответа на запрос /metrics
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation, quotes=False)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+# Реестр метрик процесса по умолчанию
+REGISTRY = Registry()
+
+def _escape(value: str, quotes: bool = True) -> str:
+    """Экранирование значения метки (quotes=True) или описания метрики."""
+    value = value.replace("\\", "\\\\").replace("\n", "\\n")
+    return value.replace('"', '\\"') if quotes else value
+
+def _format_value(value: float) -> str:
+    """Число в формате Prometheus."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def timed_methods(histogram: Histogram, exclude: Tuple[str, ...] = ()) -> Callable[[type], type]:
+    """
+    Декоратор класса: длительность каждого публичного метода записывается в histogram
+    с меткой, равной имени метода.
+    
+    Args:
+        histogram (Histogram): Гистограмма с одной меткой (имя метода)
+        exclude (Tuple[str, ...]): Методы, которые не нужно измерять
+    
+    Returns:
+        Callable[[type], type]: Декоратор класса
+    """
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or name in exclude or not callable(method):
+                continue
+            setattr(cls, name, _timed(histogram, name, method))
+        return cls
+    return decorate
+
+def _timed(histogram: Histogram, label: str, method: Callable) -> Callable:
+    """Обертка метода с измерением длительности (у корутин - до завершения)."""
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, label)
+        return async_wrapper
+    
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start, label)
+    return wrapper
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """Обработчик запросов GET /metrics."""
+    
+    registry: Registry = REGISTRY
+    
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format: str, *args) -> None:
+        # Запросы сборщика метрик не пишутся в журнал
+        pass
+
+class MetricsServer:
+    """HTTP-сервер, отдающий метрики процесса по адресу /metrics в отдельном потоке."""
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 9100, registry: Registry = REGISTRY):
+        """
+        Инициализация сервера.
+        
+        Args:
+            host (str): Адрес, на котором принимаются соединения
+            port (int): Порт, на котором принимаются соединения
+            registry (Registry): Реестр метрик
+        """
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self._thread = None
+    
+    def start(self) -> None:
+        """Запуск сервера в потоке-демоне."""
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": self.registry})
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+        logger.info(f"Метрики доступны по адресу http://{self.host}:{self.port}/metrics")
+    
+    def stop(self) -> None:
+        """Остановка сервера."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
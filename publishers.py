@@ -0,0 +1,378 @@
+import abc
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Dict, Any, List, Optional
+from metrics import Histogram
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Длительность публикации и удаления через реестр (немедленные публикации бота)
+PUBLISHER_CALL_SECONDS = Histogram(
+    "publisher_call_seconds",
+    "Длительность вызовов публикаторов через реестр",
+    ("platform", "method", "outcome")
+)
+
+# Методы реестра, повтор которых после таймаута может создать второй пост
+NON_IDEMPOTENT_METHODS = ("publish", "post_with_staged_media")
+
+async def wait_for_outcome(future: "asyncio.Future", timeout: float, name: str) -> Dict[str, Any]:
+    """
+    Ожидание результата публикации, которую нельзя повторить вслепую.
+    
+    Поток пула нельзя прервать, поэтому по истечении таймаута запрос продолжает выполняться
+    и пост может появиться позже. Вместо ошибки, которую можно повторить, возвращается
+    результат с признаком outcome_unknown: ожидание future в ключе outcome дает
+    фактический результат публикации.
+    
+    Args:
+        future (asyncio.Future): Выполняющийся вызов публикатора
+        timeout (float): Время ожидания в секундах
+        name (str): Название платформы для сообщения об ошибке
+    
+    Returns:
+        Dict[str, Any]: Результат публикации или результат с ключами outcome_unknown и outcome
+    """
+    done, _ = await asyncio.wait({future}, timeout=timeout)
+    if done:
+        return future.result()
+    
+    logger.error(f"Превышено время ожидания ответа {name} ({timeout} с), результат публикации неизвестен")
+    
+    def log_outcome(late: "asyncio.Future") -> None:
+        # Запоздавший результат нужен, чтобы сверить ленту, если его никто не дождался
+        if not late.cancelled() and late.exception() is None:
+            logger.warning(f"Получен запоздавший результат публикации {name}: {late.result()}")
+    
+    future.add_done_callback(log_outcome)
+    return {
+        "success": False,
+        "error": f"{name} не ответил за {timeout} с, пост мог быть опубликован",
+        "retryable": False,
+        "outcome_unknown": True,
+        "outcome": future
+    }
+
+class Publisher(abc.ABC):
+    """
+    Базовый класс публикатора в социальную сеть.
+    
+    Методы синхронные и возвращают словарь результата с ключами success, post_id,
+    post_url и error (а при ошибке - retryable и retry_after, см. social_api.error_result).
+    """
+    
+    name = ""  # Идентификатор платформы, хранится в posts.platform
+    title = ""  # Название для пользователя
+    engagement_batch_size = 0  # Максимум постов в одном запросе get_engagement (0 - не поддерживается)
+    supports_media_staging = False  # Медиафайл можно загрузить заранее (stage_media) и опубликовать по ID
+    media_limits = {}  # Ограничения медиафайлов по типу (photo, video), см. media_preflight.MediaLimits
+    
+    @abc.abstractmethod
+    def post_text(self, text: str) -> Dict[str, Any]:
+        """Публикация текстового сообщения."""
+    
+    @abc.abstractmethod
+    def post_with_media(self, text: str, media_path: str, media_type: str) -> Dict[str, Any]:
+        """Публикация сообщения с медиафайлом."""
+    
+    def stage_media(self, media_path: str, media_type: str) -> Dict[str, Any]:
+        """
+        Загрузка медиафайла заранее, до времени публикации.
+        
+        Args:
+            media_path (str): Путь к медиафайлу
+            media_type (str): Тип медиафайла
+        
+        Returns:
+            Dict[str, Any]: Результат с ключами media_id и expires_after_secs
+                (время жизни media_id в секундах, None - неизвестно)
+        """
+        return {
+            "success": False,
+            "error": f"Предварительная загрузка для платформы {self.name} не поддерживается",
+            "retryable": False
+        }
+    
+    def post_with_staged_media(self, text: str, media_id: str) -> Dict[str, Any]:
+        """Публикация сообщения с медиафайлом, загруженным через stage_media."""
+        return {
+            "success": False,
+            "error": f"Предварительная загрузка для платформы {self.name} не поддерживается",
+            "retryable": False
+        }
+    
+    def delete_post(self, post_id: str) -> Dict[str, Any]:
+        """Удаление опубликованного сообщения."""
+        return {
+            "success": False,
+            "error": f"Удаление для платформы {self.name} не поддерживается",
+            "retryable": False
+        }
+    
+    def get_engagement(self, post_ids: List[str]) -> Dict[str, Any]:
+        """
+        Получение счетчиков вовлеченности нескольких опубликованных сообщений одним запросом.
+        
+        Args:
+            post_ids (List[str]): ID сообщений (не больше engagement_batch_size)
+        
+        Returns:
+            Dict[str, Any]: Результат с ключом engagement - словарем
+                {ID сообщения: (лайки, репосты, ответы)}; удаленных сообщений в нем нет
+        """
+        return {
+            "success": False,
+            "error": f"Статистика для платформы {self.name} не поддерживается",
+            "retryable": False
+        }
+    
+    def publish(self, text: str, media_path: Optional[str] = None,
+                media_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Публикация черновика с медиафайлом или без него.
+        
+        Args:
+            text (str): Текст публикации
+            media_path (Optional[str]): Путь к медиафайлу
+            media_type (Optional[str]): Тип медиафайла
+        
+        Returns:
+            Dict[str, Any]: Результат публикации
+        """
+        if media_path and media_type:
+            return self.post_with_media(text, media_path, media_type)
+        return self.post_text(text)
+
+class FakePublisher(Publisher):
+    """Локальный публикатор без сети для тестов и разработки: запоминает публикации в памяти."""
+    
+    engagement_batch_size = 100
+    supports_media_staging = True
+    
+    def __init__(self, name: str, title: Optional[str] = None, delay: float = 0.0, fail_with: Optional[str] = None):
+        """
+        Инициализация.
+        
+        Args:
+            name (str): Идентификатор платформы
+            title (Optional[str]): Название для пользователя
+            delay (float): Имитация задержки сети в секундах
+            fail_with (Optional[str]): Текст ошибки, если публикации должны завершаться неудачей
+        """
+        self.name = name
+        self.title = title or name.capitalize()
+        self.delay = delay
+        self.fail_with = fail_with
+        self.posts: Dict[str, Dict[str, Any]] = {}
+        self.staged_media: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+    
+    def _store(self, text: str, media_path: Optional[str], media_type: Optional[str]) -> Dict[str, Any]:
+        """Имитация публикации."""
+        if self.delay:
+            time.sleep(self.delay)
+        if self.fail_with:
+            return {"success": False, "error": self.fail_with, "retryable": False}
+        
+        post_id = uuid.uuid4().hex
+        with self._lock:
+            self.posts[post_id] = {"text": text, "media_path": media_path, "media_type": media_type}
+        logger.info(f"{self.title}: пост опубликован локально, ID: {post_id}")
+        return {
+            "success": True,
+            "post_id": post_id,
+            "post_url": f"fake://{self.name}/{post_id}"
+        }
+    
+    def post_text(self, text: str) -> Dict[str, Any]:
+        """Имитация публикации текстового сообщения."""
+        return self._store(text, None, None)
+    
+    def post_with_media(self, text: str, media_path: str, media_type: str) -> Dict[str, Any]:
+        """Имитация публикации сообщения с медиафайлом."""
+        return self._store(text, media_path, media_type)
+    
+    def stage_media(self, media_path: str, media_type: str) -> Dict[str, Any]:
+        """Имитация предварительной загрузки медиафайла."""
+        if self.delay:
+            time.sleep(self.delay)
+        media_id = uuid.uuid4().hex
+        with self._lock:
+            self.staged_media[media_id] = {"media_path": media_path, "media_type": media_type}
+        return {"success": True, "media_id": media_id, "expires_after_secs": None}
+    
+    def post_with_staged_media(self, text: str, media_id: str) -> Dict[str, Any]:
+        """Имитация публикации с медиафайлом, загруженным заранее."""
+        with self._lock:
+            media = self.staged_media.get(media_id)
+        if media is None:
+            return {"success": False, "error": f"Медиафайл {media_id} не найден", "retryable": False}
+        return self._store(text, media["media_path"], media["media_type"])
+    
+    def delete_post(self, post_id: str) -> Dict[str, Any]:
+        """Удаление сообщения из памяти."""
+        with self._lock:
+            if self.posts.pop(post_id, None) is None:
+                return {"success": False, "error": "Пост не найден", "retryable": False}
+        return {"success": True}
+    
+    def get_engagement(self, post_ids: List[str]) -> Dict[str, Any]:
+        """Нулевые счетчики для сообщений, опубликованных этим экземпляром."""
+        with self._lock:
+            engagement = {post_id: (0, 0, 0) for post_id in post_ids if post_id in self.posts}
+        return {"success": True, "engagement": engagement}
+
+class PublisherRegistry:
+    """
+    Реестр публикаторов по платформам и асинхронная публикация в несколько платформ.
+    
+    Публикаторы с собственной асинхронной оберткой (например, AsyncTwitterAPI) вызываются
+    через нее; остальные выполняются в общем пуле потоков реестра.
+    """
+    
+    def __init__(self, max_workers: int = 4, timeout: float = 120.0):
+        """
+        Инициализация реестра.
+        
+        Args:
+            max_workers (int): Размер пула потоков для синхронных публикаторов
+            timeout (float): Максимальное время ожидания одной публикации в секундах
+        """
+        self.publishers: Dict[str, Publisher] = {}
+        self.async_publishers: Dict[str, Any] = {}
+        self.timeout = timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="publisher"
+        )
+    
+    def register(self, publisher: Publisher, async_publisher=None) -> None:
+        """
+        Регистрация публикатора.
+        
+        Args:
+            publisher (Publisher): Синхронный публикатор (используется планировщиком)
+            async_publisher: Асинхронная обертка с методами publish и delete_post (необязательно)
+        """
+        self.publishers[publisher.name] = publisher
+        if async_publisher is not None:
+            self.async_publishers[publisher.name] = async_publisher
+        logger.info(f"Зарегистрирована платформа {publisher.name}")
+    
+    def get(self, name: str) -> Optional[Publisher]:
+        """Публикатор платформы или None, если платформа не зарегистрирована."""
+        return self.publishers.get(name)
+    
+    def names(self) -> List[str]:
+        """Идентификаторы зарегистрированных платформ в порядке регистрации."""
+        return list(self.publishers)
+    
+    async def _run(self, name: str, method: str, *args: Any) -> Dict[str, Any]:
+        """Вызов метода публикатора без блокировки цикла событий с учетом его длительности."""
+        start = time.perf_counter()
+        result = await self._call(name, method, *args)
+        outcome = "success" if result.get("success") else "error"
+        PUBLISHER_CALL_SECONDS.observe(time.perf_counter() - start, name, method, outcome)
+        return result
+    
+    async def _call(self, name: str, method: str, *args: Any) -> Dict[str, Any]:
+        """Вызов метода публикатора через асинхронную обертку или пул потоков."""
+        async_publisher = self.async_publishers.get(name)
+        if async_publisher is not None:
+            return await getattr(async_publisher, method)(*args)
+        
+        publisher = self.publishers.get(name)
+        if publisher is None:
+            return {
+                "success": False,
+                "error": f"Неподдерживаемая платформа: {name}",
+                "retryable": False
+            }
+        
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, getattr(publisher, method), *args)
+        if method in NON_IDEMPOTENT_METHODS:
+            return await wait_for_outcome(future, self.timeout, name)
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Превышено время ожидания ответа {name} ({self.timeout} с)")
+            return {
+                "success": False,
+                "error": f"Превышено время ожидания ответа {name} ({self.timeout} с)",
+                "retryable": True
+            }
+    
+    async def publish(self, name: str, text: str, media_path: Optional[str] = None,
+                      media_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Асинхронная публикация в одну платформу.
+        
+        Args:
+            name (str): Идентификатор платформы
+            text (str): Текст публикации
+            media_path (Optional[str]): Путь к медиафайлу
+            media_type (Optional[str]): Тип медиафайла
+        
+        Returns:
+            Dict[str, Any]: Результат публикации
+        """
+        return await self._run(name, "publish", text, media_path, media_type)
+    
+    async def stage_media(self, name: str, media_path: str, media_type: str) -> Dict[str, Any]:
+        """Асинхронная предварительная загрузка медиафайла (см. Publisher.stage_media)."""
+        return await self._run(name, "stage_media", media_path, media_type)
+    
+    async def post_with_staged_media(self, name: str, text: str, media_id: str) -> Dict[str, Any]:
+        """Асинхронная публикация с медиафайлом, загруженным заранее (см. Publisher.post_with_staged_media)."""
+        return await self._run(name, "post_with_staged_media", text, media_id)
+    
+    async def publish_many(self, names: List[str], text: str, media_path: Optional[str] = None,
+                           media_type: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Одновременная публикация в несколько платформ: общее время равно времени
+        самой медленной платформы, а не сумме.
+        
+        Args:
+            names (List[str]): Идентификаторы платформ
+            text (str): Текст публикации
+            media_path (Optional[str]): Путь к медиафайлу
+            media_type (Optional[str]): Тип медиафайла
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Результаты по платформам
+        """
+        results = await asyncio.gather(
+            *(self.publish(name, text, media_path, media_type) for name in names),
+            return_exceptions=True
+        )
+        return {
+            name: result if isinstance(result, dict) else {"success": False, "error": str(result)}
+            for name, result in zip(names, results)
+        }
+    
+    async def delete_post(self, name: str, post_id: str) -> Dict[str, Any]:
+        """
+        Асинхронное удаление опубликованного сообщения.
+        
+        Args:
+            name (str): Идентификатор платформы
+            post_id (str): ID сообщения в социальной сети
+        
+        Returns:
+            Dict[str, Any]: Результат удаления
+        """
+        return await self._run(name, "delete_post", post_id)
+    
+    def close(self) -> None:
+        """Остановка пула потоков."""
+        self.executor.shutdown(wait=False)
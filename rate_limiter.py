@@ -0,0 +1,103 @@
+import time
+import logging
+import threading
+from typing import Optional
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Потокобезопасный ограничитель частоты запросов по алгоритму token bucket."""
+    
+    def __init__(self, name: str, rate: float, capacity: float):
+        """
+        Инициализация ограничителя.
+        
+        Args:
+            name (str): Название ограничиваемой операции (для логов)
+            rate (float): Скорость пополнения в токенах в секунду
+            capacity (float): Максимальное число токенов (допустимый всплеск)
+        """
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def for_window(cls, name: str, limit: int, window: float, burst: int = 5) -> "TokenBucket":
+        """
+        Создание ограничителя для лимита вида «limit запросов за window секунд».
+        
+        Всплеск ограничен burst токенами, а скорость пополнения рассчитана так,
+        чтобы за любое окно длиной window не набиралось больше limit запросов.
+        
+        Args:
+            name (str): Название ограничиваемой операции
+            limit (int): Допустимое число запросов за окно
+            window (float): Длина окна в секундах
+            burst (int): Максимальный всплеск запросов
+        
+        Returns:
+            TokenBucket: Настроенный ограничитель
+        """
+        burst = max(1, min(burst, limit))
+        rate = max(limit - burst, 1) / window
+        return cls(name, rate, burst)
+    
+    def _refill(self, now: float) -> None:
+        """Пополнение токенов с момента последнего обращения. Вызывается под self._lock."""
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+    
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Получение одного токена с ожиданием.
+        
+        Args:
+            timeout (Optional[float]): Максимальное время ожидания в секундах (None - без ограничения)
+        
+        Returns:
+            bool: True если токен получен, False если истек таймаут
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+    
+    def pause_until(self, reset_timestamp: float) -> None:
+        """
+        Приостановка выдачи токенов до момента сброса лимита (например, после ответа 429).
+        
+        Args:
+            reset_timestamp (float): Время сброса лимита в секундах Unix
+        """
+        delay = max(0.0, reset_timestamp - time.time())
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            # Токены начинают пополняться только после окончания паузы
+            self.tokens = 0
+            self.updated_at = self.paused_until
+        logger.warning(f"Лимит запросов '{self.name}' исчерпан, пауза {delay:.0f} с")
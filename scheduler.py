@@ -1,8 +1,17 @@
+import os
+import abc
+import time
+import heapq
+import random
+import socket
+import asyncio
 import logging
-import datetime
 import threading
-import time
-from typing import Dict, Any, Optional
+import concurrent.futures
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+from metrics import Counter, Gauge, Histogram, LAG_BUCKETS
+from timeutils import now_ms, from_epoch_ms
+from media_store import MEDIA_ID_EXPIRY_MARGIN
 
 # Настройка логирования
 logging.basicConfig(
@@ -11,23 +20,498 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class PostScheduler:
-    """Класс для планирования и выполнения отложенных публикаций."""
+# Длительность захвата поста на время публикации (с запасом на обработку видео Twitter)
+CLAIM_LEASE_SECS = 15 * 60
+
+# Повторные попытки публикации: экспоненциальная задержка со случайным разбросом
+MAX_PUBLISH_ATTEMPTS = 6  # После стольких неудачных попыток пост переносится в dead_letter_posts
+RETRY_BASE_DELAY = 60  # Задержка перед первой повторной попыткой в секундах
+RETRY_MAX_DELAY = 6 * 60 * 60  # Максимальная задержка между попытками в секундах
+
+# Предварительная загрузка медиафайлов: за сколько секунд до публикации загружать файл,
+# чтобы в момент публикации оставалось только создать пост (0 - не загружать заранее)
+MEDIA_PRESTAGE_SECS = 30 * 60
+MEDIA_PRESTAGE_CONCURRENCY = 2  # Количество медиафайлов, загружаемых заранее одновременно
+
+# Метрики планировщика
+DISPATCH_LAG_SECONDS = Histogram(
+    "scheduler_dispatch_lag_seconds",
+    "Задержка между запланированным временем и началом публикации",
+    buckets=LAG_BUCKETS
+)
+PUBLISH_SECONDS = Histogram(
+    "scheduler_publish_seconds",
+    "Длительность публикации запланированного поста",
+    ("platform", "outcome")
+)
+POSTS_PROCESSED = Counter(
+    "scheduler_posts_processed",
+    "Обработанные запланированные посты по результату",
+    ("outcome",)
+)
+QUEUE_DEPTH = Gauge(
+    "scheduler_queue_depth",
+    "Количество постов в очереди таймеров планировщика"
+)
+IN_FLIGHT = Gauge(
+    "scheduler_in_flight",
+    "Количество публикуемых прямо сейчас запланированных постов"
+)
+MEDIA_STAGED = Counter(
+    "scheduler_media_staged",
+    "Предварительные загрузки медиафайлов запланированных постов по результату",
+    ("platform", "outcome")
+)
+STAGED_MEDIA_USED = Counter(
+    "scheduler_staged_media_used",
+    "Публикации с медиафайлом, загруженным заранее, по результату",
+    ("outcome",)
+)
+
+class DispatchStats:
+    """Потокобезопасная статистика задержки отправки запланированных постов."""
+    
+    def __init__(self):
+        """Инициализация пустой статистики."""
+        self.count = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self._lock = threading.Lock()
+    
+    def record(self, lag: float) -> None:
+        """
+        Учет задержки отправки одного поста.
+        
+        Args:
+            lag (float): Задержка между запланированным временем и началом публикации в секундах
+        """
+        with self._lock:
+            self.count += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            self.last_lag = lag
     
-    def __init__(self, db_manager, twitter_api):
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Получение текущих значений статистики.
+        
+        Returns:
+            Dict[str, float]: Количество отправленных постов, средняя, максимальная и последняя задержка
+        """
+        with self._lock:
+            return {
+                "dispatched": self.count,
+                "avg_lag": self.total_lag / self.count if self.count else 0.0,
+                "max_lag": self.max_lag,
+                "last_lag": self.last_lag
+            }
+
+class BaseScheduler(abc.ABC):
+    """
+    Общая часть планировщиков: очередь таймеров, загрузка постов из базы данных,
+    статистика отправки и правила повторных попыток. Способ ожидания таймеров
+    и выполнения публикаций определяют подклассы.
+    """
+    
+    def __init__(self, db_manager, publishers, concurrency: int = 4, owner: Optional[str] = None,
+                 notifier: Optional[Callable] = None, media_prestage: float = MEDIA_PRESTAGE_SECS):
         """
         Инициализация планировщика.
         
         Args:
             db_manager: Менеджер базы данных
-            twitter_api: API для работы с Twitter
+            publishers (PublisherRegistry): Реестр публикаторов по платформам
+            concurrency (int): Количество постов, публикуемых одновременно
+            owner (Optional[str]): Идентификатор процесса для захвата постов, по умолчанию хост и PID
+            notifier (Optional[Callable]): Отправка сообщения пользователю (user_id, текст)
+            media_prestage (float): За сколько секунд до публикации загружать медиафайл (0 - не загружать)
         """
         self.db_manager = db_manager
-        self.twitter_api = twitter_api
-        self.scheduled_posts = {}  # Словарь для хранения запланированных задач
+        self.publishers = publishers
+        self.notifier = notifier
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.claim_lease = CLAIM_LEASE_SECS
+        self.scheduled_posts = {}  # Актуальное время публикации (миллисекунды Unix) для каждого ID поста
         self.running = False
+        self.max_attempts = MAX_PUBLISH_ATTEMPTS
+        self.retry_base_delay = RETRY_BASE_DELAY
+        self.retry_max_delay = RETRY_MAX_DELAY
+        
+        # Очередь таймеров (scheduled_time, post_id). Записи, время которых не совпадает
+        # со значением в self.scheduled_posts, считаются устаревшими и пропускаются.
+        # Блокировка нужна, потому что посты добавляются и из других потоков (выбор ведущего)
+        self._heap: List[Tuple[int, int]] = []
+        self._condition = threading.Condition()
+        
+        # Очередь предварительной загрузки (время загрузки, post_id, scheduled_time) с той же
+        # проверкой актуальности. Наличие медиафайла проверяется по базе данных при загрузке
+        self.media_prestage_ms = round(media_prestage * 1000)
+        self._stage_heap: List[Tuple[int, int, int]] = []
+        
+        # Наибольший ID, загруженный из базы данных, и посты, публикуемые прямо сейчас.
+        # Нужны, чтобы подхватывать посты других процессов без повторной постановки в очередь
+        self._max_seen_id = 0
+        self._in_flight = set()
+        
+        # Частоту запросов к API ограничивают сами публикаторы (например, клиент Twitter)
+        self.concurrency = concurrency
+        self.dispatch_stats = DispatchStats()
+        QUEUE_DEPTH.set_function(lambda: len(self.scheduled_posts))
+        IN_FLIGHT.set_function(lambda: len(self._in_flight))
+    
+    @abc.abstractmethod
+    def start(self) -> None:
+        """Запуск планировщика."""
+    
+    @abc.abstractmethod
+    def stop(self) -> None:
+        """Остановка планировщика."""
+    
+    async def aclose(self) -> None:
+        """Остановка планировщика из цикла событий без его блокировки."""
+        await asyncio.get_running_loop().run_in_executor(None, self.stop)
+    
+    def resync(self) -> int:
+        """
+        Добавление в очередь постов, появившихся в базе данных после последней загрузки
+        (например, запланированных другими процессами бота).
+        
+        Returns:
+            int: Количество добавленных постов
+        """
+        new_posts = self.db_manager.get_scheduled_post_times(self._max_seen_id)
+        added = 0
+        with self._condition:
+            for post_id, scheduled_time, has_media in new_posts:
+                self._max_seen_id = max(self._max_seen_id, post_id)
+                if post_id in self.scheduled_posts or post_id in self._in_flight:
+                    continue
+                self._push(post_id, scheduled_time, has_media)
+                added += 1
+        return added
+    
+    def _push(self, post_id: int, scheduled_time: int, has_media: bool) -> None:
+        """
+        Добавление поста в очередь таймеров. Вызывается под self._condition.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            scheduled_time (int): Время публикации в миллисекундах Unix
+            has_media (bool): Есть ли у поста медиафайл (только такие посты загружаются заранее)
+        """
+        self.scheduled_posts[post_id] = scheduled_time
+        heapq.heappush(self._heap, (scheduled_time, post_id))
+        if has_media and self.media_prestage_ms > 0:
+            heapq.heappush(self._stage_heap, (scheduled_time - self.media_prestage_ms, post_id, scheduled_time))
+        # Будим цикл, если новый пост должен выйти (или загружаться) раньше текущего первого в очереди
+        if self._heap[0][1] == post_id or (self._stage_heap and self._stage_heap[0][1] == post_id):
+            self._wake()
+    
+    @abc.abstractmethod
+    def _wake(self) -> None:
+        """Пробуждение цикла ожидания таймеров. Вызывается под self._condition."""
+    
+    def _pop_due(self) -> Tuple[List[Tuple[int, int]], List[int], Optional[float]]:
+        """
+        Извлечение постов, время публикации которых наступило (с пометкой их публикуемыми),
+        и постов, медиафайлы которых пора загрузить. Вызывается под self._condition.
+        
+        Returns:
+            Tuple[List[Tuple[int, int]], List[int], Optional[float]]: Пары (ID поста, время
+                публикации в миллисекундах Unix), ID постов для предварительной загрузки и время
+                ожидания до следующего события в секундах (None, если очереди пусты)
+        """
+        now = now_ms()
+        due = []
+        while self._heap:
+            scheduled_time, post_id = self._heap[0]
+            if self.scheduled_posts.get(post_id) != scheduled_time:
+                # Пост отменен или перенесен
+                heapq.heappop(self._heap)
+                continue
+            if scheduled_time > now:
+                break
+            heapq.heappop(self._heap)
+            del self.scheduled_posts[post_id]
+            due.append((post_id, scheduled_time))
+        self._in_flight.update(post_id for post_id, _ in due)
+        
+        staging = []
+        while self._stage_heap:
+            stage_time, post_id, scheduled_time = self._stage_heap[0]
+            if self.scheduled_posts.get(post_id) != scheduled_time:
+                # Пост отменен, перенесен или уже публикуется
+                heapq.heappop(self._stage_heap)
+                continue
+            if stage_time > now:
+                break
+            heapq.heappop(self._stage_heap)
+            staging.append(post_id)
+        
+        timeout = None
+        if not due and not staging:
+            heads = [heap[0][0] for heap in (self._heap, self._stage_heap) if heap]
+            if heads:
+                timeout = (min(heads) - now) / 1000
+        return due, staging, timeout
+    
+    def _record_dispatch(self, scheduled_time: int) -> None:
+        """
+        Учет задержки отправки поста.
+        
+        Args:
+            scheduled_time (int): Время, на которое был запланирован пост, в миллисекундах Unix
+        """
+        lag = max(0.0, (now_ms() - scheduled_time) / 1000)
+        self.dispatch_stats.record(lag)
+        DISPATCH_LAG_SECONDS.observe(lag)
+    
+    def _finish_dispatch(self, post_id: int) -> None:
+        """Снятие пометки публикуемого поста."""
+        with self._condition:
+            self._in_flight.discard(post_id)
+    
+    def _staged_media_id(self, post_id: int, media_id: Optional[str], expires_at: Optional[int]) -> Optional[str]:
+        """
+        media_id, загруженный заранее, если им еще можно воспользоваться.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            media_id (Optional[str]): staged_media_id поста
+            expires_at (Optional[int]): staged_media_expires_at поста (None - срок неизвестен)
+        
+        Returns:
+            Optional[str]: media_id или None, если файл нужно загрузить при публикации
+        """
+        if media_id is None:
+            return None
+        if expires_at is not None and expires_at <= now_ms():
+            logger.info(f"Срок действия загруженного заранее медиафайла поста {post_id} истек")
+            STAGED_MEDIA_USED.inc("expired")
+            return None
+        return media_id
+    
+    def _staging_publisher(self, platform: str):
+        """Публикатор платформы, если он поддерживает предварительную загрузку, иначе None."""
+        publisher = self.publishers.get(platform)
+        if publisher is None or not publisher.supports_media_staging:
+            return None
+        return publisher
+    
+    def _staged(self, post_id: int, platform: str, result: Dict[str, Any]) -> Optional[Tuple[str, Optional[int]]]:
+        """
+        Учет результата предварительной загрузки.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            platform (str): Платформа публикации
+            result (Dict[str, Any]): Результат stage_media
+        
+        Returns:
+            Optional[Tuple[str, Optional[int]]]: media_id и время его истечения в миллисекундах
+                Unix (None - неизвестно) или None при ошибке
+        """
+        if not result["success"]:
+            # Файл будет загружен в момент публикации
+            logger.warning(f"Не удалось заранее загрузить медиафайл поста {post_id}: {result['error']}")
+            MEDIA_STAGED.inc(platform, "error")
+            return None
+        
+        MEDIA_STAGED.inc(platform, "success")
+        logger.info(f"Медиафайл поста {post_id} загружен заранее, ID: {result['media_id']}")
+        expires_after_secs = result.get("expires_after_secs")
+        if expires_after_secs is None:
+            return result["media_id"], None
+        # Запас, чтобы не публиковать с почти истекшим ID
+        return result["media_id"], now_ms() + (expires_after_secs - MEDIA_ID_EXPIRY_MARGIN) * 1000
+    
+    def _staged_media_rejected(self, post_id: int, result: Dict[str, Any]) -> bool:
+        """
+        Проверка результата публикации с media_id, загруженным заранее: если социальная сеть
+        его отклонила (например, он истек раньше срока), файл загружается заново.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            result (Dict[str, Any]): Результат post_with_staged_media
+        
+        Returns:
+            bool: True если нужно опубликовать пост с повторной загрузкой файла
+        """
+        if result["success"] or result.get("retryable", True):
+            STAGED_MEDIA_USED.inc("used" if result["success"] else "retry")
+            return False
+        logger.warning(
+            f"Загруженный заранее медиафайл поста {post_id} отклонен ({result['error']}), загружаем заново"
+        )
+        STAGED_MEDIA_USED.inc("rejected")
+        return True
+    
+    def _requeue_claimed(self, post_id: int, state: Optional[Tuple[str, Optional[float]]]) -> None:
+        """
+        Обработка поста, который не удалось захватить. Если он захвачен другим процессом,
+        проверяем его снова после окончания захвата - владелец мог завершиться.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            state (Optional[Tuple[str, Optional[float]]]): Состояние поста
+                (см. DatabaseManager.get_scheduled_post_state)
+        """
+        if state and state[0] == "claimed" and state[1]:
+            with self._condition:
+                # Медиафайл загружает владелец захвата
+                self._push(post_id, round(state[1] * 1000), False)
+        POSTS_PROCESSED.inc("skipped")
+    
+    def _requeue_unrecorded(self, post_id: int) -> None:
+        """
+        Повторная постановка поста, публикацию которого не удалось записать в историю:
+        захват истечет, и повторная попытка увидит social_post_id и только завершит запись.
+        
+        Args:
+            post_id (int): ID запланированного поста
+        """
+        logger.error(f"Не удалось записать публикацию запланированного поста {post_id} в историю")
+        retry_time = now_ms() + self.claim_lease * 1000
+        with self._condition:
+            # Пост уже опубликован, загружать медиафайл не нужно
+            self._push(post_id, retry_time, False)
+    
+    def _retry_delay(self, attempt: int) -> float:
+        """
+        Задержка перед следующей попыткой: экспоненциальный рост со случайным разбросом,
+        чтобы посты, упавшие одновременно, не повторялись одной пачкой.
+        
+        Args:
+            attempt (int): Номер неудавшейся попытки (начиная с 1)
+        
+        Returns:
+            float: Задержка в секундах
+        """
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def _next_retry_delay(self, attempt: int, result: Dict[str, Any]) -> Optional[float]:
+        """
+        Задержка перед следующей попыткой после неудачной публикации.
+        
+        Args:
+            attempt (int): Номер неудавшейся попытки (начиная с 1)
+            result (Dict[str, Any]): Результат публикации с ключами error, retryable и retry_after
+        
+        Returns:
+            Optional[float]: Задержка в секундах или None, если от публикации пора отказаться
+        """
+        if not result.get("retryable", True) or attempt >= self.max_attempts:
+            # Дальнейшие попытки только расходуют лимит запросов
+            return None
+        # Если Twitter сообщил время сброса лимита, раньше него пробовать бесполезно
+        return max(self._retry_delay(attempt), result.get("retry_after") or 0)
+    
+    def _published_text(self, post_id: int, platform: str) -> str:
+        """Уведомление об успешной публикации запланированного поста."""
+        logger.info(f"Запланированный пост {post_id} успешно опубликован")
+        POSTS_PROCESSED.inc("published")
+        return f"✅ Запланированный пост {post_id} опубликован в {platform.capitalize()}"
+    
+    def _dead_letter_text(self, post_id: int, platform: str, attempt: int, error: str) -> str:
+        """Уведомление об отказе от публикации запланированного поста."""
+        POSTS_PROCESSED.inc("dead_letter")
+        logger.warning(f"Публикация запланированного поста {post_id} прекращена после попытки {attempt}")
+        return (
+            f"❌ Не удалось опубликовать запланированный пост {post_id} в {platform.capitalize()} "
+            f"(попыток: {attempt}).\n\nПоследняя ошибка: {error}"
+        )
+    
+    def _retry_scheduled(self, post_id: int, delay: float, next_attempt_at: int, has_media: bool) -> None:
+        """Постановка поста в очередь после снятия захвата неудавшейся попытки."""
+        POSTS_PROCESSED.inc("retry")
+        logger.info(f"Повторная попытка публикации поста {post_id} через {delay:.0f} с")
+        with self._condition:
+            self._push(post_id, next_attempt_at, has_media)
+    
+    def schedule_post(self, post_id: int, scheduled_time: int, has_media: bool = False) -> None:
+        """
+        Добавление поста в планировщик.
+        
+        Args:
+            post_id (int): ID запланированного поста в базе данных
+            scheduled_time (int): Запланированное время публикации в миллисекундах Unix
+            has_media (bool): Есть ли у поста медиафайл для предварительной загрузки
+        """
+        with self._condition:
+            self._push(post_id, scheduled_time, has_media)
+        logger.info(f"Пост {post_id} запланирован на {from_epoch_ms(scheduled_time)}")
+    
+    def schedule_posts(self, posts: List[Tuple[int, int, bool]]) -> None:
+        """
+        Добавление нескольких постов в планировщик под одной блокировкой (массовый импорт).
+        
+        Args:
+            posts (List[Tuple[int, int, bool]]): ID запланированного поста, время публикации
+                в миллисекундах Unix и есть ли у поста медиафайл
+        """
+        with self._condition:
+            for post_id, scheduled_time, has_media in posts:
+                self._push(post_id, scheduled_time, has_media)
+        logger.info(f"В планировщик добавлено постов: {len(posts)}")
+    
+    def cancel_scheduled_post(self, post_id: int) -> None:
+        """
+        Отмена запланированного поста.
+        
+        Args:
+            post_id (int): ID запланированного поста
+        """
+        with self._condition:
+            if post_id in self.scheduled_posts:
+                # Запись в куче станет устаревшей и будет пропущена при извлечении
+                del self.scheduled_posts[post_id]
+                logger.info(f"Запланированный пост {post_id} отменен")
+    
+    def get_scheduled_posts(self) -> Dict[int, int]:
+        """
+        Получение списка запланированных постов.
+        
+        Returns:
+            Dict[int, int]: Словарь с ID постов и временем публикации в миллисекундах Unix
+        """
+        with self._condition:
+            return dict(self.scheduled_posts)
+    
+    def get_dispatch_metrics(self) -> Dict[str, float]:
+        """
+        Получение статистики задержки отправки запланированных постов.
+        
+        Returns:
+            Dict[str, float]: Количество отправленных постов и задержки в секундах
+        """
+        return self.dispatch_stats.snapshot()
+
+class PostScheduler(BaseScheduler):
+    """Планировщик отложенных публикаций в отдельном потоке с пулом рабочих потоков."""
+    
+    def __init__(self, db_manager, publishers, concurrency: int = 4, owner: Optional[str] = None,
+                 notifier: Optional[Callable[[int, str], None]] = None,
+                 media_prestage: float = MEDIA_PRESTAGE_SECS):
+        """
+        Инициализация планировщика.
+        
+        Args:
+            db_manager: Менеджер базы данных
+            publishers (PublisherRegistry): Реестр публикаторов по платформам
+            concurrency (int): Количество постов, публикуемых одновременно
+            owner (Optional[str]): Идентификатор процесса для захвата постов, по умолчанию хост и PID
+            notifier (Optional[Callable[[int, str], None]]): Отправка сообщения пользователю
+                (user_id, текст); вызывается из рабочего потока планировщика
+            media_prestage (float): За сколько секунд до публикации загружать медиафайл (0 - не загружать)
+        """
+        super().__init__(db_manager, publishers, concurrency, owner, notifier, media_prestage)
         self.scheduler_thread = None
-        self.check_interval = 60  # Интервал проверки в секундах (1 минута)
+        # Пул рабочих потоков для одновременной публикации наступивших постов и отдельный
+        # пул предварительной загрузки, чтобы долгая загрузка видео не задерживала публикации
+        self.executor = None
+        self.stage_executor = None
     
     def start(self) -> None:
         """Запуск планировщика в отдельном потоке."""
@@ -35,58 +519,199 @@ class PostScheduler:
             logger.warning("Планировщик уже запущен")
             return
         
+        # Загружаем все запланированные посты из базы данных один раз при запуске
+        self._max_seen_id = 0
+        self.resync()
+        
         self.running = True
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency,
+            thread_name_prefix="scheduler-dispatch"
+        )
+        self.stage_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=MEDIA_PRESTAGE_CONCURRENCY,
+            thread_name_prefix="scheduler-stage"
+        )
         self.scheduler_thread = threading.Thread(target=self._scheduler_loop)
         self.scheduler_thread.daemon = True  # Поток демон завершится вместе с основным процессом
         self.scheduler_thread.start()
-        logger.info("Планировщик публикаций запущен")
+        logger.info(f"Планировщик публикаций запущен, постов в очереди: {len(self.scheduled_posts)}")
     
     def stop(self) -> None:
         """Остановка планировщика."""
-        self.running = False
+        with self._condition:
+            self.running = False
+            self._condition.notify_all()
         if self.scheduler_thread:
             self.scheduler_thread.join()
+            self.scheduler_thread = None
+        if self.stage_executor:
+            # Загрузки заранее не обязательны: при публикации файл будет загружен снова
+            self.stage_executor.shutdown(wait=False, cancel_futures=True)
+            self.stage_executor = None
+        if self.executor:
+            # Дожидаемся публикаций, которые уже начались; ожидающие в очереди пула отменяются,
+            # их посты остаются pending в базе данных и загружаются снова через resync
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            with self._condition:
+                # Отмененные задачи не выполнили _finish_dispatch
+                self._in_flight.clear()
             logger.info("Планировщик публикаций остановлен")
     
+    def _wake(self) -> None:
+        """Пробуждение потока планировщика. Вызывается под self._condition."""
+        self._condition.notify()
+    
     def _scheduler_loop(self) -> None:
-        """Основной цикл планировщика, который проверяет и публикует запланированные посты."""
+        """Основной цикл планировщика: спит до ближайшего поста и передает наступившие в пул публикации."""
         while self.running:
-            try:
-                # Получаем все запланированные посты, которые должны быть опубликованы
-                pending_posts = self.db_manager.get_pending_scheduled_posts()
-                
-                for post in pending_posts:
-                    post_id, user_id, platform, text, media_path, media_type = post
-                    
-                    # Публикуем пост
-                    result = self._publish_post(platform, text, media_path, media_type)
-                    
-                    if result["success"]:
-                        # Сохраняем успешную публикацию в базу данных
-                        self.db_manager.add_post(
-                            user_id,
-                            platform,
-                            text,
-                            media_path,
-                            result["post_id"],
-                            "published"
-                        )
-                        
-                        # Удаляем запланированный пост из базы данных
-                        self.db_manager.delete_scheduled_post(user_id, post_id)
-                        
-                        logger.info(f"Запланированный пост {post_id} успешно опубликован")
-                    else:
-                        logger.error(f"Ошибка при публикации запланированного поста {post_id}: {result['error']}")
-                        # Можно обновить статус запланированного поста на "failed" или оставить для повторной попытки
-                
-                # Спим до следующей проверки
-                time.sleep(self.check_interval)
-            except Exception as e:
-                logger.error(f"Ошибка в цикле планировщика: {e}")
-                time.sleep(self.check_interval)
+            with self._condition:
+                due, staging, timeout = self._pop_due()
+                if not due and not staging:
+                    # Без постов ждем до ближайшего таймера или до добавления нового поста,
+                    # не обращаясь к базе данных
+                    self._condition.wait(timeout)
+                    continue
+            
+            for post_id in staging:
+                self.stage_executor.submit(self._stage, post_id)
+            for post_id, scheduled_time in due:
+                self.executor.submit(self._dispatch, post_id, scheduled_time)
+    
+    def _stage(self, post_id: int) -> None:
+        """
+        Предварительная загрузка медиафайла запланированного поста в рабочем потоке.
+        
+        Args:
+            post_id (int): ID запланированного поста
+        """
+        try:
+            post = self.db_manager.get_scheduled_post_for_staging(post_id, now_ms())
+            if post is None:
+                return
+            platform, media_path, media_type = post
+            publisher = self._staging_publisher(platform)
+            if publisher is None:
+                return
+            
+            staged = self._staged(post_id, platform, publisher.stage_media(media_path, media_type))
+            if staged:
+                self.db_manager.set_staged_media(post_id, *staged)
+        except Exception as e:
+            logger.error(f"Ошибка в планировщике при загрузке медиафайла поста {post_id}: {e}")
+    
+    def _dispatch(self, post_id: int, scheduled_time: int) -> None:
+        """
+        Обработка поста в рабочем потоке с учетом задержки отправки.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            scheduled_time (int): Время, на которое был запланирован пост, в миллисекундах Unix
+        """
+        self._record_dispatch(scheduled_time)
+        try:
+            self._process_post(post_id)
+        except Exception as e:
+            logger.error(f"Ошибка в планировщике при обработке поста {post_id}: {e}")
+        finally:
+            self._finish_dispatch(post_id)
     
-    def _publish_post(self, platform: str, text: str, media_path: Optional[str], 
+    def _process_post(self, post_id: int) -> None:
+        """
+        Публикация одного наступившего запланированного поста.
+        
+        Пост захватывается атомарно (pending -> claimed), поэтому его не опубликуют
+        одновременно два потока или процесса. После публикации ID поста сохраняется
+        сразу, а запись в историю и переход в published выполняются одной транзакцией.
+        
+        Args:
+            post_id (int): ID запланированного поста
+        """
+        post = self.db_manager.claim_scheduled_post(post_id, self.owner, self.claim_lease, time.time())
+        if post is None:
+            # Пост удален, уже опубликован или захвачен другим процессом
+            self._requeue_claimed(post_id, self.db_manager.get_scheduled_post_state(post_id))
+            return
+        
+        (post_id, user_id, platform, text, media_path, media_type, social_post_id, attempts,
+         staged_media_id, staged_media_expires_at) = post
+        
+        if social_post_id:
+            # Предыдущий владелец опубликовал пост, но не успел записать его в историю
+            logger.info(f"Запланированный пост {post_id} уже опубликован, завершаем запись")
+        else:
+            # Публикуем пост; если медиафайл загружен заранее, остается только создать пост
+            start = time.perf_counter()
+            result = None
+            media_id = self._staged_media_id(post_id, staged_media_id, staged_media_expires_at)
+            publisher = self._staging_publisher(platform) if media_id else None
+            if publisher is not None:
+                result = publisher.post_with_staged_media(text, media_id)
+                if self._staged_media_rejected(post_id, result):
+                    result = None
+            if result is None:
+                result = self._publish_post(platform, text, media_path, media_type)
+            PUBLISH_SECONDS.observe(
+                time.perf_counter() - start,
+                platform,
+                "success" if result["success"] else "error"
+            )
+            
+            if not result["success"]:
+                logger.error(f"Ошибка при публикации запланированного поста {post_id}: {result['error']}")
+                self._handle_failure(post_id, user_id, platform, attempts + 1, result, media_path is not None)
+                return
+            
+            social_post_id = result["post_id"]
+            self.db_manager.record_scheduled_publication(post_id, self.owner, social_post_id)
+        
+        # Сохраняем успешную публикацию в историю
+        if self.db_manager.complete_scheduled_post(post_id, social_post_id):
+            self._notify(user_id, self._published_text(post_id, platform))
+        else:
+            self._requeue_unrecorded(post_id)
+    
+    def _handle_failure(self, post_id: int, user_id: int, platform: str, attempt: int,
+                        result: Dict[str, Any], has_media: bool) -> None:
+        """
+        Повторная постановка поста в очередь или отказ от публикации после неудачной попытки.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            user_id (int): ID пользователя Telegram
+            platform (str): Платформа публикации
+            attempt (int): Номер неудавшейся попытки (начиная с 1)
+            result (Dict[str, Any]): Результат публикации с ключами error, retryable и retry_after
+            has_media (bool): Есть ли у поста медиафайл
+        """
+        error = result["error"]
+        delay = self._next_retry_delay(attempt, result)
+        if delay is None:
+            if self.db_manager.dead_letter_scheduled_post(post_id, self.owner, error, time.time()):
+                self._notify(user_id, self._dead_letter_text(post_id, platform, attempt, error))
+            return
+        
+        next_attempt_at = now_ms() + round(delay * 1000)
+        if self.db_manager.release_scheduled_post(post_id, self.owner, error, next_attempt_at):
+            self._retry_scheduled(post_id, delay, next_attempt_at, has_media)
+    
+    def _notify(self, user_id: int, text: str) -> None:
+        """
+        Отправка уведомления пользователю, если задан notifier.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            text (str): Текст сообщения
+        """
+        if self.notifier is None:
+            return
+        try:
+            self.notifier(user_id, text)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
+    
+    def _publish_post(self, platform: str, text: str, media_path: Optional[str],
                      media_type: Optional[str]) -> Dict[str, Any]:
         """
         Публикация поста в социальную сеть.
@@ -96,51 +721,337 @@ class PostScheduler:
             text (str): Текст публикации
             media_path (Optional[str]): Путь к медиафайлу
             media_type (Optional[str]): Тип медиафайла
-            
+        
         Returns:
             Dict[str, Any]: Результат публикации
         """
-        if platform == "twitter":
-            if media_path and media_type:
-                return self.twitter_api.post_with_media(text, media_path, media_type)
-            else:
-                return self.twitter_api.post_text(text)
-        else:
+        publisher = self.publishers.get(platform)
+        if publisher is None:
             return {
                 "success": False,
-                "error": f"Неподдерживаемая платформа: {platform}"
+                "error": f"Неподдерживаемая платформа: {platform}",
+                "retryable": False
             }
+        return publisher.publish(text, media_path, media_type)
+
+class AsyncPostScheduler(BaseScheduler):
+    """
+    Планировщик отложенных публикаций в цикле событий бота.
+    
+    Ожидание таймеров и публикации выполняются задачами asyncio в том же цикле, что и
+    обработчики обновлений: публикация идет через асинхронный реестр платформ, запись
+    в базу данных - через поток записи без блокировки цикла, а уведомления отправляются
+    сразу через await bot.send_message. Методы start, stop, resync и добавление постов
+    можно вызывать из любого потока (например, из потока выбора ведущего).
+    """
     
-    def schedule_post(self, post_id: int, scheduled_time: datetime.datetime) -> None:
+    def __init__(self, db_manager, publishers, concurrency: int = 4, owner: Optional[str] = None,
+                 notifier: Optional[Callable[[int, str], Awaitable[None]]] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None, media_prestage: float = MEDIA_PRESTAGE_SECS):
         """
-        Добавление поста в планировщик.
+        Инициализация планировщика.
         
         Args:
-            post_id (int): ID запланированного поста в базе данных
-            scheduled_time (datetime.datetime): Запланированное время публикации
+            db_manager: Менеджер базы данных
+            publishers (PublisherRegistry): Реестр публикаторов по платформам
+            concurrency (int): Количество постов, публикуемых одновременно
+            owner (Optional[str]): Идентификатор процесса для захвата постов, по умолчанию хост и PID
+            notifier (Optional[Callable[[int, str], Awaitable[None]]]): Асинхронная отправка
+                сообщения пользователю (user_id, текст)
+            loop (Optional[asyncio.AbstractEventLoop]): Цикл событий; если не задан, используется
+                цикл, из которого вызван start
+            media_prestage (float): За сколько секунд до публикации загружать медиафайл (0 - не загружать)
         """
-        # В текущей реализации нам не нужно хранить отдельно запланированные задачи в памяти,
-        # т.к. мы регулярно проверяем базу данных на наличие постов для публикации.
-        # Но мы можем расширить функционал, например, для уведомлений пользователя.
-        self.scheduled_posts[post_id] = scheduled_time
-        logger.info(f"Пост {post_id} запланирован на {scheduled_time}")
+        super().__init__(db_manager, publishers, concurrency, owner, notifier, media_prestage)
+        self.loop = loop
+        self._task = None
+        self._tasks = set()
+        self._stage_tasks = set()
+        # Задачи публикации, еще не получившие места в self._semaphore, по ID поста:
+        # при остановке они отменяются, а не публикуются
+        self._waiting: Dict[int, asyncio.Task] = {}
+        self._wakeup = None
+        self._semaphore = None
+        self._stage_semaphore = None
     
-    def cancel_scheduled_post(self, post_id: int) -> None:
+    def _in_loop(self) -> bool:
+        """Вызван ли метод из потока цикла событий планировщика."""
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+    
+    def start(self) -> None:
+        """Запуск цикла планировщика задачей в цикле событий."""
+        if self.running:
+            logger.warning("Планировщик уже запущен")
+            return
+        if self.loop is None:
+            try:
+                self.loop = asyncio.get_running_loop()
+            except RuntimeError:
+                raise RuntimeError("Не задан цикл событий планировщика")
+        
+        # Загружаем все запланированные посты из базы данных один раз при запуске
+        self._max_seen_id = 0
+        self.resync()
+        
+        self.running = True
+        if self._in_loop():
+            self._start_task()
+        else:
+            self.loop.call_soon_threadsafe(self._start_task)
+        logger.info(f"Планировщик публикаций запущен, постов в очереди: {len(self.scheduled_posts)}")
+    
+    def _start_task(self) -> None:
+        """Создание задачи цикла планировщика. Выполняется в цикле событий."""
+        # Примитивы asyncio создаются в цикле, в котором будут использоваться
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # Отдельное ограничение, чтобы долгая загрузка видео не занимала места публикаций
+        self._stage_semaphore = asyncio.Semaphore(MEDIA_PRESTAGE_CONCURRENCY)
+        self._task = self.loop.create_task(self._scheduler_loop())
+    
+    def stop(self) -> None:
         """
-        Отмена запланированного поста.
+        Остановка планировщика из другого потока с ожиданием начатых публикаций.
+        Из цикла событий используется aclose.
+        """
+        if self._in_loop():
+            raise RuntimeError("Из цикла событий планировщик останавливается через aclose")
+        if self.loop is not None and not self.loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.aclose(), self.loop).result()
+    
+    async def aclose(self) -> None:
+        """Отмена цикла планировщика и ожидающих публикаций, ожидание публикаций, которые уже начались."""
+        with self._condition:
+            self.running = False
+        task, self._task = self._task, None
+        if task is None:
+            return
+        
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        
+        # Загрузки заранее не обязательны: при публикации файл будет загружен снова
+        for stage_task in list(self._stage_tasks):
+            stage_task.cancel()
+        
+        # Посты, ожидающие места для публикации, остаются pending в базе данных и
+        # загружаются снова через resync при следующем запуске
+        waiting, self._waiting = self._waiting, {}
+        for dispatch_task in waiting.values():
+            dispatch_task.cancel()
+        with self._condition:
+            # Отмененная до первого шага задача не выполняет свой finally
+            self._in_flight.difference_update(waiting)
+        if waiting:
+            logger.info(f"Отменено публикаций, ожидавших очереди: {len(waiting)}")
+        
+        # Начатые публикации завершаются, как при остановке пула потоков
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info("Планировщик публикаций остановлен")
+    
+    def _wake(self) -> None:
+        """Пробуждение задачи планировщика из любого потока. Вызывается под self._condition."""
+        if self.running and self._wakeup is not None:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+    
+    async def _scheduler_loop(self) -> None:
+        """Основной цикл планировщика: ждет ближайшего поста и запускает публикацию наступивших."""
+        while self.running:
+            with self._condition:
+                due, staging, timeout = self._pop_due()
+                if not due and not staging:
+                    self._wakeup.clear()
+            
+            if not due and not staging:
+                # Без постов ждем до ближайшего таймера или до добавления нового поста,
+                # не обращаясь к базе данных
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            for post_id in staging:
+                task = self.loop.create_task(self._stage(post_id))
+                self._stage_tasks.add(task)
+                task.add_done_callback(self._stage_tasks.discard)
+            for post_id, scheduled_time in due:
+                task = self.loop.create_task(self._dispatch(post_id, scheduled_time))
+                self._waiting[post_id] = task
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+    
+    async def _stage(self, post_id: int) -> None:
+        """
+        Предварительная загрузка медиафайла запланированного поста.
         
         Args:
             post_id (int): ID запланированного поста
         """
-        if post_id in self.scheduled_posts:
-            del self.scheduled_posts[post_id]
-            logger.info(f"Запланированный пост {post_id} отменен")
-
-    def get_scheduled_posts(self) -> Dict[int, datetime.datetime]:
+        try:
+            async with self._stage_semaphore:
+                # Чтения из базы данных выполняются в пуле потоков, чтобы не блокировать цикл событий
+                post = await asyncio.get_running_loop().run_in_executor(
+                    None, self.db_manager.get_scheduled_post_for_staging, post_id, now_ms()
+                )
+                if post is None:
+                    return
+                platform, media_path, media_type = post
+                if self._staging_publisher(platform) is None:
+                    return
+                
+                result = await self.publishers.stage_media(platform, media_path, media_type)
+                staged = self._staged(post_id, platform, result)
+                if staged:
+                    await self.db_manager.set_staged_media_async(post_id, *staged)
+        except Exception as e:
+            logger.error(f"Ошибка в планировщике при загрузке медиафайла поста {post_id}: {e}")
+    
+    async def _dispatch(self, post_id: int, scheduled_time: int) -> None:
         """
-        Получение списка запланированных постов.
+        Обработка поста с ограничением числа одновременных публикаций.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            scheduled_time (int): Время, на которое был запланирован пост, в миллисекундах Unix
+        """
+        try:
+            async with self._semaphore:
+                self._waiting.pop(post_id, None)
+                self._record_dispatch(scheduled_time)
+                await self._process_post(post_id)
+        except Exception as e:
+            logger.error(f"Ошибка в планировщике при обработке поста {post_id}: {e}")
+        finally:
+            self._finish_dispatch(post_id)
+    
+    async def _process_post(self, post_id: int) -> None:
+        """
+        Публикация одного наступившего запланированного поста (см. PostScheduler._process_post).
+        
+        Args:
+            post_id (int): ID запланированного поста
+        """
+        post = await self.db_manager.claim_scheduled_post_async(
+            post_id, self.owner, self.claim_lease, time.time()
+        )
+        if post is None:
+            # Пост удален, уже опубликован или захвачен другим процессом
+            state = await asyncio.get_running_loop().run_in_executor(
+                None, self.db_manager.get_scheduled_post_state, post_id
+            )
+            self._requeue_claimed(post_id, state)
+            return
+        
+        (post_id, user_id, platform, text, media_path, media_type, social_post_id, attempts,
+         staged_media_id, staged_media_expires_at) = post
+        
+        if social_post_id:
+            # Предыдущий владелец опубликовал пост, но не успел записать его в историю
+            logger.info(f"Запланированный пост {post_id} уже опубликован, завершаем запись")
+        else:
+            # Публикуем пост; если медиафайл загружен заранее, остается только создать пост
+            start = time.perf_counter()
+            result = None
+            media_id = self._staged_media_id(post_id, staged_media_id, staged_media_expires_at)
+            if media_id and self._staging_publisher(platform) is not None:
+                result = await self._await_outcome(
+                    post_id, await self.publishers.post_with_staged_media(platform, text, media_id)
+                )
+                if self._staged_media_rejected(post_id, result):
+                    result = None
+            if result is None:
+                result = await self._await_outcome(
+                    post_id, await self.publishers.publish(platform, text, media_path, media_type)
+                )
+            PUBLISH_SECONDS.observe(
+                time.perf_counter() - start,
+                platform,
+                "success" if result["success"] else "error"
+            )
+            
+            if not result["success"]:
+                logger.error(f"Ошибка при публикации запланированного поста {post_id}: {result['error']}")
+                await self._handle_failure(post_id, user_id, platform, attempts + 1, result, media_path is not None)
+                return
+            
+            social_post_id = result["post_id"]
+            await self.db_manager.record_scheduled_publication_async(post_id, self.owner, social_post_id)
+        
+        # Сохраняем успешную публикацию в историю
+        if await self.db_manager.complete_scheduled_post_async(post_id, social_post_id):
+            await self._notify(user_id, self._published_text(post_id, platform))
+        else:
+            self._requeue_unrecorded(post_id)
+    
+    async def _await_outcome(self, post_id: int, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Сверка публикации, ответ на которую не пришел за таймаут реестра (outcome_unknown).
+        
+        Повтор мог бы опубликовать пост дважды, поэтому планировщик ждет фактического
+        результата запроса, который продолжает выполняться, и продлевает захват, чтобы
+        пост не забрал другой процесс.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            result (Dict[str, Any]): Результат публикации из реестра
         
         Returns:
-            Dict[int, datetime.datetime]: Словарь с ID постов и временем публикации
+            Dict[str, Any]: Фактический результат публикации
+        """
+        if not result.get("outcome_unknown"):
+            return result
+        
+        outcome = result["outcome"]
+        logger.warning(f"Ответ на публикацию поста {post_id} задерживается, ждем фактического результата")
+        while True:
+            done, _ = await asyncio.wait({outcome}, timeout=self.claim_lease / 2)
+            if done:
+                return outcome.result()
+            await self.db_manager.extend_scheduled_claim_async(post_id, self.owner, self.claim_lease, time.time())
+    
+    async def _handle_failure(self, post_id: int, user_id: int, platform: str, attempt: int,
+                              result: Dict[str, Any], has_media: bool) -> None:
+        """
+        Повторная постановка поста в очередь или отказ от публикации после неудачной попытки.
+        
+        Args:
+            post_id (int): ID запланированного поста
+            user_id (int): ID пользователя Telegram
+            platform (str): Платформа публикации
+            attempt (int): Номер неудавшейся попытки (начиная с 1)
+            result (Dict[str, Any]): Результат публикации с ключами error, retryable и retry_after
+            has_media (bool): Есть ли у поста медиафайл
+        """
+        error = result["error"]
+        delay = self._next_retry_delay(attempt, result)
+        if delay is None:
+            if await self.db_manager.dead_letter_scheduled_post_async(post_id, self.owner, error, time.time()):
+                await self._notify(user_id, self._dead_letter_text(post_id, platform, attempt, error))
+            return
+        
+        next_attempt_at = now_ms() + round(delay * 1000)
+        if await self.db_manager.release_scheduled_post_async(post_id, self.owner, error, next_attempt_at):
+            self._retry_scheduled(post_id, delay, next_attempt_at, has_media)
+    
+    async def _notify(self, user_id: int, text: str) -> None:
         """
-        return self.scheduled_posts
\ No newline at end of file
+        Отправка уведомления пользователю, если задан notifier.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            text (str): Текст сообщения
+        """
+        if self.notifier is None:
+            return
+        try:
+            await self.notifier(user_id, text)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
@@ -0,0 +1,237 @@
+import os
+import time
+import queue
+import signal
+import socket
+import asyncio
+import logging
+import threading
+import multiprocessing
+from typing import Callable, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, ContextTypes
+
+from metrics import MetricsServer
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Параметры распределения нагрузки между процессами
+SHARD_QUEUE_SIZE = 1000  # Максимальное число обновлений в очереди одного процесса
+SCHEDULER_LEASE = "scheduler"  # Название аренды ведущего планировщика
+LEASE_TTL = 30.0  # Срок аренды в секундах
+LEASE_RENEW_INTERVAL = 5.0  # Период продления аренды и подхвата новых постов в секундах
+WORKER_STOP_TIMEOUT = 30.0  # Время ожидания завершения рабочего процесса в секундах
+
+async def start_application(application: Application) -> None:
+    """Запуск приложения без получения обновлений (как в run_polling до запуска Updater)."""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+async def stop_application(application: Application) -> None:
+    """Остановка приложения в том же порядке, что и в run_polling."""
+    if application.running:
+        await application.stop()
+    if application.post_stop:
+        await application.post_stop(application)
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+def shard_for(update: Update, shards: int) -> int:
+    """
+    Номер процесса, обрабатывающего обновление. Все обновления одного пользователя
+    попадают в один процесс, поэтому разговор /new_post не разрывается между процессами.
+    
+    Args:
+        update (Update): Обновление Telegram
+        shards (int): Количество рабочих процессов
+    
+    Returns:
+        int: Номер рабочего процесса
+    """
+    if update.effective_user:
+        key = update.effective_user.id
+    elif update.effective_chat:
+        key = update.effective_chat.id
+    else:
+        key = update.update_id
+    return key % shards
+
+class SchedulerLeader:
+    """
+    Выбор ведущего планировщика среди процессов через строку аренды в базе данных.
+    
+    Планировщик работает только в процессе, владеющем арендой. Ведущий продлевает аренду
+    и подхватывает посты, запланированные другими процессами; при потере аренды планировщик
+    останавливается, а при ее получении - запускается с загрузкой очереди из базы данных.
+    """
+    
+    def __init__(self, db_manager, scheduler, owner: Optional[str] = None, ttl: float = LEASE_TTL,
+                 renew_interval: float = LEASE_RENEW_INTERVAL):
+        """
+        Инициализация.
+        
+        Args:
+            db_manager: Менеджер базы данных
+            scheduler (BaseScheduler): Планировщик этого процесса
+            owner (Optional[str]): Идентификатор процесса, по умолчанию хост и PID
+            ttl (float): Срок аренды в секундах
+            renew_interval (float): Период продления аренды в секундах (меньше ttl)
+        """
+        self.db_manager = db_manager
+        self.scheduler = scheduler
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.is_leader = False
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self) -> None:
+        """Запуск потока выбора ведущего."""
+        self._thread = threading.Thread(target=self._run, name="scheduler-lease", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Остановка планировщика и освобождение аренды."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        if self.is_leader:
+            self.scheduler.stop()
+            self.db_manager.release_lease(SCHEDULER_LEASE, self.owner)
+            self.is_leader = False
+    
+    def _run(self) -> None:
+        """Цикл продления аренды."""
+        while not self._stop_event.is_set():
+            try:
+                self._tick()
+            except Exception as e:
+                logger.error(f"Ошибка при продлении аренды планировщика: {e}")
+            self._stop_event.wait(self.renew_interval)
+    
+    def _tick(self) -> None:
+        """Одна попытка получить или продлить аренду."""
+        held = self.db_manager.acquire_lease(SCHEDULER_LEASE, self.owner, self.ttl, time.time())
+        if held and not self.is_leader:
+            logger.info(f"Процесс {self.owner} стал ведущим планировщиком")
+            self.is_leader = True
+            self.scheduler.start()
+        elif held:
+            added = self.scheduler.resync()
+            if added:
+                logger.info(f"В очередь планировщика добавлено постов других процессов: {added}")
+        elif self.is_leader:
+            logger.warning(f"Процесс {self.owner} потерял аренду планировщика")
+            self.is_leader = False
+            self.scheduler.stop()
+
+def run_shard_worker(index: int, updates: multiprocessing.Queue,
+                     build_worker: Callable[[], Tuple[object, Application]],
+                     metrics_address: Optional[Tuple[str, int]] = None) -> None:
+    """
+    Точка входа рабочего процесса.
+    
+    Args:
+        index (int): Номер рабочего процесса
+        updates (multiprocessing.Queue): Очередь обновлений этого процесса
+        build_worker (Callable[[], Tuple[object, Application]]): Функция верхнего уровня,
+            создающая бота и приложение без Updater
+        metrics_address (Optional[Tuple[str, int]]): Адрес сервера метрик процесса (None - без метрик)
+    """
+    # Процесс останавливается родителем через None в очереди
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if metrics_address:
+        MetricsServer(*metrics_address).start()
+    asyncio.run(_worker_main(index, updates, build_worker))
+
+async def _worker_main(index: int, updates: multiprocessing.Queue,
+                       build_worker: Callable[[], Tuple[object, Application]]) -> None:
+    """Прием обновлений из очереди родителя и передача их в Application."""
+    bot, application = build_worker()
+    leader = SchedulerLeader(bot.db_manager, bot.scheduler)
+    loop = asyncio.get_running_loop()
+    
+    await start_application(application)
+    leader.start()
+    logger.info(f"Рабочий процесс {index} (PID {os.getpid()}) запущен")
+    try:
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+    finally:
+        # Асинхронный планировщик останавливается задачей в этом цикле, поэтому поток
+        # выбора ведущего дожидается ее вне цикла
+        await loop.run_in_executor(None, leader.stop)
+        await stop_application(application)
+        logger.info(f"Рабочий процесс {index} остановлен")
+
+class ShardPool:
+    """Рабочие процессы бота и распределение обновлений между ними по ID пользователя."""
+    
+    def __init__(self, workers: int, build_worker: Callable[[], Tuple[object, Application]],
+                 metrics_host: str = "127.0.0.1", metrics_port: int = 0):
+        """
+        Инициализация.
+        
+        Args:
+            workers (int): Количество рабочих процессов
+            build_worker (Callable[[], Tuple[object, Application]]): Функция верхнего уровня,
+                создающая бота и приложение в рабочем процессе
+            metrics_host (str): Адрес серверов метрик рабочих процессов
+            metrics_port (int): Порт метрик родительского процесса; рабочий процесс index
+                использует порт metrics_port + 1 + index (0 - без метрик)
+        """
+        self.workers = workers
+        self.build_worker = build_worker
+        self.metrics_host = metrics_host
+        self.metrics_port = metrics_port
+        self.queues: List[multiprocessing.Queue] = []
+        self.processes: List[multiprocessing.Process] = []
+    
+    def start(self) -> None:
+        """Запуск рабочих процессов."""
+        for index in range(self.workers):
+            updates = multiprocessing.Queue(SHARD_QUEUE_SIZE)
+            metrics_address = (self.metrics_host, self.metrics_port + 1 + index) if self.metrics_port else None
+            process = multiprocessing.Process(
+                target=run_shard_worker,
+                args=(index, updates, self.build_worker, metrics_address),
+                name=f"shard-{index}"
+            )
+            process.start()
+            self.queues.append(updates)
+            self.processes.append(process)
+        logger.info(f"Запущено рабочих процессов: {self.workers}")
+    
+    def stop(self) -> None:
+        """Остановка рабочих процессов после обработки уже переданных обновлений."""
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                logger.warning(f"Процесс {process.name} не завершился вовремя и будет остановлен")
+                process.terminate()
+        logger.info("Рабочие процессы остановлены")
+    
+    async def route(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Обработчик родительского процесса: передача обновления в рабочий процесс."""
+        updates = self.queues[shard_for(update, self.workers)]
+        data = update.to_dict()
+        try:
+            updates.put_nowait(data)
+        except queue.Full:
+            # Рабочий процесс не успевает - ждем места, не блокируя цикл событий
+            await asyncio.get_running_loop().run_in_executor(None, updates.put, data)
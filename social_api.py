@@ -1,7 +1,17 @@
 import os
+import asyncio
 import logging
+import functools
+import time
+import concurrent.futures
 import tweepy
-from typing import Dict, Any, Optional
+import requests
+from typing import Dict, Any, AsyncIterator, List, Optional, Callable, Tuple
+from rate_limiter import TokenBucket
+from publishers import Publisher, wait_for_outcome
+from media_upload import ChunkedUploader, UploadError, MEDIA_CATEGORIES
+from media_preflight import MediaLimits
+from metrics import Histogram
 
 # Настройка логирования
 logging.basicConfig(
@@ -10,10 +20,104 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class TwitterAPI:
+# Лимиты Twitter API на пользователя: (число запросов, окно в секундах)
+TWITTER_RATE_LIMITS = {
+    "tweet_create": (200, 15 * 60),   # POST /2/tweets
+    "tweet_delete": (50, 15 * 60),    # DELETE /2/tweets/:id
+    "media_upload": (415, 15 * 60),   # POST media/upload (v1.1)
+    "tweet_lookup": (900, 15 * 60),   # GET /2/tweets
+}
+
+# Максимальное число ID в одном запросе GET /2/tweets
+TWEET_LOOKUP_BATCH_SIZE = 100
+
+# Минимальная ожидаемая скорость загрузки медиафайла в байтах в секунду: срок загрузки
+# растет с размером файла, чтобы видео до 512 МБ не обрывалось общим таймаутом вызова
+UPLOAD_MIN_BYTES_PER_SEC = 1024 * 1024
+
+# Ограничения медиафайлов Twitter: проверяются до загрузки, чтобы не отправлять файлы,
+# которые Twitter все равно отклонит
+TWITTER_MEDIA_LIMITS = {
+    "photo": MediaLimits(
+        max_bytes=5 * 1024 * 1024,
+        formats=("jpeg", "png", "gif", "webp")
+    ),
+    "video": MediaLimits(
+        max_bytes=512 * 1024 * 1024,
+        max_width=1920,
+        max_height=1200,
+        min_duration=0.5,
+        max_duration=140,
+        formats=("mp4", "mov"),
+        video_codecs=("avc1", "avc3"),
+        audio_codecs=("mp4a",)
+    ),
+}
+
+# Метрики запросов к Twitter API
+TWITTER_REQUEST_SECONDS = Histogram(
+    "twitter_request_seconds",
+    "Длительность запросов к Twitter API",
+    ("endpoint", "outcome")
+)
+TWITTER_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "twitter_rate_limit_wait_seconds",
+    "Время ожидания локального лимита запросов перед обращением к Twitter API",
+    ("endpoint",)
+)
+
+def error_result(e: Exception) -> Dict[str, Any]:
+    """
+    Результат неудачной операции с признаком того, имеет ли смысл повторять запрос.
+    
+    Повторяются только ошибки, которые могут исчезнуть сами: превышение лимита запросов,
+    ошибки сервера Twitter и сети. Ошибки запроса (400, 401, 403, 404) повторно не исправятся.
+    
+    Args:
+        e (Exception): Исключение
+        
+    Returns:
+        Dict[str, Any]: Результат с ключами success, error, retryable и retry_after
+            (через сколько секунд Twitter разрешит повтор, если известно)
+    """
+    retry_after = None
+    if isinstance(e, tweepy.TooManyRequests):
+        retryable = True
+        reset = e.response.headers.get("x-rate-limit-reset") if e.response is not None else None
+        if reset:
+            retry_after = max(0.0, float(reset) - time.time())
+    elif isinstance(e, tweepy.TwitterServerError):
+        retryable = True
+    elif isinstance(e, tweepy.HTTPException):
+        retryable = False
+    elif isinstance(e, UploadError):
+        retryable = e.retryable
+    elif isinstance(e, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        retryable = True
+    elif isinstance(e, (FileNotFoundError, ValueError)):
+        retryable = False
+    else:
+        # Неизвестные ошибки повторяются, но число попыток ограничивает планировщик
+        retryable = True
+    
+    return {
+        "success": False,
+        "error": str(e) or type(e).__name__,
+        "retryable": retryable,
+        "retry_after": retry_after
+    }
+
+class TwitterAPI(Publisher):
     """Класс для работы с Twitter API."""
     
-    def __init__(self, api_key: str, api_secret: str, access_token: str, access_secret: str):
+    name = "twitter"
+    title = "Twitter"
+    engagement_batch_size = TWEET_LOOKUP_BATCH_SIZE
+    supports_media_staging = True
+    media_limits = TWITTER_MEDIA_LIMITS
+    
+    def __init__(self, api_key: str, api_secret: str, access_token: str, access_secret: str,
+                 rate_limits: Optional[Dict[str, Tuple[int, float]]] = None, media_store=None):
         """
         Инициализация API для Twitter.
         
@@ -22,7 +126,18 @@ class TwitterAPI:
             api_secret (str): API секрет
             access_token (str): Токен доступа
             access_secret (str): Секрет токена доступа
+            rate_limits (Optional[Dict[str, Tuple[int, float]]]): Лимиты запросов по эндпоинтам,
+                по умолчанию TWITTER_RATE_LIMITS
+            media_store: Хранилище медиафайлов с кэшем media_id (необязательно)
         """
+        self.media_store = media_store
+        
+        # Ограничители частоты запросов общие для всех потоков, которые используют этот клиент
+        self.rate_limiters = {
+            endpoint: TokenBucket.for_window(endpoint, limit, window)
+            for endpoint, (limit, window) in (rate_limits or TWITTER_RATE_LIMITS).items()
+        }
+        
         # Инициализация клиента Twitter API v2
         try:
             self.client = tweepy.Client(
@@ -38,12 +153,48 @@ class TwitterAPI:
             )
             self.api = tweepy.API(auth)
             
+            # Загрузка больших файлов по частям с учетом лимита media_upload
+            self.uploader = ChunkedUploader(self.api, self._call)
+            
             logger.info("Twitter API успешно инициализирован")
         except Exception as e:
             logger.error(f"Ошибка при инициализации Twitter API: {e}")
             # Мы всё равно создаем объект, но он может не работать
             # В реальном приложении лучше обработать ошибку соответствующим образом
     
+    def _call(self, endpoint: str, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Вызов метода tweepy с соблюдением лимита запросов эндпоинта.
+        
+        Args:
+            endpoint (str): Название эндпоинта из TWITTER_RATE_LIMITS
+            func (Callable): Метод tweepy
+            *args: Позиционные аргументы метода
+            **kwargs: Именованные аргументы метода
+            
+        Returns:
+            Any: Ответ tweepy
+        """
+        limiter = self.rate_limiters.get(endpoint)
+        if limiter:
+            with TWITTER_RATE_LIMIT_WAIT_SECONDS.time(endpoint):
+                limiter.acquire()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = func(*args, **kwargs)
+            outcome = "success"
+            return response
+        except tweepy.TooManyRequests as e:
+            outcome = "rate_limited"
+            # Останавливаем все запросы к эндпоинту до сброса окна, чтобы не получить шквал 429
+            if limiter:
+                reset = e.response.headers.get("x-rate-limit-reset") if e.response is not None else None
+                limiter.pause_until(float(reset) if reset else time.time() + 60)
+            raise
+        finally:
+            TWITTER_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, outcome)
+    
     def post_text(self, text: str) -> Dict[str, Any]:
         """
         Публикация текстового сообщения в Twitter.
@@ -60,7 +211,7 @@ class TwitterAPI:
         """
         try:
             # Размещаем твит
-            response = self.client.create_tweet(text=text)
+            response = self._call("tweet_create", self.client.create_tweet, text=text)
             
             # Получаем ID твита
             tweet_id = response.data['id']
@@ -78,25 +229,28 @@ class TwitterAPI:
             }
         except Exception as e:
             logger.error(f"Ошибка при публикации твита: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            return error_result(e)
     
-    def post_with_media(self, text: str, media_path: str, media_type: str) -> Dict[str, Any]:
+    def upload_media(self, media_path: str, media_type: str, wait: bool = True,
+                     timeout: Optional[float] = None) -> Dict[str, Any]:
         """
-        Публикация сообщения с медиафайлом в Twitter.
+        Загрузка медиафайла в Twitter.
+        
+        Изображения загружаются одним запросом, видео - по частям (INIT/APPEND/FINALIZE)
+        с последующей проверкой статуса обработки.
         
         Args:
-            text (str): Текст для публикации
             media_path (str): Путь к медиафайлу
             media_type (str): Тип медиафайла ('photo' или 'video')
+            wait (bool): Дождаться окончания обработки видео на стороне Twitter
+            timeout (Optional[float]): Срок отправки частей видео в секундах (None - без ограничения)
             
         Returns:
             Dict[str, Any]: Результат операции с ключами:
                 - success (bool): Успешность операции
-                - post_id (str, optional): ID созданного поста
-                - post_url (str, optional): URL поста
+                - media_id (str, optional): ID загруженного медиафайла
+                - expires_after_secs (int, optional): Время жизни media_id в секундах
+                - processing_info (dict, optional): Состояние обработки, если wait=False
                 - error (str, optional): Текст ошибки
         """
         try:
@@ -104,32 +258,88 @@ class TwitterAPI:
             if not os.path.exists(media_path):
                 return {
                     "success": False,
-                    "error": f"Файл не найден: {media_path}"
+                    "error": f"Файл не найден: {media_path}",
+                    "retryable": False
                 }
             
-            # Загружаем медиафайл
+            # Этот файл недавно загружался - используем действующий media_id
+            if self.media_store:
+                cached_media_id = self.media_store.get_cached_media_id("twitter", media_path=media_path)
+                if cached_media_id:
+                    logger.info(f"Используется загруженный ранее медиафайл, ID: {cached_media_id}")
+                    return {
+                        "success": True,
+                        "media_id": cached_media_id,
+                        "expires_after_secs": None,
+                        "processing_info": None
+                    }
+            
             if media_type == "photo":
-                media = self.api.media_upload(media_path)
-                media_id = media.media_id
+                media = self._call("media_upload", self.api.media_upload, media_path)
+                upload = {
+                    "success": True,
+                    "media_id": str(media.media_id),
+                    "expires_after_secs": getattr(media, "expires_after_secs", None),
+                    "processing_info": None
+                }
             elif media_type == "video":
-                # Для видео процесс сложнее, нужно использовать media_upload
-                media = self.api.media_upload(
-                    media_path,
-                    media_category='tweet_video'
-                )
-                
-                # Проверяем статус загрузки видео
-                media_id = media.media_id
+                # Видео загружается по частям прямо из файла, без чтения в память целиком
+                deadline = time.monotonic() + timeout if timeout is not None else None
+                upload = self.uploader.upload_file(media_path, MEDIA_CATEGORIES["video"], deadline=deadline)
+                if wait:
+                    self.uploader.wait_for_processing(upload["media_id"], upload["processing_info"])
+                    upload["processing_info"] = None
+                upload["success"] = True
             else:
                 return {
                     "success": False,
-                    "error": f"Неподдерживаемый тип медиафайла: {media_type}"
+                    "error": f"Неподдерживаемый тип медиафайла: {media_type}",
+                    "retryable": False
                 }
             
+            # Обработанный файл можно переиспользовать, пока действует media_id
+            if upload["processing_info"] is None:
+                self.remember_upload(media_path, upload)
+            return upload
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке медиафайла: {e}")
+            return error_result(e)
+    
+    def remember_upload(self, media_path: str, upload: Dict[str, Any]) -> None:
+        """
+        Сохранение media_id загруженного файла в кэш хранилища медиафайлов.
+        
+        Args:
+            media_path (str): Путь к медиафайлу
+            upload (Dict[str, Any]): Результат upload_media
+        """
+        # Для media_id, взятого из кэша, срок действия не продлевается (expires_after_secs = None)
+        if self.media_store and upload.get("expires_after_secs") is not None:
+            self.media_store.cache_media_id(
+                "twitter",
+                upload["media_id"],
+                upload["expires_after_secs"],
+                media_path=media_path
+            )
+    
+    def post_with_media_ids(self, text: str, media_ids: List[str]) -> Dict[str, Any]:
+        """
+        Публикация твита с уже загруженными медиафайлами.
+        
+        Args:
+            text (str): Текст для публикации
+            media_ids (List[str]): ID загруженных медиафайлов
+            
+        Returns:
+            Dict[str, Any]: Результат операции (см. post_text)
+        """
+        try:
             # Публикуем твит с медиа
-            response = self.client.create_tweet(
+            response = self._call(
+                "tweet_create",
+                self.client.create_tweet,
                 text=text,
-                media_ids=[media_id]
+                media_ids=media_ids
             )
             
             # Получаем ID твита
@@ -147,10 +357,40 @@ class TwitterAPI:
             }
         except Exception as e:
             logger.error(f"Ошибка при публикации твита с медиа: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            return error_result(e)
+    
+    def post_with_media(self, text: str, media_path: str, media_type: str) -> Dict[str, Any]:
+        """
+        Публикация сообщения с медиафайлом в Twitter.
+        
+        Args:
+            text (str): Текст для публикации
+            media_path (str): Путь к медиафайлу
+            media_type (str): Тип медиафайла ('photo' или 'video')
+            
+        Returns:
+            Dict[str, Any]: Результат операции с ключами:
+                - success (bool): Успешность операции
+                - post_id (str, optional): ID созданного поста
+                - post_url (str, optional): URL поста
+                - error (str, optional): Текст ошибки
+        """
+        upload = self.upload_media(media_path, media_type)
+        if not upload["success"]:
+            return upload
+        
+        return self.post_with_media_ids(text, [upload["media_id"]])
+    
+    def stage_media(self, media_path: str, media_type: str) -> Dict[str, Any]:
+        """
+        Загрузка медиафайла заранее, до времени публикации запланированного поста
+        (см. Publisher.stage_media). Видео загружается с ожиданием обработки.
+        """
+        return self.upload_media(media_path, media_type)
+    
+    def post_with_staged_media(self, text: str, media_id: str) -> Dict[str, Any]:
+        """Публикация твита с медиафайлом, загруженным через stage_media."""
+        return self.post_with_media_ids(text, [media_id])
     
     def delete_post(self, post_id: str) -> Dict[str, Any]:
         """
@@ -166,7 +406,7 @@ class TwitterAPI:
         """
         try:
             # Удаляем твит
-            self.client.delete_tweet(id=post_id)
+            self._call("tweet_delete", self.client.delete_tweet, id=post_id)
             
             logger.info(f"Твит успешно удален, ID: {post_id}")
             
@@ -175,10 +415,46 @@ class TwitterAPI:
             }
         except Exception as e:
             logger.error(f"Ошибка при удалении твита: {e}")
+            return error_result(e)
+    
+    def get_engagement(self, post_ids: List[str]) -> Dict[str, Any]:
+        """
+        Получение счетчиков нескольких твитов одним запросом GET /2/tweets.
+        
+        Args:
+            post_ids (List[str]): ID твитов (не больше TWEET_LOOKUP_BATCH_SIZE)
+            
+        Returns:
+            Dict[str, Any]: Результат операции с ключами:
+                - success (bool): Успешность операции
+                - engagement (Dict[str, Tuple[int, int, int]], optional): Лайки, ретвиты и ответы
+                  по ID твита; удаленных и недоступных твитов в словаре нет
+                - error (str, optional): Текст ошибки
+        """
+        try:
+            response = self._call(
+                "tweet_lookup",
+                self.client.get_tweets,
+                ids=post_ids,
+                tweet_fields=['public_metrics']
+            )
+            
+            engagement = {}
+            for tweet in response.data or []:
+                metrics = tweet.public_metrics
+                engagement[str(tweet.id)] = (
+                    metrics['like_count'],
+                    metrics['retweet_count'],
+                    metrics['reply_count']
+                )
+            
             return {
-                "success": False,
-                "error": str(e)
+                "success": True,
+                "engagement": engagement
             }
+        except Exception as e:
+            logger.error(f"Ошибка при получении статистики твитов: {e}")
+            return error_result(e)
     
     def get_post_status(self, post_id: str) -> Dict[str, Any]:
         """
@@ -222,4 +498,257 @@ class TwitterAPI:
             return {
                 "exists": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+
+class AsyncTwitterAPI:
+    """
+    Асинхронная обертка над TwitterAPI.
+
+    Синхронные вызовы tweepy выполняются в ограниченном пуле потоков, поэтому
+    обработчики Telegram не блокируют цикл событий во время загрузки медиа.
+    """
+
+    def __init__(self, twitter_api: TwitterAPI, max_workers: int = 4, timeout: float = 120.0):
+        """
+        Инициализация асинхронного API.
+
+        Args:
+            twitter_api (TwitterAPI): Синхронный клиент Twitter
+            max_workers (int): Максимальное число одновременных запросов к Twitter
+            timeout (float): Таймаут одного вызова в секундах
+        """
+        self.twitter_api = twitter_api
+        self.timeout = timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="twitter-api"
+        )
+
+    def upload_timeout(self, media_path: str) -> float:
+        """
+        Срок загрузки медиафайла: таймаут вызова плюс передача файла на скорости
+        UPLOAD_MIN_BYTES_PER_SEC.
+
+        Args:
+            media_path (str): Путь к медиафайлу
+
+        Returns:
+            float: Срок в секундах
+        """
+        try:
+            size = os.path.getsize(media_path)
+        except OSError:
+            size = 0
+        return self.timeout + size / UPLOAD_MIN_BYTES_PER_SEC
+
+    async def _execute(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None) -> Any:
+        """
+        Выполнение синхронной функции в пуле потоков с таймаутом.
+
+        Args:
+            func (Callable): Синхронная функция
+            *args: Аргументы функции
+            timeout (Optional[float]): Таймаут в секундах, по умолчанию self.timeout
+
+        Returns:
+            Any: Результат функции
+
+        Raises:
+            asyncio.TimeoutError: Если функция не завершилась за отведенное время
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(func, *args))
+        return await asyncio.wait_for(future, timeout=timeout)
+
+    async def _run(self, func: Callable[..., Dict[str, Any]], *args: Any,
+                   timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Выполнение синхронного метода TwitterAPI, который можно безопасно повторить
+        (загрузка, удаление, чтение), в пуле потоков с таймаутом.
+
+        Args:
+            func (Callable): Метод TwitterAPI
+            *args: Аргументы метода
+            timeout (Optional[float]): Таймаут в секундах, по умолчанию self.timeout
+
+        Returns:
+            Dict[str, Any]: Результат метода или описание ошибки таймаута
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        try:
+            return await self._execute(func, *args, timeout=timeout)
+        except asyncio.TimeoutError:
+            # Поток нельзя прервать, поэтому запрос может завершиться позже,
+            # но обработчик больше не ждет его результата
+            logger.error(f"Превышено время ожидания ответа Twitter ({timeout:.0f} с) для {func.__name__}")
+            return {
+                "success": False,
+                "error": f"Превышено время ожидания ответа Twitter ({timeout:.0f} с)",
+                "retryable": True
+            }
+
+    async def _create(self, func: Callable[..., Dict[str, Any]], *args: Any) -> Dict[str, Any]:
+        """
+        Создание твита в пуле потоков. Повтор после таймаута может опубликовать твит
+        дважды, поэтому по истечении self.timeout запрос не бросается, а результат
+        помечается как неизвестный (см. publishers.wait_for_outcome).
+
+        Args:
+            func (Callable): Метод TwitterAPI, создающий твит
+            *args: Аргументы метода
+
+        Returns:
+            Dict[str, Any]: Результат метода или результат с ключами outcome_unknown и outcome
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(func, *args))
+        return await wait_for_outcome(future, self.timeout, "Twitter")
+
+    async def post_text(self, text: str) -> Dict[str, Any]:
+        """Асинхронная публикация текстового твита (см. TwitterAPI.post_text)."""
+        return await self._create(self.twitter_api.post_text, text)
+
+    async def post_with_media(self, text: str, media_path: str, media_type: str) -> Dict[str, Any]:
+        """
+        Асинхронная публикация твита с медиафайлом (см. TwitterAPI.post_with_media).
+        
+        Статус обработки видео проверяется через asyncio.sleep, поэтому поток пула
+        не занят, пока Twitter обрабатывает файл.
+        """
+        upload = await self.stage_media(media_path, media_type)
+        if not upload["success"]:
+            return upload
+        
+        return await self._create(self.twitter_api.post_with_media_ids, text, [upload["media_id"]])
+    
+    async def stage_media(self, media_path: str, media_type: str) -> Dict[str, Any]:
+        """
+        Асинхронная загрузка медиафайла с ожиданием обработки (см. TwitterAPI.stage_media).
+        
+        Срок загрузки растет с размером файла (см. upload_timeout); после него поток
+        перестает отправлять части.
+        """
+        timeout = self.upload_timeout(media_path)
+        upload = await self._run(self.twitter_api.upload_media, media_path, media_type, False, timeout,
+                                 timeout=timeout)
+        if not upload["success"]:
+            return upload
+        
+        if upload.get("processing_info"):
+            try:
+                await self.twitter_api.uploader.wait_for_processing_async(
+                    upload["media_id"],
+                    upload["processing_info"],
+                    self.executor
+                )
+            except Exception as e:
+                logger.error(f"Ошибка при обработке медиафайла: {e}")
+                return error_result(e)
+            upload["processing_info"] = None
+            await self._execute(self.twitter_api.remember_upload, media_path, upload)
+        
+        return upload
+    
+    async def post_with_staged_media(self, text: str, media_id: str) -> Dict[str, Any]:
+        """Асинхронная публикация твита с медиафайлом, загруженным заранее."""
+        return await self._create(self.twitter_api.post_with_media_ids, text, [media_id])
+    
+    async def post_with_media_ids(self, text: str, media_ids: List[str]) -> Dict[str, Any]:
+        """Асинхронная публикация твита с уже загруженными медиафайлами (см. TwitterAPI.post_with_media_ids)."""
+        return await self._create(self.twitter_api.post_with_media_ids, text, media_ids)
+    
+    async def publish(self, text: str, media_path: Optional[str] = None,
+                      media_type: Optional[str] = None) -> Dict[str, Any]:
+        """Асинхронная публикация черновика для PublisherRegistry (см. Publisher.publish)."""
+        if media_path and media_type:
+            return await self.post_with_media(text, media_path, media_type)
+        return await self.post_text(text)
+
+    async def post_with_media_stream(self, text: str, chunks: AsyncIterator[bytes], total_bytes: int,
+                                     mime_type: str, media_type: str) -> Dict[str, Any]:
+        """
+        Публикация твита с медиафайлом, который передается потоком без записи на диск.
+
+        Поступающие байты собираются в части размера uploader.chunk_size и сразу
+        отправляются командой APPEND, пока продолжается чтение источника.
+
+        Args:
+            text (str): Текст для публикации
+            chunks (AsyncIterator[bytes]): Источник содержимого файла
+            total_bytes (int): Размер файла в байтах
+            mime_type (str): MIME-тип файла
+            media_type (str): Тип медиафайла ('photo' или 'video')
+
+        Returns:
+            Dict[str, Any]: Результат операции (см. TwitterAPI.post_with_media) с дополнительными
+                ключами media_id и expires_after_secs при успехе
+        """
+        uploader = self.twitter_api.uploader
+        category = MEDIA_CATEGORIES.get(media_type)
+        if category is None:
+            return {
+                "success": False,
+                "error": f"Неподдерживаемый тип медиафайла: {media_type}",
+                "retryable": False
+            }
+
+        tasks = []
+        try:
+            media_id = await self._execute(uploader.init, total_bytes, mime_type, category)
+
+            # Одновременно отправляется не больше max_parallel частей, поэтому в памяти
+            # находится ограниченное число частей независимо от размера файла
+            slots = asyncio.Semaphore(uploader.max_parallel)
+
+            async def append(segment_index: int, segment: bytes) -> None:
+                try:
+                    await self._execute(uploader.append, media_id, segment_index, segment)
+                finally:
+                    slots.release()
+
+            buffer = bytearray()
+            segment_index = 0
+            received = 0
+            async for piece in chunks:
+                buffer += piece
+                received += len(piece)
+                while len(buffer) >= uploader.chunk_size or (received >= total_bytes and buffer):
+                    segment = bytes(buffer[:uploader.chunk_size])
+                    del buffer[:uploader.chunk_size]
+                    await slots.acquire()
+                    tasks.append(asyncio.ensure_future(append(segment_index, segment)))
+                    segment_index += 1
+            if buffer:
+                await slots.acquire()
+                tasks.append(asyncio.ensure_future(append(segment_index, bytes(buffer))))
+
+            await asyncio.gather(*tasks)
+            upload = await self._execute(uploader.finalize, media_id)
+            await uploader.wait_for_processing_async(media_id, upload["processing_info"], self.executor)
+        except Exception as e:
+            for task in tasks:
+                task.cancel()
+            logger.error(f"Ошибка при потоковой загрузке медиафайла: {e}")
+            return error_result(e)
+
+        result = await self._create(self.twitter_api.post_with_media_ids, text, [media_id])
+        if result["success"]:
+            result["media_id"] = media_id
+            result["expires_after_secs"] = upload["expires_after_secs"]
+        return result
+
+    async def delete_post(self, post_id: str) -> Dict[str, Any]:
+        """Асинхронное удаление твита (см. TwitterAPI.delete_post)."""
+        return await self._run(self.twitter_api.delete_post, post_id)
+
+    async def get_post_status(self, post_id: str) -> Dict[str, Any]:
+        """Асинхронное получение статуса твита (см. TwitterAPI.get_post_status)."""
+        result = await self._run(self.twitter_api.get_post_status, post_id)
+        if "exists" not in result:
+            result["exists"] = False
+        return result
+
+    def close(self) -> None:
+        """Остановка пула потоков без ожидания незавершенных запросов."""
+        self.executor.shutdown(wait=False)
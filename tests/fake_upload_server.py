@@ -0,0 +1,172 @@
+import json
+import threading
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+class FakeUploadServer:
+    """
+    Локальный HTTP-сервер, повторяющий команды загрузки Twitter media/upload
+    (INIT/APPEND/FINALIZE/STATUS) для тестов ChunkedUploader без сети.
+    
+    Части хранятся по segment_index и собираются при FINALIZE, поэтому порядок их
+    прихода не важен. Поведение настраивается атрибутами:
+        fail_segments: {segment_index: сколько первых попыток APPEND вернуть 503}
+        segment_delays: {segment_index: задержка ответа APPEND в секундах}
+        processing_states: состояния, которые по очереди вернут FINALIZE и STATUS
+    """
+    
+    def __init__(self):
+        self.fail_segments: Dict[int, int] = {}
+        self.segment_delays: Dict[int, float] = {}
+        self.processing_states: List[str] = []
+        self.uploads: Dict[str, Dict[str, Any]] = {}
+        self.appends: List[int] = []  # Порядок успешных APPEND
+        self.status_requests = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._next_id = 1000
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,), daemon=True)
+    
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/media/upload"
+    
+    def start(self) -> "FakeUploadServer":
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+    
+    def data(self, media_id: str) -> bytes:
+        """Содержимое, собранное при FINALIZE."""
+        return self.uploads[media_id]["data"]
+    
+    def _processing_info(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if not self.processing_states:
+                return None
+            state = self.processing_states.pop(0)
+        info = {"state": state, "check_after_secs": 0}
+        if state == "failed":
+            info["error"] = {"message": "InvalidMedia"}
+        return info
+    
+    def _handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def _reply(self, status: int, body: Optional[Dict[str, Any]] = None) -> None:
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def do_GET(self):
+                query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+                if query.get("command") != "STATUS":
+                    return self._reply(400)
+                with server._lock:
+                    server.status_requests += 1
+                self._reply(200, {"media_id": query["media_id"], "processing_info": server._processing_info()})
+            
+            def do_POST(self):
+                query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                command = query.get("command")
+                
+                if command == "INIT":
+                    with server._lock:
+                        server._next_id += 1
+                        media_id = str(server._next_id)
+                        server.uploads[media_id] = {
+                            "total_bytes": int(query["total_bytes"]),
+                            "segments": {},
+                            "data": None
+                        }
+                    return self._reply(202, {"media_id": media_id})
+                
+                if command == "APPEND":
+                    index = int(query["segment_index"])
+                    with server._lock:
+                        if server.fail_segments.get(index, 0) > 0:
+                            server.fail_segments[index] -= 1
+                            fail = True
+                        else:
+                            fail = False
+                            server._in_flight += 1
+                            server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                    if fail:
+                        return self._reply(503)
+                    threading.Event().wait(server.segment_delays.get(index, 0))
+                    with server._lock:
+                        server._in_flight -= 1
+                        server.uploads[query["media_id"]]["segments"][index] = body
+                        server.appends.append(index)
+                    return self._reply(204)
+                
+                if command == "FINALIZE":
+                    upload = server.uploads[query["media_id"]]
+                    segments = upload["segments"]
+                    if sorted(segments) != list(range(len(segments))):
+                        return self._reply(400, {"error": "missing segments"})
+                    upload["data"] = b"".join(segments[index] for index in sorted(segments))
+                    if len(upload["data"]) != upload["total_bytes"]:
+                        return self._reply(400, {"error": "size mismatch"})
+                    return self._reply(200, {
+                        "media_id": query["media_id"],
+                        "expires_after_secs": 86400,
+                        "processing_info": server._processing_info()
+                    })
+                
+                self._reply(400)
+        
+        return Handler
+
+class FakeUploadAPI:
+    """Клиент FakeUploadServer с методами tweepy.API, которые использует ChunkedUploader."""
+    
+    def __init__(self, url: str):
+        self.url = url
+    
+    def _request(self, params: Dict[str, Any], data: Optional[bytes] = None) -> SimpleNamespace:
+        url = f"{self.url}?{urllib.parse.urlencode(params)}"
+        if params["command"] == "STATUS":
+            request = urllib.request.Request(url, method="GET")
+        else:
+            request = urllib.request.Request(url, data=data or b"", method="POST")
+        with urllib.request.urlopen(request, timeout=10) as response:
+            payload = response.read()
+        return SimpleNamespace(**json.loads(payload)) if payload else SimpleNamespace()
+    
+    def chunked_upload_init(self, total_bytes: int, mime_type: str, media_category: str = None):
+        return self._request({
+            "command": "INIT",
+            "total_bytes": total_bytes,
+            "media_type": mime_type,
+            "media_category": media_category
+        })
+    
+    def chunked_upload_append(self, media_id: str, data, segment_index: int):
+        return self._request(
+            {"command": "APPEND", "media_id": media_id, "segment_index": segment_index},
+            bytes(data)
+        )
+    
+    def chunked_upload_finalize(self, media_id: str):
+        return self._request({"command": "FINALIZE", "media_id": media_id})
+    
+    def get_media_upload_status(self, media_id: str):
+        return self._request({"command": "STATUS", "media_id": media_id})
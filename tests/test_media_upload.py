@@ -0,0 +1,108 @@
+import os
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import media_upload
+from media_upload import ChunkedUploader, UploadError
+from fake_upload_server import FakeUploadAPI, FakeUploadServer
+
+CHUNK = 64 * 1024
+
+@pytest.fixture
+def server():
+    server = FakeUploadServer().start()
+    yield server
+    server.stop()
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Пауза между повторами APPEND не нужна тестам."""
+    monkeypatch.setattr(media_upload, "time", SimpleNamespace(sleep=lambda secs: None, monotonic=time.monotonic))
+
+@pytest.fixture
+def calls():
+    return []
+
+@pytest.fixture
+def uploader(server, calls):
+    def call(endpoint, func, *args, **kwargs):
+        calls.append((endpoint, func.__name__))
+        return func(*args, **kwargs)
+    return ChunkedUploader(FakeUploadAPI(server.url), call, chunk_size=CHUNK, max_parallel=4)
+
+@pytest.fixture
+def media_file(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(os.urandom(5 * CHUNK + 123))
+    return str(path)
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def test_upload_file_reassembles_chunks(server, uploader, media_file):
+    upload = uploader.upload_file(media_file, "tweet_video")
+    
+    assert server.data(upload["media_id"]) == read(media_file)
+    assert upload["expires_after_secs"] == 86400
+    assert upload["processing_info"] is None
+
+def test_failed_chunk_is_retried_alone(server, uploader, media_file):
+    server.fail_segments = {2: 2}
+    
+    upload = uploader.upload_file(media_file, "tweet_video")
+    
+    assert server.data(upload["media_id"]) == read(media_file)
+    # Успешно отправленные части не повторяются
+    assert sorted(server.appends) == list(range(6))
+
+def test_chunk_gives_up_after_max_retries(server, uploader, media_file):
+    server.fail_segments = {1: uploader.max_retries}
+    
+    with pytest.raises(UploadError, match="часть 1"):
+        uploader.upload_file(media_file, "tweet_video")
+
+def test_parallel_appends_arrive_out_of_order(server, uploader, media_file):
+    # Первая часть отвечает дольше остальных, поэтому следующие приходят раньше нее
+    server.segment_delays = {0: 0.3}
+    
+    upload = uploader.upload_file(media_file, "tweet_video")
+    
+    assert server.max_in_flight > 1
+    assert server.appends[0] != 0
+    assert server.data(upload["media_id"]) == read(media_file)
+
+def test_upload_stops_after_deadline(server, uploader, media_file):
+    with pytest.raises(UploadError, match="Превышено время загрузки"):
+        uploader.upload_file(media_file, "tweet_video", deadline=time.monotonic() - 1)
+    assert server.appends == []
+
+def test_finalize_then_status_polling(server, uploader, media_file, calls):
+    server.processing_states = ["pending", "in_progress", "in_progress", "succeeded"]
+    
+    upload = uploader.upload_file(media_file, "tweet_video")
+    assert upload["processing_info"]["state"] == "pending"
+    uploader.wait_for_processing(upload["media_id"], upload["processing_info"])
+    
+    assert server.status_requests == 3
+    # STATUS проходит через ограничитель запросов, как и остальные команды
+    assert calls.count(("media_upload", "get_media_upload_status")) == 3
+
+def test_status_polling_async(server, uploader, media_file):
+    server.processing_states = ["pending", "succeeded"]
+    
+    upload = uploader.upload_file(media_file, "tweet_video")
+    asyncio.run(uploader.wait_for_processing_async(upload["media_id"], upload["processing_info"]))
+    
+    assert server.status_requests == 1
+
+def test_failed_processing_is_not_retryable(server, uploader, media_file):
+    server.processing_states = ["pending", "failed"]
+    
+    upload = uploader.upload_file(media_file, "tweet_video")
+    with pytest.raises(UploadError, match="InvalidMedia") as error:
+        uploader.wait_for_processing(upload["media_id"], upload["processing_info"])
+    assert error.value.retryable is False
@@ -0,0 +1,114 @@
+import os
+import time
+import queue
+import sqlite3
+import asyncio
+import multiprocessing
+
+from db_manager import DatabaseManager
+from publishers import FakePublisher, PublisherRegistry
+from scheduler import AsyncPostScheduler, PostScheduler
+from timeutils import now_ms
+
+POSTS = 300
+WORKERS = ("thread", "async", "thread")
+RUN_TIMEOUT = 60  # Предельное время работы одного процесса в секундах
+
+def unfinished(db_path):
+    """Количество постов, которые еще не опубликованы."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            "SELECT COUNT(*) FROM scheduled_posts WHERE status IN ('pending', 'claimed')"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+def run_worker(kind, db_path, media_root, start, results):
+    """Процесс бота: свой планировщик и FakePublisher поверх общей базы данных."""
+    db_manager = DatabaseManager(db_path, media_root=media_root)
+    publisher = FakePublisher("fake", delay=0.002)
+    registry = PublisherRegistry()
+    registry.register(publisher)
+    owner = f"{kind}-{os.getpid()}"
+    
+    start.wait()
+    deadline = time.monotonic() + RUN_TIMEOUT
+    if kind == "thread":
+        scheduler = PostScheduler(db_manager, registry, owner=owner, media_prestage=0)
+        scheduler.start()
+        while unfinished(db_path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        scheduler.stop()
+    else:
+        async def main():
+            scheduler = AsyncPostScheduler(db_manager, registry, owner=owner, media_prestage=0)
+            scheduler.start()
+            while unfinished(db_path) and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            await scheduler.aclose()
+        asyncio.run(main())
+    
+    registry.close()
+    db_manager.close()
+    results.put([post["text"] for post in publisher.posts.values()])
+
+def test_each_post_is_published_once_across_processes(tmp_path):
+    db_path = str(tmp_path / "bot.db")
+    media_root = str(tmp_path / "media")
+    db_manager = DatabaseManager(db_path, media_root=media_root)
+    now = now_ms()
+    posts = db_manager.add_scheduled_posts(
+        1, [("fake", f"post {i}", None, None, now) for i in range(POSTS)]
+    )
+    post_ids = [post_id for post_id, _ in posts]
+    
+    # Процесс-владелец завершился во время публикации: у первого поста захват истек,
+    # второй уже опубликован, но не записан в историю
+    lease_start = time.time() - 60
+    db_manager.claim_scheduled_post(post_ids[0], "dead", 1, lease_start)
+    db_manager.claim_scheduled_post(post_ids[1], "dead", 1, lease_start)
+    db_manager.record_scheduled_publication(post_ids[1], "dead", "published-by-dead")
+    db_manager.close()
+    
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=run_worker, args=(kind, db_path, media_root, start, results))
+        for kind in WORKERS
+    ]
+    for process in processes:
+        process.start()
+    start.set()
+    
+    published = []
+    try:
+        for _ in processes:
+            published.extend(results.get(timeout=RUN_TIMEOUT + 30))
+    except queue.Empty:
+        raise AssertionError("Процесс бота не завершился вовремя")
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+    
+    # Пост, опубликованный завершившимся владельцем, не публикуется повторно
+    expected = sorted(f"post {i}" for i in range(POSTS) if i != 1)
+    assert sorted(published) == expected
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        statuses = dict(conn.execute("SELECT status, COUNT(*) FROM scheduled_posts GROUP BY status"))
+        history = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT idempotency_key) FROM posts WHERE platform = 'fake'"
+        ).fetchone()
+        recorded = conn.execute(
+            "SELECT social_post_id FROM scheduled_posts WHERE id = ?", (post_ids[1],)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    assert statuses == {"published": POSTS}
+    assert history == (POSTS, POSTS)
+    assert recorded == "published-by-dead"
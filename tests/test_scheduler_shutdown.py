@@ -0,0 +1,79 @@
+import time
+import sqlite3
+import asyncio
+
+from db_manager import DatabaseManager
+from publishers import FakePublisher, PublisherRegistry
+from scheduler import AsyncPostScheduler, PostScheduler
+from timeutils import now_ms
+
+POSTS = 40
+CONCURRENCY = 2
+DELAY = 0.1
+
+def statuses(db_path):
+    """Количество постов по статусам."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM scheduled_posts GROUP BY status"))
+    finally:
+        conn.close()
+
+def make_backlog(tmp_path):
+    """База с POSTS наступившими постами и реестр с медленным FakePublisher."""
+    db_path = str(tmp_path / "bot.db")
+    db_manager = DatabaseManager(db_path, media_root=str(tmp_path / "media"))
+    now = now_ms()
+    db_manager.add_scheduled_posts(1, [("fake", f"post {i}", None, None, now) for i in range(POSTS)])
+    publisher = FakePublisher("fake", delay=DELAY)
+    registry = PublisherRegistry()
+    registry.register(publisher)
+    return db_path, db_manager, publisher, registry
+
+def test_aclose_cancels_dispatches_waiting_for_a_slot(tmp_path):
+    db_path, db_manager, publisher, registry = make_backlog(tmp_path)
+    
+    async def main():
+        scheduler = AsyncPostScheduler(db_manager, registry, concurrency=CONCURRENCY, media_prestage=0)
+        scheduler.start()
+        await asyncio.sleep(DELAY / 2)
+        await scheduler.aclose()
+        
+        # Дождались только публикаций, которые уже заняли место
+        published = len(publisher.posts)
+        assert 0 < published <= CONCURRENCY
+        assert not scheduler._in_flight
+        assert statuses(db_path) == {"published": published, "pending": POSTS - published}
+        
+        # Отмененные посты загружаются снова при следующем запуске (например, после
+        # возвращения роли ведущего)
+        scheduler.start()
+        while statuses(db_path).get("pending"):
+            await asyncio.sleep(0.05)
+        await scheduler.aclose()
+    
+    asyncio.run(main())
+    assert len(publisher.posts) == POSTS
+    registry.close()
+    db_manager.close()
+
+def test_stop_cancels_dispatches_queued_in_the_pool(tmp_path):
+    db_path, db_manager, publisher, registry = make_backlog(tmp_path)
+    scheduler = PostScheduler(db_manager, registry, concurrency=CONCURRENCY, media_prestage=0)
+    scheduler.start()
+    time.sleep(DELAY / 2)
+    scheduler.stop()
+    
+    published = len(publisher.posts)
+    assert 0 < published <= CONCURRENCY
+    assert not scheduler._in_flight
+    assert statuses(db_path) == {"published": published, "pending": POSTS - published}
+    
+    scheduler.start()
+    deadline = time.monotonic() + 30
+    while statuses(db_path).get("pending") and time.monotonic() < deadline:
+        time.sleep(0.05)
+    scheduler.stop()
+    assert len(publisher.posts) == POSTS
+    registry.close()
+    db_manager.close()
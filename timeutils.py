@@ -0,0 +1,72 @@
+import time
+import logging
+import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Формат отображения времени публикации пользователю
+DISPLAY_FORMAT = "%d.%m.%Y %H:%M"
+
+def now_ms() -> int:
+    """Текущее время в миллисекундах Unix."""
+    return time.time_ns() // 1000000
+
+def to_epoch_ms(moment: datetime.datetime, tz: Optional[datetime.tzinfo] = None) -> int:
+    """
+    Перевод времени в миллисекунды Unix.
+    
+    Args:
+        moment (datetime.datetime): Время; без часового пояса считается временем в поясе tz
+        tz (Optional[datetime.tzinfo]): Часовой пояс (None - пояс сервера)
+    
+    Returns:
+        int: Время в миллисекундах Unix
+    """
+    if moment.tzinfo is None and tz is not None:
+        moment = moment.replace(tzinfo=tz)
+    return round(moment.timestamp() * 1000)
+
+def from_epoch_ms(value: int, tz: Optional[datetime.tzinfo] = None) -> datetime.datetime:
+    """
+    Перевод миллисекунд Unix во время часового пояса.
+    
+    Args:
+        value (int): Время в миллисекундах Unix
+        tz (Optional[datetime.tzinfo]): Часовой пояс (None - пояс сервера, время без tzinfo)
+    
+    Returns:
+        datetime.datetime: Время в поясе tz
+    """
+    return datetime.datetime.fromtimestamp(value / 1000, tz)
+
+def format_epoch_ms(value: int, tz: Optional[datetime.tzinfo] = None, fmt: str = DISPLAY_FORMAT) -> str:
+    """Время в миллисекундах Unix в виде строки для пользователя в поясе tz."""
+    return from_epoch_ms(value, tz).strftime(fmt)
+
+def get_timezone(name: Optional[str]) -> Optional[datetime.tzinfo]:
+    """
+    Часовой пояс по имени базы IANA (например, Europe/Moscow).
+    
+    Args:
+        name (Optional[str]): Имя часового пояса (пустое - пояс сервера)
+    
+    Returns:
+        Optional[datetime.tzinfo]: Часовой пояс или None для пояса сервера
+    
+    Raises:
+        ValueError: Если часовой пояс не найден
+    """
+    if not name:
+        return None
+    try:
+        # ZoneInfo кэширует пояса, повторный вызов не читает файл базы
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, OSError):
+        raise ValueError(f"Неизвестный часовой пояс: {name}")
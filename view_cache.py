@@ -0,0 +1,180 @@
+import sys
+import time
+import logging
+import threading
+import collections
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+from metrics import Counter, Gauge
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Параметры кэша отображений
+VIEW_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Примерный предельный объем кэша в байтах
+VIEW_CACHE_TTL = 5 * 60  # Время жизни записи в секундах (изменения из других процессов)
+ENTRY_OVERHEAD = 512  # Оценка накладных расходов на запись (ключ, клавиатура, структуры) в байтах
+USER_VERSIONS_MAX = 4096  # Сколько последних сбросов помнить по пользователям
+
+VIEW_CACHE_REQUESTS = Counter(
+    "view_cache_requests",
+    "Обращения к кэшу отображений по результату",
+    ("view", "result")
+)
+VIEW_CACHE_BYTES = Gauge(
+    "view_cache_bytes",
+    "Примерный объем кэша отображений в байтах"
+)
+VIEW_CACHE_ENTRIES = Gauge(
+    "view_cache_entries",
+    "Количество записей в кэше отображений"
+)
+VIEW_CACHE_HIT_RATIO = Gauge(
+    "view_cache_hit_ratio",
+    "Доля обращений к кэшу отображений, обслуженных без базы данных"
+)
+
+class ViewCache:
+    """
+    Кэш готовых отображений (/history, /scheduled) по пользователям с вытеснением LRU
+    и ограничением объема.
+    
+    Записи пользователя сбрасываются методами записи DatabaseManager, поэтому повторный
+    просмотр без изменений не обращается к базе данных. Изменения, сделанные другими
+    процессами бота, становятся видны не позже чем через ttl секунд.
+    """
+    
+    def __init__(self, max_bytes: int = VIEW_CACHE_MAX_BYTES, ttl: float = VIEW_CACHE_TTL):
+        """
+        Инициализация кэша.
+        
+        Args:
+            max_bytes (int): Примерный предельный объем в байтах (0 - кэш отключен)
+            ttl (float): Время жизни записи в секундах
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # (user_id, вид, ключ) -> (значение, размер, время истечения)
+        self._entries: "collections.OrderedDict[Tuple, Tuple[Any, int, float]]" = collections.OrderedDict()
+        self._by_user: Dict[int, Set[Tuple]] = {}
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        # Номер последнего сброса и номера последних сбросов пользователей: значение,
+        # прочитанное из базы данных до сброса, не должно попасть в кэш после него.
+        # Помнятся только USER_VERSIONS_MAX последних сбросов; для остальных пользователей
+        # берется наибольший забытый номер, что лишь иногда отклоняет долгие построения
+        self._version = 0
+        self._user_versions: "collections.OrderedDict[int, int]" = collections.OrderedDict()
+        self._forgotten_version = 0
+        self._lock = threading.Lock()
+        
+        VIEW_CACHE_BYTES.set_function(lambda: self._size)
+        VIEW_CACHE_ENTRIES.set_function(lambda: len(self._entries))
+        VIEW_CACHE_HIT_RATIO.set_function(self.hit_ratio)
+    
+    def version(self) -> int:
+        """Номер состояния кэша; передается в put для значения, прочитанного после этого вызова."""
+        with self._lock:
+            return self._version
+    
+    def get(self, user_id: int, view: str, key: Hashable = ()) -> Optional[Tuple]:
+        """
+        Получение отображения из кэша.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            view (str): Вид отображения (history, scheduled)
+            key (Hashable): Параметры отображения (например, страница)
+        
+        Returns:
+            Optional[Tuple]: Сохраненное значение или None
+        """
+        entry_key = (user_id, view, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[2] <= time.time():
+                self._remove(entry_key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._entries.move_to_end(entry_key)
+        VIEW_CACHE_REQUESTS.inc(view, "miss" if entry is None else "hit")
+        return None if entry is None else entry[0]
+    
+    def put(self, user_id: int, view: str, key: Hashable, value: Tuple, version: int,
+            expires_at: Optional[float] = None) -> None:
+        """
+        Сохранение отображения.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            view (str): Вид отображения
+            key (Hashable): Параметры отображения
+            value (Tuple): Значение (строки учитываются в объеме)
+            version (int): Результат version(), полученный до чтения данных из базы
+            expires_at (Optional[float]): Время, после которого отображение устареет
+                без изменений в базе данных (в секундах Unix)
+        """
+        size = ENTRY_OVERHEAD + sum(sys.getsizeof(item) for item in value if isinstance(item, str))
+        if size > self.max_bytes:
+            return
+        expiry = time.time() + self.ttl
+        if expires_at is not None:
+            expiry = min(expiry, expires_at)
+        
+        entry_key = (user_id, view, key)
+        with self._lock:
+            if self._user_versions.get(user_id, self._forgotten_version) > version:
+                # Данные пользователя изменились, пока отображение строилось
+                return
+            if entry_key in self._entries:
+                self._remove(entry_key)
+            self._entries[entry_key] = (value, size, expiry)
+            self._by_user.setdefault(user_id, set()).add(entry_key)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+    
+    def invalidate(self, user_id: int, view: Optional[str] = None) -> None:
+        """
+        Сброс отображений пользователя после изменения его данных.
+        
+        Args:
+            user_id (int): ID пользователя Telegram
+            view (Optional[str]): Вид отображения (None - все виды)
+        """
+        with self._lock:
+            self._version += 1
+            self._user_versions[user_id] = self._version
+            self._user_versions.move_to_end(user_id)
+            if len(self._user_versions) > USER_VERSIONS_MAX:
+                _, self._forgotten_version = self._user_versions.popitem(last=False)
+            for entry_key in list(self._by_user.get(user_id, ())):
+                if view is None or entry_key[1] == view:
+                    self._remove(entry_key)
+    
+    def _remove(self, entry_key: Tuple) -> None:
+        """Удаление записи. Вызывается под self._lock."""
+        _, size, _ = self._entries.pop(entry_key)
+        self._size -= size
+        user_keys = self._by_user[entry_key[0]]
+        user_keys.discard(entry_key)
+        if not user_keys:
+            del self._by_user[entry_key[0]]
+    
+    def hit_ratio(self) -> float:
+        """Доля обращений, обслуженных из кэша."""
+        total = self._hits + self._misses
+        return self._hits / total if total else 0.0
+    
+    def __len__(self) -> int:
+        """Количество записей в кэше."""
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,220 @@
+import ssl
+import hmac
+import json
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+from telegram import Update
+
+from metrics import Counter
+
+# Настройка логирования
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Параметры приема обновлений
+MAX_BODY_SIZE = 1024 * 1024  # Максимальный размер тела запроса в байтах
+MAX_HEADER_SIZE = 16 * 1024  # Максимальный размер заголовков запроса в байтах
+MAX_PENDING_UPDATES = 1000  # Количество необработанных обновлений, после которого прием замедляется
+BACKPRESSURE_TIMEOUT = 5.0  # Время ожидания освобождения очереди перед ответом 503 в секундах
+KEEPALIVE_TIMEOUT = 75.0  # Время ожидания следующего запроса в открытом соединении в секундах
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+WEBHOOK_RESPONSES = Counter(
+    "webhook_responses",
+    "Ответы webhook-сервера по коду",
+    ("status",)
+)
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+class WebhookServer:
+    """
+    Встроенный асинхронный HTTP-сервер для приема обновлений Telegram через webhook.
+    
+    Проверяет секретный токен из заголовка X-Telegram-Bot-Api-Secret-Token, декодирует
+    обновления и передает их в очередь Application. Если обработчики не успевают,
+    ответ задерживается, а затем возвращается 503 - Telegram повторит доставку позже.
+    """
+    
+    def __init__(self, application, secret_token: str, listen: str = "0.0.0.0", port: int = 8443,
+                 url_path: str = "/", ssl_context: Optional[ssl.SSLContext] = None,
+                 max_body_size: int = MAX_BODY_SIZE, max_pending_updates: int = MAX_PENDING_UPDATES):
+        """
+        Инициализация сервера.
+        
+        Args:
+            application (telegram.ext.Application): Инициализированное приложение бота
+            secret_token (str): Секретный токен, переданный Telegram в set_webhook
+            listen (str): Адрес, на котором принимаются соединения
+            port (int): Порт, на котором принимаются соединения
+            url_path (str): Путь webhook
+            ssl_context (Optional[ssl.SSLContext]): Контекст TLS, если сервер не за обратным прокси
+            max_body_size (int): Максимальный размер тела запроса в байтах
+            max_pending_updates (int): Порог очереди обновлений для обратного давления
+        """
+        self.application = application
+        self.secret_token = secret_token.encode()
+        self.listen = listen
+        self.port = port
+        self.url_path = url_path
+        self.ssl_context = ssl_context
+        self.max_body_size = max_body_size
+        self.max_pending_updates = max_pending_updates
+        self._server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self) -> None:
+        """Запуск приема соединений."""
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            self.listen,
+            self.port,
+            ssl=self.ssl_context,
+            limit=MAX_HEADER_SIZE
+        )
+        logger.info(f"Webhook-сервер слушает {self.listen}:{self.port}{self.url_path}")
+    
+    async def stop(self) -> None:
+        """Остановка приема соединений."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            logger.info("Webhook-сервер остановлен")
+    
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str]]]:
+        """
+        Чтение строки запроса и заголовков.
+        
+        Returns:
+            Optional[Tuple[str, str, Dict[str, str]]]: Метод, путь и заголовки (в нижнем регистре)
+                или None, если клиент закрыл соединение
+        """
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        
+        lines = head.decode("latin-1").split("\r\n")
+        method, path, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if not line:
+                continue
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return method, path, headers
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Обработка запросов в одном соединении (Telegram переиспользует соединения)."""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (asyncio.LimitOverrunError, ValueError):
+                    await self._respond(writer, 400, keep_alive=False)
+                    return
+                if request is None:
+                    return
+                
+                method, path, headers = request
+                status, keep_alive = await self._handle_request(reader, method, path, headers)
+                WEBHOOK_RESPONSES.inc(str(status))
+                await self._respond(writer, status, keep_alive)
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка при обработке запроса webhook: {e}")
+        finally:
+            writer.close()
+    
+    async def _handle_request(self, reader: asyncio.StreamReader, method: str, path: str,
+                              headers: Dict[str, str]) -> Tuple[int, bool]:
+        """
+        Обработка одного запроса.
+        
+        Returns:
+            Tuple[int, bool]: Код ответа и признак того, что соединение можно переиспользовать
+        """
+        keep_alive = headers.get("connection", "").lower() != "close"
+        
+        if path.split("?", 1)[0] != self.url_path:
+            return 404, False
+        if method != "POST":
+            return 405, False
+        
+        # Сравнение за постоянное время, чтобы токен нельзя было подобрать по времени ответа
+        token = headers.get(SECRET_HEADER, "").encode()
+        if not hmac.compare_digest(token, self.secret_token):
+            logger.warning("Запрос webhook с неверным секретным токеном")
+            return 403, False
+        
+        length = headers.get("content-length")
+        if length is None or not length.isdigit():
+            return 411, False
+        length = int(length)
+        if length > self.max_body_size:
+            return 413, False
+        body = await reader.readexactly(length)
+        
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Не удалось декодировать обновление: {e}")
+            return 400, keep_alive
+        
+        if not await self._wait_for_capacity():
+            # Telegram повторит доставку этого обновления позже
+            logger.warning("Очередь обновлений переполнена, обновление отклонено")
+            return 503, keep_alive
+        
+        await self.application.update_queue.put(update)
+        return 200, keep_alive
+    
+    async def _wait_for_capacity(self) -> bool:
+        """
+        Ожидание, пока в очереди обновлений освободится место.
+        
+        Returns:
+            bool: True если обновление можно поставить в очередь
+        """
+        queue = self.application.update_queue
+        if queue.qsize() < self.max_pending_updates:
+            return True
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + BACKPRESSURE_TIMEOUT
+        while queue.qsize() >= self.max_pending_updates:
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+    
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, keep_alive: bool) -> None:
+        """Отправка ответа без тела."""
+        headers = [
+            f"HTTP/1.1 {status} {REASONS[status]}",
+            "Content-Length: 0",
+            "Connection: keep-alive" if keep_alive else "Connection: close",
+        ]
+        if status == 503:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()